@@ -0,0 +1,405 @@
+# analytics/etl.py - инкрементальная выгрузка заявок и предложений в хранилище
+
+import time
+from contextlib import closing
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.utils import timezone
+
+from bids.models import Bid
+from core.currency import get_rates
+from shipments.models import Shipment
+from . import warehouse
+from .aggregates import group_index, grouped_percentiles, grouped_sum
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+# Статусы предложения, по которым решение уже принято - база доли принятых
+DECIDED_STATUSES = ('accepted', 'rejected', 'expired')
+
+# Групп (маршрут, тип груза, месяц) в одном запросе к хранилищу
+GROUPS_PER_QUERY = 500
+
+LANE_FIELDS = (
+    'departure_city', 'departure_country', 'arrival_city', 'arrival_country',
+    'departure_location__city', 'departure_location__country',
+    'arrival_location__city', 'arrival_location__country',
+)
+
+SHIPMENT_FIELDS = (
+    'id', 'updated_at', 'created_at', 'status', 'cargo_type', 'departure_date',
+    'chargeable_weight', 'estimated_price', 'currency',
+) + LANE_FIELDS
+
+BID_FIELDS = (
+    'id', 'updated_at', 'created_at', 'status', 'price', 'currency',
+    'shipment_id', 'carrier_agent_id', 'carrier_agent__username',
+    'shipment__cargo_type', 'shipment__departure_date',
+) + tuple(f'shipment__{field}' for field in LANE_FIELDS)
+
+
+class SyncReport:
+    """Итоги одного прохода выгрузки"""
+
+    def __init__(self):
+        self.shipments = 0
+        self.bids = 0
+        self.batches = 0
+        self.groups = 0
+        self.agents = 0
+        self.elapsed = 0.0
+
+    @property
+    def rows(self):
+        return self.shipments + self.bids
+
+    @property
+    def rate(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (
+            f'заявок: {self.shipments}, предложений: {self.bids}, пачек: {self.batches}, '
+            f'пересчитано групп: {self.groups}, агентов: {self.agents}, '
+            f'{self.elapsed:.3f} с ({self.rate:.0f} строк/с)'
+        )
+
+
+def _chunks(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _placeholders(count, width=1):
+    one = '(' + ', '.join('?' * width) + ')' if width > 1 else '?'
+    return ', '.join([one] * count)
+
+
+def _timestamp(value):
+    return (value - EPOCH).total_seconds()
+
+
+def _month(day):
+    return day.year * 100 + day.month
+
+
+def _place(row, prefix):
+    # Нормализованный пункт, если он определен; иначе - как ввел владелец
+    if row[f'{prefix}_location__city']:
+        city, country = row[f'{prefix}_location__city'], row[f'{prefix}_location__country']
+    else:
+        city, country = row[f'{prefix}_city'], row[f'{prefix}_country']
+    return f'{city}, {country}' if country else city
+
+
+class RateCache:
+    """Курсы к USD по дням, выбранные один раз за проход"""
+
+    def __init__(self):
+        self._days = {}
+
+    def usd_factors(self, days, currencies):
+        for day in set(days) - self._days.keys():
+            self._days[day] = get_rates(day)
+        return np.array([float(self._days[day][currency]) for day, currency in zip(days, currencies)])
+
+
+# Выгрузка: строки исходной таблицы по возрастанию (updated_at, id) после
+# водяного знака - последней выгруженной пары. Индексы *_updated_idx.
+
+def _read_state(connection, source):
+    row = connection.execute(
+        'SELECT watermark, last_id FROM etl_state WHERE source = ?', (source,)
+    ).fetchone()
+    if row is None:
+        return EPOCH, 0
+    return datetime.fromisoformat(row['watermark']), row['last_id']
+
+
+def _write_state(connection, source, updated_at, last_id):
+    connection.execute(
+        'INSERT INTO etl_state (source, watermark, last_id, synced_at) VALUES (?, ?, ?, ?) '
+        'ON CONFLICT (source) DO UPDATE SET watermark = excluded.watermark, '
+        'last_id = excluded.last_id, synced_at = excluded.synced_at',
+        (source, updated_at.isoformat(), last_id, timezone.now().isoformat()),
+    )
+
+
+def changed_since(queryset, watermark, last_id, until):
+    # Диапазон по updated_at, а не OR двух условий: так SQLite идет по индексу
+    # в нужном порядке; строки на самом водяном знаке отсекаются фильтром
+    return (
+        queryset.filter(updated_at__gte=watermark, updated_at__lte=until)
+        .exclude(updated_at=watermark, id__lte=last_id)
+        .order_by('updated_at', 'id')
+    )
+
+
+def extract(queryset, fields, watermark, last_id, until, batch_size):
+    return list(changed_since(queryset, watermark, last_id, until).values(*fields)[:batch_size])
+
+
+def _lane_ids(connection, pairs, cache):
+    missing = {pair for pair in pairs if pair not in cache}
+    if missing:
+        connection.executemany(
+            'INSERT OR IGNORE INTO dim_lane (origin, destination) VALUES (?, ?)', missing
+        )
+        for chunk in _chunks(missing, GROUPS_PER_QUERY):
+            rows = connection.execute(
+                f'SELECT lane_id, origin, destination FROM dim_lane '
+                f'WHERE (origin, destination) IN (VALUES {_placeholders(len(chunk), 2)})',
+                [value for pair in chunk for value in pair],
+            )
+            cache.update(((row['origin'], row['destination']), row['lane_id']) for row in rows)
+    return [cache[pair] for pair in pairs]
+
+
+def _groups_of(connection, table, key, ids):
+    """Группы (маршрут, тип груза, месяц), в которые строки входили до загрузки"""
+    if not ids:
+        return set()
+    rows = connection.execute(
+        f'SELECT DISTINCT lane_id, cargo_type, month FROM {table} WHERE {key} IN ({_placeholders(len(ids))})',
+        list(ids),
+    )
+    return {tuple(row) for row in rows}
+
+
+def load_shipments(connection, rows, rates, lanes):
+    """Записать пачку заявок в fact_shipment. Возвращает затронутые группы"""
+    ids = [row['id'] for row in rows]
+    dirty = _groups_of(connection, 'fact_shipment', 'shipment_id', ids)
+
+    lane_ids = _lane_ids(connection, [(_place(row, 'departure'), _place(row, 'arrival')) for row in rows], lanes)
+    days = [row['created_at'].date() for row in rows]
+    prices = np.array([float(row['estimated_price']) for row in rows])
+    prices_usd = np.round(prices * rates.usd_factors(days, [row['currency'] for row in rows]), 2)
+
+    records = [
+        (
+            row['id'], lane_id, row['cargo_type'], _month(row['departure_date']), row['status'],
+            float(row['chargeable_weight']) if row['chargeable_weight'] is not None else None,
+            price_usd, _timestamp(row['created_at']), row['updated_at'].isoformat(),
+        )
+        for row, lane_id, price_usd in zip(rows, lane_ids, prices_usd.tolist())
+    ]
+    connection.executemany(
+        'INSERT INTO fact_shipment (shipment_id, lane_id, cargo_type, month, status, chargeable_weight, '
+        'estimated_price_usd, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) '
+        'ON CONFLICT (shipment_id) DO UPDATE SET lane_id = excluded.lane_id, cargo_type = excluded.cargo_type, '
+        'month = excluded.month, status = excluded.status, chargeable_weight = excluded.chargeable_weight, '
+        'estimated_price_usd = excluded.estimated_price_usd, updated_at = excluded.updated_at',
+        records,
+    )
+    # Маршрут, тип груза и месяц заявки могли измениться - предложения переезжают с ней
+    dirty |= _groups_of(connection, 'fact_bid', 'shipment_id', ids)
+    connection.execute(
+        f'UPDATE fact_bid SET (lane_id, cargo_type, month) = '
+        f'(SELECT lane_id, cargo_type, month FROM fact_shipment s WHERE s.shipment_id = fact_bid.shipment_id) '
+        f'WHERE shipment_id IN ({_placeholders(len(ids))})',
+        ids,
+    )
+    # Предложения могли попасть в хранилище раньше новой версии заявки
+    _update_first_bid(connection, ids)
+    dirty |= {(record[1], record[2], record[3]) for record in records}
+    return dirty
+
+
+def _update_first_bid(connection, shipment_ids):
+    # Время первого предложения - по индексу fact_bid_shipment_idx
+    connection.execute(
+        f'UPDATE fact_shipment SET first_bid_at = '
+        f'(SELECT MIN(created_at) FROM fact_bid b WHERE b.shipment_id = fact_shipment.shipment_id) '
+        f'WHERE shipment_id IN ({_placeholders(len(shipment_ids))})',
+        shipment_ids,
+    )
+
+
+def load_bids(connection, rows, rates, lanes):
+    """Записать пачку предложений в fact_bid. Возвращает (затронутые группы, агенты)"""
+    ids = [row['id'] for row in rows]
+    dirty = _groups_of(connection, 'fact_bid', 'bid_id', ids)
+
+    agents = {row['carrier_agent_id']: row['carrier_agent__username'] for row in rows}
+    connection.executemany(
+        'INSERT INTO dim_agent (agent_id, username) VALUES (?, ?) '
+        'ON CONFLICT (agent_id) DO UPDATE SET username = excluded.username',
+        agents.items(),
+    )
+    lane_ids = _lane_ids(
+        connection, [(_place(row, 'shipment__departure'), _place(row, 'shipment__arrival')) for row in rows], lanes
+    )
+    days = [row['created_at'].date() for row in rows]
+    prices = np.array([float(row['price']) for row in rows])
+    prices_usd = np.round(prices * rates.usd_factors(days, [row['currency'] for row in rows]), 2)
+
+    records = [
+        (
+            row['id'], row['shipment_id'], row['carrier_agent_id'], lane_id, row['shipment__cargo_type'],
+            _month(row['shipment__departure_date']), row['status'], price_usd,
+            _timestamp(row['created_at']), row['updated_at'].isoformat(),
+        )
+        for row, lane_id, price_usd in zip(rows, lane_ids, prices_usd.tolist())
+    ]
+    connection.executemany(
+        'INSERT INTO fact_bid (bid_id, shipment_id, agent_id, lane_id, cargo_type, month, status, price_usd, '
+        'created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '
+        'ON CONFLICT (bid_id) DO UPDATE SET lane_id = excluded.lane_id, cargo_type = excluded.cargo_type, '
+        'month = excluded.month, status = excluded.status, price_usd = excluded.price_usd, '
+        'updated_at = excluded.updated_at',
+        records,
+    )
+    _update_first_bid(connection, list({row['shipment_id'] for row in rows}))
+    dirty |= {(record[3], record[4], record[5]) for record in records}
+    return dirty, set(agents)
+
+
+# Агрегаты пересчитываются только для групп и агентов, затронутых пачкой:
+# строки группы читаются из хранилища, статистика считается на NumPy.
+
+def _group_rows(connection, table, columns, groups):
+    for chunk in _chunks(groups, GROUPS_PER_QUERY):
+        yield from connection.execute(
+            f'SELECT lane_id, cargo_type, month, {columns} FROM {table} '
+            f'WHERE (lane_id, cargo_type, month) IN (VALUES {_placeholders(len(chunk), 3)})',
+            [value for group in chunk for value in group],
+        )
+
+
+def _replace_groups(connection, table, groups, columns, records):
+    for chunk in _chunks(groups, GROUPS_PER_QUERY):
+        connection.execute(
+            f'DELETE FROM {table} WHERE (lane_id, cargo_type, month) IN (VALUES {_placeholders(len(chunk), 3)})',
+            [value for group in chunk for value in group],
+        )
+    connection.executemany(
+        f'INSERT INTO {table} (lane_id, cargo_type, month, {", ".join(columns)}) '
+        f'VALUES ({_placeholders(len(columns) + 3)})',
+        records,
+    )
+
+
+def _group_arrays(rows, *columns):
+    """Колонки строк как массивы NumPy и номера групп (маршрут, тип груза, месяц)"""
+    if not rows:
+        return [], np.zeros(0, dtype=np.int64), [np.zeros(0) for _ in columns]
+    groups, inverse = group_index(
+        np.array([row['lane_id'] for row in rows]),
+        np.array([row['cargo_type'] for row in rows]),
+        np.array([row['month'] for row in rows]),
+    )
+    return groups.tolist(), inverse, [np.array([row[column] for row in rows], dtype=float) for column in columns]
+
+
+def _nullable(value):
+    return None if np.isnan(value) else round(float(value), 2)
+
+
+def refresh_lane_prices(connection, groups):
+    rows = list(_group_rows(connection, 'fact_bid', "price_usd, status = 'accepted' AS accepted", groups))
+    keys, inverse, (prices, accepted) = _group_arrays(rows, 'price_usd', 'accepted')
+    counts, percentiles = grouped_percentiles(inverse, prices, groups=len(keys))
+    totals = grouped_sum(inverse, prices, len(keys))
+    accepted = grouped_sum(inverse, accepted, len(keys))
+    records = [
+        (*key, int(count), int(accepted_count), round(total / count, 2), *[_nullable(value) for value in row])
+        for key, count, accepted_count, total, row in zip(keys, counts, accepted, totals, percentiles)
+    ]
+    _replace_groups(connection, 'agg_lane_price', groups,
+                    ('bids', 'accepted', 'mean', 'p25', 'p50', 'p75', 'p90'), records)
+
+
+def refresh_first_bid(connection, groups):
+    rows = list(_group_rows(
+        connection, 'fact_shipment',
+        'COALESCE(first_bid_at - created_at, -1) / 3600.0 AS hours', groups,
+    ))
+    keys, inverse, (hours,) = _group_arrays(rows, 'hours')
+    with_bids = hours >= 0
+    counts = np.bincount(inverse, minlength=len(keys))
+    answered, percentiles = grouped_percentiles(inverse[with_bids], hours[with_bids], (50, 90), groups=len(keys))
+    records = [
+        (*key, int(count), int(answered_count), *[_nullable(value) for value in row])
+        for key, count, answered_count, row in zip(keys, counts, answered, percentiles)
+    ]
+    _replace_groups(connection, 'agg_first_bid', groups,
+                    ('shipments', 'with_bids', 'median_hours', 'p90_hours'), records)
+
+
+def refresh_agents(connection, agent_ids):
+    agent_ids = list(agent_ids)
+    rows = []
+    for chunk in _chunks(agent_ids, GROUPS_PER_QUERY):
+        rows.extend(connection.execute(
+            f'SELECT agent_id, status FROM fact_bid WHERE agent_id IN ({_placeholders(len(chunk))})', chunk
+        ))
+        connection.execute(f'DELETE FROM agg_agent WHERE agent_id IN ({_placeholders(len(chunk))})', chunk)
+    if not rows:
+        return
+    agents, inverse = np.unique(np.array([row['agent_id'] for row in rows]), return_inverse=True)
+    statuses = np.array([row['status'] for row in rows])
+    bids = np.bincount(inverse)
+    decided = grouped_sum(inverse, np.isin(statuses, DECIDED_STATUSES), len(agents))
+    accepted = grouped_sum(inverse, statuses == 'accepted', len(agents))
+    rates = np.divide(accepted, decided, out=np.full(len(agents), np.nan), where=decided > 0)
+    connection.executemany(
+        'INSERT INTO agg_agent (agent_id, bids, decided, accepted, acceptance_rate) VALUES (?, ?, ?, ?, ?)',
+        [
+            (int(agent), int(count), int(decided_count), int(accepted_count),
+             None if np.isnan(rate) else round(float(rate), 4))
+            for agent, count, decided_count, accepted_count, rate in zip(agents, bids, decided, accepted, rates)
+        ],
+    )
+
+
+def _sync_source(connection, source, report, batch_size, until, rates, lanes):
+    queryset, fields, load = {
+        'shipments': (Shipment.objects.all(), SHIPMENT_FIELDS, load_shipments),
+        'bids': (Bid.objects.all(), BID_FIELDS, load_bids),
+    }[source]
+    watermark, last_id = _read_state(connection, source)
+    while True:
+        rows = extract(queryset, fields, watermark, last_id, until, batch_size)
+        if not rows:
+            break
+        # Пачка, ее агрегаты и новый водяной знак - одна транзакция хранилища:
+        # после сбоя выгрузка продолжится с последней записанной пачки
+        with connection:
+            if source == 'bids':
+                groups, agents = load(connection, rows, rates, lanes)
+                refresh_agents(connection, agents)
+                report.bids += len(rows)
+                report.agents += len(agents)
+            else:
+                groups = load(connection, rows, rates, lanes)
+                report.shipments += len(rows)
+            refresh_lane_prices(connection, groups)
+            refresh_first_bid(connection, groups)
+            watermark, last_id = rows[-1]['updated_at'], rows[-1]['id']
+            _write_state(connection, source, watermark, last_id)
+        report.groups += len(groups)
+        report.batches += 1
+
+
+def sync(batch_size=None, now=None):
+    """Выгрузить в хранилище заявки и предложения, изменившиеся с прошлого прохода.
+
+    Рабочая БД читается короткими запросами по индексу (updated_at, id),
+    агрегаты пересчитываются только для затронутых групп. Удаления строк
+    не отслеживаются - для них нужна полная перезагрузка (sync_warehouse --rebuild).
+    """
+    config = warehouse.get_config()
+    batch_size = batch_size or config['BATCH_SIZE']
+    until = (now or timezone.now()) - timedelta(seconds=config['LAG'])
+    report = SyncReport()
+    started = time.perf_counter()
+    rates, lanes = RateCache(), {}
+    with closing(warehouse.connect()) as connection:
+        # Заявки раньше предложений: время до первого предложения считается от заявки
+        for source in ('shipments', 'bids'):
+            _sync_source(connection, source, report, batch_size, until, rates, lanes)
+    report.elapsed = time.perf_counter() - started
+    return report
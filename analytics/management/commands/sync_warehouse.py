@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from analytics import warehouse
+from analytics.etl import sync
+
+
+class Command(BaseCommand):
+    help = 'Выгрузить изменившиеся заявки и предложения в хранилище отчетов и пересчитать агрегаты'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Строк в одной пачке (по умолчанию ANALYTICS_WAREHOUSE["BATCH_SIZE"])')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Удалить данные хранилища и выгрузить все заново')
+        parser.add_argument('--loop', action='store_true',
+                            help='Работать постоянно, повторяя проход через --interval секунд')
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Пауза между проходами в режиме --loop, секунд')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            warehouse.drop_all()
+        interval = options['interval'] or warehouse.get_config()['INTERVAL']
+        while True:
+            report = sync(batch_size=options['batch_size'])
+            self.stdout.write(f'Выгружено {report}')
+            if not options['loop']:
+                break
+            # Между проходами соединение с рабочей БД не держим
+            connection.close()
+            time.sleep(interval)
@@ -0,0 +1,127 @@
+import datetime
+import shutil
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from bids import state_machine
+from bids.tests import make_bid
+from core.testing import QueryPlanAssertionsMixin
+from shipments.models import Shipment
+from shipments.tests import make_shipment
+from . import etl, warehouse
+from .aggregates import group_index, grouped_percentiles
+
+
+class AggregateTests(SimpleTestCase):
+
+    def test_grouped_percentiles_match_numpy(self):
+        rng = np.random.default_rng(0)
+        inverse = rng.integers(0, 40, 5000)
+        values = rng.random(5000) * 1000
+        counts, result = grouped_percentiles(inverse, values, groups=42)
+        for group in range(40):
+            expected = np.percentile(values[inverse == group], (25, 50, 75, 90))
+            np.testing.assert_allclose(result[group], expected)
+        self.assertEqual(counts[40:].tolist(), [0, 0])
+        self.assertTrue(np.isnan(result[40:]).all())
+
+    def test_group_index(self):
+        groups, inverse = group_index(np.array([3, 1, 3]), np.array(['a', 'b', 'a']))
+        self.assertEqual(groups.tolist(), [(1, 'b'), (3, 'a')])
+        self.assertEqual(inverse.tolist(), [1, 0, 1])
+
+
+@override_settings(CURRENCY_RATES={'USD': Decimal('1'), 'EUR': Decimal('2'), 'RUB': Decimal('0.01')})
+class WarehouseSyncTests(QueryPlanAssertionsMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='x')
+        cls.agents = [User.objects.create_user(f'agent{i}', password='x') for i in range(3)]
+        cls.staff = User.objects.create_user('staff', password='x', is_staff=True)
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings = override_settings(ANALYTICS_WAREHOUSE={'PATH': Path(directory) / 'warehouse.sqlite3', 'LAG': 0})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.shipment = make_shipment(self.owner)
+        self.bids = [
+            make_bid(self.shipment, self.agents[0], price=100),
+            make_bid(self.shipment, self.agents[1], price=100, currency='EUR'),
+            make_bid(self.shipment, self.agents[2], price=500),
+        ]
+
+    def sync(self):
+        return etl.sync(now=timezone.now() + datetime.timedelta(seconds=1))
+
+    def query(self, sql, *params):
+        with warehouse.connect(readonly=True) as db:
+            return [dict(row) for row in db.execute(sql, params)]
+
+    def test_incremental_sync(self):
+        report = self.sync()
+        self.assertEqual((report.shipments, report.bids), (1, 3))
+        [lane] = self.query('SELECT * FROM agg_lane_price')
+        self.assertEqual((lane['cargo_type'], lane['month'], lane['bids'], lane['accepted']), ('general', 202601, 3, 0))
+        self.assertEqual((lane['p25'], lane['p50'], lane['p90']), (150.0, 200.0, 440.0))
+        self.assertEqual(self.query('SELECT origin, destination FROM dim_lane'),
+                         [{'origin': 'Москва, Россия', 'destination': 'Берлин, Германия'}])
+
+        # Без изменений второй проход ничего не читает
+        report = self.sync()
+        self.assertEqual((report.rows, report.batches), (0, 0))
+
+        state_machine.accept(self.bids[2])
+        report = self.sync()
+        self.assertEqual((report.shipments, report.bids), (1, 3))
+        [lane] = self.query('SELECT * FROM agg_lane_price')
+        self.assertEqual(lane['accepted'], 1)
+        rates = {row['agent_id']: row['acceptance_rate'] for row in self.query('SELECT * FROM agg_agent')}
+        self.assertEqual(rates, {self.agents[0].id: 0.0, self.agents[1].id: 0.0, self.agents[2].id: 1.0})
+        [first] = self.query('SELECT * FROM agg_first_bid')
+        self.assertEqual((first['shipments'], first['with_bids']), (1, 1))
+        self.assertGreaterEqual(first['median_hours'], 0)
+
+    def test_changed_lane_moves_bids(self):
+        self.sync()
+        self.shipment.arrival_city = 'Париж'
+        self.shipment.arrival_country = 'Франция'
+        self.shipment.save()
+        self.sync()
+        lanes = self.query('SELECT l.destination, a.bids FROM agg_lane_price a JOIN dim_lane l USING (lane_id)')
+        self.assertEqual(lanes, [{'destination': 'Париж, Франция', 'bids': 3}])
+
+    def test_extract_uses_index(self):
+        for model in (Shipment, type(self.bids[0])):
+            queryset = etl.changed_since(model.objects.all(), etl.EPOCH, 0, timezone.now())
+            self.assertQuerysetUsesIndex(queryset[:100])
+
+    def test_report_reads_only_warehouse(self):
+        url = reverse('warehouse_report')
+        self.client.force_login(self.staff)
+        self.assertContains(self.client.get(url), 'sync_warehouse')
+
+        self.sync()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'origin': 'Моск', 'month': '2026-01'})
+        self.assertContains(response, 'Москва, Россия → Берлин, Германия')
+        # Кроме счетчиков меню в base.html, рабочие таблицы не читаются
+        self.assertFalse([
+            query['sql'] for query in queries
+            if ('shipments_' in query['sql'] or 'bids_' in query['sql']) and 'COUNT(*)' not in query['sql']
+        ])
+
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get(url).status_code, 302)
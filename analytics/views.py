@@ -0,0 +1,76 @@
+from contextlib import closing
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.shortcuts import render
+
+from shipments.models import Shipment
+from . import warehouse
+
+REPORT_LIMIT = 50
+
+
+def _filters(request):
+    """Условия WHERE по маршруту, типу груза и месяцу (?month=2026-03)"""
+    conditions, params = [], []
+    for field, column in (('origin', 'l.origin'), ('destination', 'l.destination')):
+        value = request.GET.get(field, '').strip()
+        if value:
+            conditions.append(f'{column} LIKE ?')
+            params.append(f'%{value}%')
+    cargo_type = request.GET.get('cargo_type')
+    if cargo_type:
+        conditions.append('a.cargo_type = ?')
+        params.append(cargo_type)
+    month = request.GET.get('month', '').replace('-', '')
+    if month.isdigit():
+        conditions.append('a.month = ?')
+        params.append(int(month))
+    return ' AND '.join(conditions) or '1', params
+
+
+def _lane_report(connection, table, columns, order, where, params):
+    return [dict(row) for row in connection.execute(
+        f'SELECT l.origin, l.destination, a.cargo_type, a.month, {columns} '
+        f'FROM {table} a JOIN dim_lane l USING (lane_id) WHERE {where} '
+        f'ORDER BY {order} LIMIT {REPORT_LIMIT}',
+        params,
+    )]
+
+
+@staff_member_required
+def warehouse_report(request):
+    """Отчеты по маршрутам и агентам. Читает только хранилище, не рабочую БД"""
+    context = {
+        'cargo_types': Shipment.CARGO_TYPE_CHOICES,
+        'filters': request.GET,
+    }
+    try:
+        connection = warehouse.connect(readonly=True)
+    except warehouse.WarehouseMissing:
+        return render(request, 'analytics/report.html', {**context, 'missing': True})
+
+    where, params = _filters(request)
+    with closing(connection):
+        cargo_labels = dict(Shipment.CARGO_TYPE_CHOICES)
+        context.update({
+            'lane_prices': _lane_report(
+                connection, 'agg_lane_price', 'a.bids, a.accepted, a.mean, a.p25, a.p50, a.p75, a.p90',
+                'a.bids DESC, a.month DESC', where, params,
+            ),
+            'first_bids': _lane_report(
+                connection, 'agg_first_bid', 'a.shipments, a.with_bids, a.median_hours, a.p90_hours',
+                'a.shipments DESC, a.month DESC', where, params,
+            ),
+            'agents': [dict(row) for row in connection.execute(
+                'SELECT d.username, a.bids, a.decided, a.accepted, a.acceptance_rate '
+                'FROM agg_agent a JOIN dim_agent d USING (agent_id) '
+                f'ORDER BY a.bids DESC, a.agent_id LIMIT {REPORT_LIMIT}'
+            )],
+            'synced': {row['source']: row['synced_at'] for row in connection.execute(
+                'SELECT source, synced_at FROM etl_state'
+            )},
+        })
+    for row in context['lane_prices'] + context['first_bids']:
+        row['cargo_label'] = cargo_labels.get(row['cargo_type'], row['cargo_type'])
+        row['month_label'] = f'{row["month"] // 100}-{row["month"] % 100:02d}'
+    return render(request, 'analytics/report.html', context)
@@ -0,0 +1,133 @@
+# analytics/warehouse.py - отдельная SQLite-база для отчетов (схема "звезда")
+
+import sqlite3
+from contextlib import closing
+
+from django.conf import settings
+
+DEFAULTS = {
+    # Файл хранилища; рабочая БД сайта отчетами не нагружается
+    'PATH': settings.BASE_DIR / 'warehouse.sqlite3',
+    # Строк исходной таблицы в одной пачке выгрузки
+    'BATCH_SIZE': 5000,
+    # Не выгружать строки моложе стольких секунд: транзакция, которая
+    # записала updated_at, но еще не закоммитилась, не будет пропущена
+    'LAG': 5,
+    # Пауза между проходами в режиме --loop, секунд
+    'INTERVAL': 300,
+}
+
+# Измерения - маршруты и агенты; факты - заявки и предложения с денормализованными
+# ключами измерений; agg_* - готовые агрегаты, которые читает страница отчетов.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dim_lane (
+    lane_id INTEGER PRIMARY KEY,
+    origin TEXT NOT NULL,
+    destination TEXT NOT NULL,
+    UNIQUE (origin, destination)
+);
+CREATE TABLE IF NOT EXISTS dim_agent (
+    agent_id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fact_shipment (
+    shipment_id INTEGER PRIMARY KEY,
+    lane_id INTEGER NOT NULL REFERENCES dim_lane,
+    cargo_type TEXT NOT NULL,
+    month INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    chargeable_weight REAL,
+    estimated_price_usd REAL NOT NULL,
+    created_at REAL NOT NULL,
+    first_bid_at REAL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fact_shipment_group_idx ON fact_shipment (lane_id, cargo_type, month);
+CREATE TABLE IF NOT EXISTS fact_bid (
+    bid_id INTEGER PRIMARY KEY,
+    shipment_id INTEGER NOT NULL,
+    agent_id INTEGER NOT NULL REFERENCES dim_agent,
+    lane_id INTEGER NOT NULL REFERENCES dim_lane,
+    cargo_type TEXT NOT NULL,
+    month INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    price_usd REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fact_bid_group_idx ON fact_bid (lane_id, cargo_type, month);
+CREATE INDEX IF NOT EXISTS fact_bid_agent_idx ON fact_bid (agent_id);
+CREATE INDEX IF NOT EXISTS fact_bid_shipment_idx ON fact_bid (shipment_id, created_at);
+CREATE TABLE IF NOT EXISTS agg_lane_price (
+    lane_id INTEGER NOT NULL,
+    cargo_type TEXT NOT NULL,
+    month INTEGER NOT NULL,
+    bids INTEGER NOT NULL,
+    accepted INTEGER NOT NULL,
+    mean REAL NOT NULL,
+    p25 REAL NOT NULL,
+    p50 REAL NOT NULL,
+    p75 REAL NOT NULL,
+    p90 REAL NOT NULL,
+    PRIMARY KEY (lane_id, cargo_type, month)
+);
+CREATE TABLE IF NOT EXISTS agg_first_bid (
+    lane_id INTEGER NOT NULL,
+    cargo_type TEXT NOT NULL,
+    month INTEGER NOT NULL,
+    shipments INTEGER NOT NULL,
+    with_bids INTEGER NOT NULL,
+    median_hours REAL,
+    p90_hours REAL,
+    PRIMARY KEY (lane_id, cargo_type, month)
+);
+CREATE TABLE IF NOT EXISTS agg_agent (
+    agent_id INTEGER PRIMARY KEY,
+    bids INTEGER NOT NULL,
+    decided INTEGER NOT NULL,
+    accepted INTEGER NOT NULL,
+    acceptance_rate REAL
+);
+CREATE TABLE IF NOT EXISTS etl_state (
+    source TEXT PRIMARY KEY,
+    watermark TEXT NOT NULL,
+    last_id INTEGER NOT NULL,
+    synced_at TEXT NOT NULL
+);
+"""
+
+TABLES = (
+    'dim_lane', 'dim_agent', 'fact_shipment', 'fact_bid',
+    'agg_lane_price', 'agg_first_bid', 'agg_agent', 'etl_state',
+)
+
+
+class WarehouseMissing(Exception):
+    """Хранилище еще не создано - нужно запустить sync_warehouse"""
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'ANALYTICS_WAREHOUSE', {})}
+
+
+def connect(readonly=False):
+    """Соединение с хранилищем. readonly - для отчетов: файл не создается и не меняется"""
+    path = get_config()['PATH']
+    if readonly:
+        try:
+            connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        except sqlite3.OperationalError as exc:
+            raise WarehouseMissing(str(path)) from exc
+    else:
+        connection = sqlite3.connect(path, timeout=20)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.executescript(SCHEMA)
+    connection.row_factory = sqlite3.Row
+    return connection
+
+
+def drop_all():
+    with closing(connect()) as connection:
+        for table in TABLES:
+            connection.execute(f'DROP TABLE IF EXISTS {table}')
+        connection.commit()
@@ -1,7 +1,7 @@
 # bids/admin.py
 
 from django.contrib import admin
-from .models import Bid
+from .models import AgentRating, Bid
 
 
 @admin.register(Bid)
@@ -47,4 +47,18 @@ class BidAdmin(admin.ModelAdmin):
 
     def get_queryset(self, request):
         queryset = super().get_queryset(request)
-        return queryset.select_related('shipment', 'carrier_agent')
\ No newline at end of file
+        return queryset.select_related('shipment', 'carrier_agent')
+
+
+@admin.register(AgentRating)
+class AgentRatingAdmin(admin.ModelAdmin):
+    list_display = ('id', 'agent', 'author', 'stars', 'bid_id', 'created_at')
+    list_filter = ('stars', 'created_at')
+    search_fields = ('agent__username', 'author__username', 'comment')
+    readonly_fields = ('bid', 'agent', 'author', 'stars', 'created_at')
+    list_select_related = ('agent', 'author')
+    list_per_page = 20
+
+    def has_add_permission(self, request):
+        # Оценка ставится только со страницы заявки - вместе с ее завершением
+        return False
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BidsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'bids'
+
+    def ready(self):
+        import bids.signals  # noqa: F401
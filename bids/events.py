@@ -0,0 +1,25 @@
+# bids/events.py - события предложений для потока заявки
+
+from shipments.events import publish_shipment_event
+
+
+def bid_event(bid):
+    """Данные предложения для потока событий заявки"""
+    return {
+        'id': bid.id,
+        'status': bid.status,
+        'price': bid.price,
+        'currency': bid.currency,
+        'carrier_agent': bid.carrier_agent.username,
+        'created_at': bid.created_at,
+    }
+
+
+def publish_bid_created(bid):
+    publish_shipment_event(bid.shipment_id, 'bid_created', bid_event(bid))
+
+
+def publish_status_change(bid):
+    publish_shipment_event(bid.shipment_id, 'bid_status', {'id': bid.id, 'status': bid.status})
+    if bid.status == 'accepted':
+        publish_shipment_event(bid.shipment_id, 'shipment_status', {'status': 'in_progress', 'accepted_bid': bid.id})
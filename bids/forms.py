@@ -1,5 +1,5 @@
 from django import forms
-from .models import Bid
+from .models import AgentRating, Bid
 
 
 class BidForm(forms.ModelForm):
@@ -46,4 +46,18 @@ class BidForm(forms.ModelForm):
                     'Дата отправления не может быть позже даты прибытия.'
                 )
 
-        return cleaned_data
\ No newline at end of file
+        return cleaned_data
+
+
+class AgentRatingForm(forms.ModelForm):
+    class Meta:
+        model = AgentRating
+        fields = ['stars', 'comment']
+        widgets = {
+            'stars': forms.RadioSelect(attrs={'class': 'form-check-input'}),
+            'comment': forms.Textarea(attrs={
+                'class': 'form-control',
+                'rows': 3,
+                'placeholder': 'Как прошла перевозка?'
+            }),
+        }
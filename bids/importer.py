@@ -0,0 +1,200 @@
+# bids/importer.py - массовая загрузка предложений агента из CSV/JSON
+
+import codecs
+import csv
+import json
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+
+from shipments.models import Shipment
+from users import dashboard
+from . import leaderboard
+from .events import publish_bid_created
+from .forms import BidForm
+from .models import Bid, has_active_bid
+
+FIELDS = ('shipment_id', 'price', 'currency', 'departure_date', 'arrival_date', 'notes')
+
+# Строк в одной пачке: на пачку - два SELECT и один bulk_create
+CHUNK_SIZE = 1000
+
+
+class BidImportError(ValueError):
+    """Файл не удалось разобрать целиком (формат, кодировка, заголовок)"""
+
+
+def iter_rows(uploaded, file_format=None):
+    """Строки файла как словари, без чтения файла в память целиком.
+
+    CSV - с заголовком из FIELDS; JSON - массив объектов или JSON Lines
+    (объект на строку). Формат определяется по расширению, если не задан.
+    """
+    name = getattr(uploaded, 'name', '') or ''
+    file_format = file_format or ('csv' if name.lower().endswith('.csv') else 'json')
+    text = codecs.iterdecode(iter(uploaded), 'utf-8-sig')
+
+    if file_format == 'csv':
+        reader = csv.DictReader(text)
+        if reader.fieldnames is None or 'shipment_id' not in reader.fieldnames:
+            raise BidImportError('В CSV нет заголовка со столбцом shipment_id.')
+        yield from reader
+        return
+
+    lines = (line.strip() for line in text)
+    lines = (line for line in lines if line)
+    first = next(lines, None)
+    if first is None:
+        return
+    try:
+        if first.startswith('['):
+            # Обычный JSON-массив приходится разбирать целиком
+            rows = json.loads(first + ''.join(lines))
+            if not isinstance(rows, list):
+                raise BidImportError('Ожидается массив объектов.')
+            yield from rows
+            return
+        yield json.loads(first)
+        for line in lines:
+            yield json.loads(line)
+    except json.JSONDecodeError as exc:
+        raise BidImportError(f'Некорректный JSON: {exc}') from exc
+
+
+def _result(number, row, status, bid=None, errors=None):
+    return {
+        'row': number,
+        'shipment_id': row.get('shipment_id') if isinstance(row, dict) else None,
+        'status': status,
+        'bid_id': bid.id if bid is not None else None,
+        'errors': errors or [],
+    }
+
+
+def _form_errors(form):
+    return [
+        message if field == '__all__' else f'{field}: {message}'
+        for field, messages in form.errors.items()
+        for message in messages
+    ]
+
+
+def _parse_shipment_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def import_bids(agent, rows, chunk_size=CHUNK_SIZE):
+    """Создать предложения агента из строк. Возвращает отчет по каждой строке.
+
+    Правила те же, что у create_bid: BidForm.clean, заявка существует и
+    активна, она не своя и у агента нет на нее активного предложения.
+    Заявки и активные предложения пачки загружаются двумя запросами,
+    вставка - bulk_create в транзакции пачки.
+    """
+    report = []
+    seen = set()
+    rows = enumerate(rows, start=1)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        report.extend(_import_chunk(agent, chunk, seen))
+    return report
+
+
+def _import_chunk(agent, chunk, seen):
+    results = {}
+    candidates = []   # (номер, строка, id заявки, форма)
+    for number, row in chunk:
+        if not isinstance(row, dict):
+            results[number] = _result(number, row, 'error', errors=['Строка должна быть объектом.'])
+            continue
+        shipment_id = _parse_shipment_id(row.get('shipment_id'))
+        if shipment_id is None:
+            results[number] = _result(number, row, 'error', errors=['shipment_id: укажите номер заявки.'])
+            continue
+        form = BidForm({field: row.get(field) for field in FIELDS[1:]})
+        if not form.is_valid():
+            results[number] = _result(number, row, 'error', errors=_form_errors(form))
+            continue
+        candidates.append((number, row, shipment_id, form))
+
+    shipment_ids = {shipment_id for _, _, shipment_id, _ in candidates}
+    shipments = {
+        row['id']: row
+        for row in Shipment.objects.filter(id__in=shipment_ids).values('id', 'status', 'owner_id')
+    }
+    active = set(
+        Bid.objects.filter(
+            shipment_id__in=shipment_ids, carrier_agent=agent, status__in=['pending', 'accepted']
+        ).values_list('shipment_id', flat=True)
+    )
+
+    to_create = []
+    for number, row, shipment_id, form in candidates:
+        shipment = shipments.get(shipment_id)
+        if shipment is None:
+            error = 'Заявка не найдена.'
+        elif shipment['status'] != 'active':
+            error = 'Нельзя создать предложение для неактивной заявки.'
+        elif shipment['owner_id'] == agent.id:
+            error = 'Нельзя создать предложение к своей собственной заявке.'
+        elif shipment_id in active or shipment_id in seen:
+            error = 'У вас уже есть активное предложение для этой заявки.'
+        else:
+            error = None
+        if error:
+            results[number] = _result(number, row, 'error', errors=[error])
+            continue
+        seen.add(shipment_id)
+        bid = form.save(commit=False)
+        bid.shipment_id = shipment_id
+        bid.carrier_agent = agent
+        to_create.append((number, row, bid))
+
+    for number, row, bid, errors in _insert(to_create):
+        results[number] = _result(number, row, 'error' if errors else 'created', bid=bid, errors=errors)
+    dashboard.invalidate(agent.id, *(shipments[bid.shipment_id]['owner_id'] for _, _, bid in to_create))
+    return [results[number] for number, _ in chunk]
+
+
+def _insert(items):
+    """bulk_create пачки; при гонке с другой вставкой - по одной строке"""
+    if not items:
+        return []
+    bids = [bid for _, _, bid in items]
+    try:
+        with transaction.atomic():
+            Bid.objects.bulk_create(bids)
+            _after_insert(bids)
+        return [(number, row, bid, None) for number, row, bid in items]
+    except IntegrityError:
+        pass
+
+    # Между проверкой и вставкой агент успел создать предложение
+    # другим способом - пачка откатилась, вставляем построчно
+    inserted = []
+    for number, row, bid in items:
+        bid.pk = None
+        bid._state.adding = True
+        try:
+            with transaction.atomic():
+                bid.save()
+        except IntegrityError:
+            if not has_active_bid(bid.shipment_id, bid.carrier_agent_id):
+                raise
+            inserted.append((number, row, None, ['У вас уже есть активное предложение для этой заявки.']))
+            continue
+        publish_bid_created(bid)
+        inserted.append((number, row, bid, None))
+    return inserted
+
+
+def _after_insert(bids):
+    # bulk_create не вызывает Bid.save() - сводку заявок пересчитываем сами
+    leaderboard.refresh(Shipment.objects.filter(id__in={bid.shipment_id for bid in bids}))
+    for bid in bids:
+        publish_bid_created(bid)
@@ -0,0 +1,84 @@
+# bids/leaderboard.py - счетчики предложений и лучшее предложение заявки
+#
+# Shipment.bid_count, pending_bid_count и best_bid_price хранятся в заявке,
+# чтобы список мог сортировать по ним без подзапросов (по счетчикам - по
+# индексу, по цене - в пересчете на USD). Обновляются в той же
+# транзакции, что и предложение: при создании - инкрементально, при смене
+# статуса - пересчетом по индексу предложений заявки.
+
+from django.db.models import Count, F, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Least, Round
+
+from core.currency import to_usd, usd_rate_expression
+from shipments.cache import shipments_changed
+from shipments.models import Shipment
+from .models import Bid
+
+# Предложения, которые участвуют в выборе лучшей цены
+LIVE_STATUSES = ('pending', 'accepted')
+
+
+def _in_shipment_currency(usd_amount):
+    # Делим на курс валюты заявки - колонка currency обновляемой строки Shipment
+    return Round(usd_amount / usd_rate_expression('currency'), 2)
+
+
+def _bid_count(**filters):
+    counts = Bid.objects.filter(shipment=OuterRef('pk'), **filters).values('shipment').annotate(
+        total=Count('id')
+    ).values('total')
+    return Coalesce(Subquery(counts), 0)
+
+
+def best_offer():
+    """Лучшая (минимальная) живая цена заявки в ее валюте - выражение для UPDATE"""
+    best_usd = Bid.objects.filter(shipment=OuterRef('pk'), status__in=LIVE_STATUSES).values(
+        'shipment'
+    ).annotate(best=Min(F('price') * usd_rate_expression('currency'))).values('best')
+    return _in_shipment_currency(Subquery(best_usd))
+
+
+def offer_value(bid):
+    """Цена предложения в валюте заявки - выражение для UPDATE"""
+    return _in_shipment_currency(Value(to_usd(bid.price, bid.currency)))
+
+
+def _changed():
+    # Значения видны в списке заявок - его версия и кэши устаревают
+    shipments_changed()
+
+
+def bid_created(bid):
+    """Учесть новое предложение: +1 к счетчикам, лучшая цена - минимум из старой и новой"""
+    updates = {'bid_count': F('bid_count') + 1}
+    if bid.status == 'pending':
+        updates['pending_bid_count'] = F('pending_bid_count') + 1
+    if bid.status in LIVE_STATUSES:
+        offer = offer_value(bid)
+        updates['best_bid_price'] = Least(Coalesce('best_bid_price', offer), offer)
+    Shipment.objects.filter(pk=bid.shipment_id).update(**updates)
+    _changed()
+
+
+def bid_left_pending(bid):
+    """Предложение ушло из 'pending' не через принятие: -1 и пересчет лучшей цены"""
+    Shipment.objects.filter(pk=bid.shipment_id).update(
+        pending_bid_count=F('pending_bid_count') - 1,
+        best_bid_price=best_offer(),
+    )
+    _changed()
+
+
+def refresh(shipments):
+    """Пересчитать все три значения для заявок queryset одним UPDATE.
+
+    Возвращает число обновленных заявок.
+    """
+    updated = shipments.update(
+        bid_count=_bid_count(),
+        pending_bid_count=_bid_count(status='pending'),
+        best_bid_price=best_offer(),
+    )
+    if updated:
+        _changed()
+    return updated
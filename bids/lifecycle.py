@@ -0,0 +1,118 @@
+# bids/lifecycle.py - истечение сроков заявок и предложений
+
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from shipments.cache import shipments_changed
+from shipments.models import Shipment
+from . import state_machine
+from .models import Bid
+
+DEFAULTS = {
+    # Строк в одной пачке: каждая пачка - отдельная короткая транзакция
+    'CHUNK_SIZE': 500,
+    # Пауза между проходами в режиме --loop, секунд
+    'INTERVAL': 60,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'LIFECYCLE_SWEEPER', {})}
+
+
+class SweepReport:
+    """Итоги одного прохода"""
+
+    def __init__(self):
+        self.shipments = 0
+        self.bids = 0
+        self.chunks = 0
+        self.elapsed = 0.0
+
+    @property
+    def rows(self):
+        return self.shipments + self.bids
+
+    @property
+    def rate(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (
+            f'заявок: {self.shipments}, предложений: {self.bids}, пачек: {self.chunks}, '
+            f'{self.elapsed:.3f} с ({self.rate:.0f} строк/с)'
+        )
+
+
+# Срок заявки - конец окна отправления, срок предложения - предложенная
+# дата отправления. Оба условия идут по индексам (status, <срок>).
+
+def due_shipments(today):
+    return Shipment.objects.filter(status='active', departure_window_end__lt=today)
+
+
+def due_bids(today):
+    return Bid.objects.filter(status='pending', departure_date__lt=today)
+
+
+def _due_ids(queryset, deadline, chunk_size):
+    return list(queryset.order_by(deadline, 'id').values_list('id', flat=True)[:chunk_size])
+
+
+def expire_shipments(ids, today, now):
+    """Закрыть просроченные заявки из ids и погасить их ожидающие предложения.
+
+    Условия повторяются в UPDATE: если ту же пачку одновременно
+    обрабатывает другой узел, каждая строка сменит статус один раз.
+    """
+    with transaction.atomic():
+        shipments = due_shipments(today).filter(id__in=ids).update(status='inactive', updated_at=now)
+        bids = state_machine.bulk_transition(
+            Bid.objects.filter(shipment_id__in=ids).exclude(shipment__status='active'), 'expire', now
+        )
+    return shipments, bids
+
+
+def expire_bids(ids, today, now):
+    with transaction.atomic():
+        return state_machine.bulk_transition(
+            Bid.objects.filter(id__in=ids, departure_date__lt=today), 'expire', now
+        )
+
+
+def sweep(today=None, chunk_size=None):
+    """Один проход: просроченные заявки, затем просроченные предложения.
+
+    Строки выбираются пачками по индексу срока и меняются
+    set-based UPDATE, поэтому блокировка на запись держится не дольше
+    одной пачки.
+    """
+    today = today or timezone.localdate()
+    chunk_size = chunk_size or get_config()['CHUNK_SIZE']
+    report = SweepReport()
+    started = time.monotonic()
+
+    while True:
+        ids = _due_ids(due_shipments(today), 'departure_window_end', chunk_size)
+        if not ids:
+            break
+        shipments, bids = expire_shipments(ids, today, timezone.now())
+        report.shipments += shipments
+        report.bids += bids
+        report.chunks += 1
+
+    while True:
+        ids = _due_ids(due_bids(today), 'departure_date', chunk_size)
+        if not ids:
+            break
+        report.bids += expire_bids(ids, today, timezone.now())
+        report.chunks += 1
+
+    if report.shipments:
+        # UPDATE не вызывает post_save - версию и кэши списка заявок сбрасываем сами
+        shipments_changed()
+    report.elapsed = time.monotonic() - started
+    return report
@@ -0,0 +1,123 @@
+import csv
+import io
+import random
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from bids.importer import FIELDS, import_bids, iter_rows
+from shipments.models import Shipment
+
+
+class Rollback(Exception):
+    pass
+
+
+def make_file(rng, shipment_ids, rows):
+    """CSV на rows строк; каждая десятая - с ошибкой в датах"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FIELDS)
+    writer.writeheader()
+    for number, shipment_id in enumerate(shipment_ids[:rows]):
+        departure = date(2026, 1, 1) + timedelta(days=rng.randrange(0, 300))
+        arrival = departure + timedelta(days=rng.randrange(1, 10))
+        if number % 10 == 9:
+            departure, arrival = arrival, departure
+        writer.writerow({
+            'shipment_id': shipment_id,
+            'price': rng.randrange(100, 10000),
+            'currency': rng.choice(['USD', 'EUR', 'RUB']),
+            'departure_date': departure.isoformat(),
+            'arrival_date': arrival.isoformat(),
+            'notes': '',
+        })
+    uploaded = io.BytesIO(buffer.getvalue().encode())
+    uploaded.name = 'bids.csv'
+    return uploaded
+
+
+def import_row_by_row(agent, rows):
+    """Эталон: как create_bid - запросы и save() на каждую строку"""
+    from bids.forms import BidForm
+
+    created = 0
+    for row in rows:
+        shipment = Shipment.objects.filter(id=row['shipment_id']).first()
+        form = BidForm(row)
+        if shipment is None or shipment.status != 'active' or shipment.owner_id == agent.id or not form.is_valid():
+            continue
+        bid = form.save(commit=False)
+        bid.shipment = shipment
+        bid.carrier_agent = agent
+        bid.save()
+        created += 1
+    return created
+
+
+class Command(BaseCommand):
+    help = 'Замерить массовую загрузку предложений (данные создаются и откатываются)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000,
+                            help='Количество строк в файле')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Строк в одной пачке загрузки')
+        parser.add_argument('--row-by-row', type=int, default=500,
+                            help='Сколько строк загрузить построчно для сравнения')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        rows = options['rows']
+        owner = User.objects.create_user('benchmark-import-owner')
+        agent = User.objects.create_user('benchmark-import-agent')
+        Shipment.objects.bulk_create(
+            Shipment(
+                title=f'Груз {i}', owner=owner, status='active',
+                weight=100, length=100, width=100, height=100,
+                departure_city='Москва', departure_country='Россия',
+                arrival_city='Берлин', arrival_country='Германия',
+                departure_date=date(2026, 1, 1), arrival_date=date(2026, 1, 5),
+                estimated_price=1000,
+            )
+            for i in range(rows + options['row_by_row'])
+        )
+        shipment_ids = list(
+            Shipment.objects.filter(owner=owner).order_by('id').values_list('id', flat=True)
+        )
+
+        uploaded = make_file(rng, shipment_ids, rows)
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            report = import_bids(agent, iter_rows(uploaded), chunk_size=options['chunk_size'])
+            elapsed = time.perf_counter() - started
+        created = sum(1 for result in report if result['status'] == 'created')
+        self.stdout.write(
+            f'Пакетная загрузка: {len(report)} строк за {elapsed:.2f} с '
+            f'({len(report) / elapsed:.0f} строк/с), создано {created}, запросов {len(queries)}'
+        )
+
+        checked = options['row_by_row']
+        if not checked:
+            return
+        uploaded = make_file(rng, shipment_ids[rows:], checked)
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            import_row_by_row(agent, list(iter_rows(uploaded)))
+            per_row = (time.perf_counter() - started) / checked
+        self.stdout.write(
+            f'Построчно: {per_row * 1000:.3f} мс на строку, запросов {len(queries)} на {checked} строк'
+        )
+        self.stdout.write(self.style.SUCCESS(f'Ускорение x{per_row / (elapsed / len(report)):.0f}'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from bids.ratings import recount
+from core.batches import run_in_batches
+from users.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать у профилей агентов сумму и число оценок по таблице оценок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Количество профилей в одном UPDATE')
+
+    def handle(self, *args, **options):
+        total = run_in_batches(
+            UserProfile.objects.values_list('id', flat=True), options['batch_size'],
+            lambda ids: recount(UserProfile.objects.filter(id__in=ids)),
+            progress=lambda total: self.stdout.write(f'Обработано профилей: {total}'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Готово, обработано профилей: {total}'))
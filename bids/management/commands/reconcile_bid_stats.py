@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from bids.leaderboard import refresh
+from core.batches import run_in_batches
+from shipments.models import Shipment
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать у заявок число предложений и лучшую цену по таблице предложений'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Количество заявок в одном UPDATE')
+
+    def handle(self, *args, **options):
+        # Пачка - один UPDATE с подзапросами по индексу предложений заявки
+        total = run_in_batches(
+            Shipment.objects.values_list('id', flat=True), options['batch_size'],
+            lambda ids: refresh(Shipment.objects.filter(id__in=ids)),
+            progress=lambda total: self.stdout.write(f'Обработано заявок: {total}'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Готово, обработано заявок: {total}'))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from bids.lifecycle import get_config, sweep
+
+
+class Command(BaseCommand):
+    help = 'Перевести просроченные заявки в "Неактивна", а просроченные предложения - в "Истекло"'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Строк в одной пачке (по умолчанию LIFECYCLE_SWEEPER["CHUNK_SIZE"])')
+        parser.add_argument('--loop', action='store_true',
+                            help='Работать постоянно, повторяя проход через --interval секунд')
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Пауза между проходами в режиме --loop, секунд')
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or get_config()['INTERVAL']
+        while True:
+            report = sweep(chunk_size=options['chunk_size'])
+            self.stdout.write(f'Истекло {report}')
+            if not options['loop']:
+                break
+            # Между проходами соединение не держим
+            connection.close()
+            time.sleep(interval)
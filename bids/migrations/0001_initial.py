@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:42
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Bid',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Цена предложения')),
+                ('currency', models.CharField(choices=[('USD', 'USD'), ('EUR', 'EUR'), ('RUB', 'RUB')], default='USD', max_length=3, verbose_name='Валюта')),
+                ('departure_date', models.DateField(verbose_name='Предлагаемая дата отправления')),
+                ('arrival_date', models.DateField(verbose_name='Предлагаемая дата прибытия')),
+                ('notes', models.TextField(blank=True, verbose_name='Дополнительные заметки')),
+                ('status', models.CharField(choices=[('pending', 'В ожидании'), ('accepted', 'Принято'), ('rejected', 'Отклонено'), ('expired', 'Истекло'), ('cancelled', 'Отменено')], default='pending', max_length=20, verbose_name='Статус предложения')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('carrier_agent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='submitted_bids', to=settings.AUTH_USER_MODEL, verbose_name='Агент перевозчика')),
+            ],
+            options={
+                'verbose_name': 'Предложение',
+                'verbose_name_plural': 'Предложения',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('shipments', '0001_initial'),
+        ('bids', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bid',
+            name='shipment',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bids', to='shipments.shipment', verbose_name='Заявка на перевозку'),
+        ),
+        migrations.AddConstraint(
+            model_name='bid',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'accepted'])), fields=('shipment', 'carrier_agent'), name='unique_active_bid_per_carrier'),
+        ),
+    ]
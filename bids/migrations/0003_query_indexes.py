@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bids', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['-created_at', '-id'], name='bid_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['shipment', '-created_at', '-id'], name='bid_shipment_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['carrier_agent', '-created_at', '-id'], name='bid_agent_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['carrier_agent', 'status', '-created_at', '-id'], name='bid_agent_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='bid_status_recent_idx'),
+        ),
+    ]
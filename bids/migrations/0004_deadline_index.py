@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bids', '0003_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['status', 'departure_date'], name='bid_status_deadline_idx'),
+        ),
+    ]
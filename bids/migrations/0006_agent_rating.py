@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('bids', '0005_updated_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgentRating',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stars', models.PositiveSmallIntegerField(choices=[(1, '★'), (2, '★★'), (3, '★★★'), (4, '★★★★'), (5, '★★★★★')], verbose_name='Оценка')),
+                ('comment', models.TextField(blank=True, verbose_name='Отзыв')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата оценки')),
+                ('agent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ratings_received', to=settings.AUTH_USER_MODEL, verbose_name='Агент')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ratings_given', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('bid', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='rating', to='bids.bid', verbose_name='Принятое предложение')),
+            ],
+            options={
+                'verbose_name': 'Оценка агента',
+                'verbose_name_plural': 'Оценки агентов',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['agent', '-created_at'], name='rating_agent_recent_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='agentrating',
+            constraint=models.CheckConstraint(check=models.Q(('stars__gte', 1), ('stars__lte', 5)), name='rating_stars_range'),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from shipments.models import Shipment
 
@@ -71,10 +71,35 @@ class Bid(models.Model):
                 name='unique_active_bid_per_carrier'
             )
         ]
+        # Таблица предложений заявки, массовое отклонение в state_machine.accept(),
+        # "Мои предложения" агента и список в админке
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='bid_recent_idx'),
+            models.Index(fields=['shipment', '-created_at', '-id'], name='bid_shipment_recent_idx'),
+            models.Index(fields=['carrier_agent', '-created_at', '-id'], name='bid_agent_recent_idx'),
+            models.Index(fields=['carrier_agent', 'status', '-created_at', '-id'], name='bid_agent_status_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='bid_status_recent_idx'),
+            # Поиск просроченных ожидающих предложений (bids/lifecycle.py)
+            models.Index(fields=['status', 'departure_date'], name='bid_status_deadline_idx'),
+            # Инкрементальная выгрузка в хранилище отчетов (analytics/etl.py)
+            models.Index(fields=['updated_at', 'id'], name='bid_updated_idx'),
+        ]
 
     def __str__(self):
         return f'Предложение #{self.id} для заявки #{self.shipment.id}'
 
+    def save(self, *args, **kwargs):
+        from . import leaderboard
+
+        # Счетчики предложений заявки меняются в той же транзакции
+        creating = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if creating:
+                leaderboard.bid_created(self)
+            else:
+                leaderboard.refresh(Shipment.objects.filter(pk=self.shipment_id))
+
     def can_be_accepted(self):
         """Может ли предложение быть принято"""
         return self.status == 'pending' and self.shipment.status == 'active'
@@ -87,42 +112,65 @@ class Bid(models.Model):
         """Может ли предложение быть отменено агентом"""
         return self.status == 'pending'
 
-    def accept(self):
-        """Принять предложение"""
-        if not self.can_be_accepted():
-            return False
-
-        # Отклоняем все остальные предложения для этой заявки
-        Bid.objects.filter(
-            shipment=self.shipment,
-            status='pending'
-        ).exclude(id=self.id).update(status='rejected')
-
-        # Принимаем текущее предложение
-        self.status = 'accepted'
-        self.save()
-
-        # Обновляем статус заявки
-        self.shipment.status = 'in_progress'
-        self.shipment.accepted_bid = self
-        self.shipment.save()
-
-        return True
-
-    def reject(self):
-        """Отклонить предложение"""
-        if not self.can_be_rejected():
-            return False
-
-        self.status = 'rejected'
-        self.save()
-        return True
-
-    def cancel(self):
-        """Отменить предложение"""
-        if not self.can_be_cancelled():
-            return False
-
-        self.status = 'cancelled'
-        self.save()
-        return True
\ No newline at end of file
+
+def has_active_bid(shipment_id, agent_id):
+    """Есть ли у агента предложение к заявке, занятое unique_active_bid_per_carrier.
+
+    После IntegrityError при вставке отличает повтор предложения от
+    других нарушений целостности (внешние ключи, CHECK).
+    """
+    return Bid.objects.filter(
+        shipment_id=shipment_id, carrier_agent_id=agent_id, status__in=['pending', 'accepted']
+    ).exists()
+
+
+class AgentRating(models.Model):
+    """Оценка агента владельцем заявки после доставки - одна на принятое предложение"""
+
+    STARS_CHOICES = [(stars, '★' * stars) for stars in range(1, 6)]
+
+    bid = models.OneToOneField(
+        Bid,
+        on_delete=models.CASCADE,
+        related_name='rating',
+        verbose_name='Принятое предложение'
+    )
+    agent = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='ratings_received',
+        verbose_name='Агент'
+    )
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='ratings_given',
+        verbose_name='Автор'
+    )
+    stars = models.PositiveSmallIntegerField(
+        choices=STARS_CHOICES,
+        verbose_name='Оценка'
+    )
+    comment = models.TextField(
+        blank=True,
+        verbose_name='Отзыв'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата оценки'
+    )
+
+    class Meta:
+        verbose_name = 'Оценка агента'
+        verbose_name_plural = 'Оценки агентов'
+        ordering = ['-created_at']
+        constraints = [
+            models.CheckConstraint(check=models.Q(stars__gte=1, stars__lte=5), name='rating_stars_range'),
+        ]
+        # Отзывы об агенте и пересчет его суммы и числа оценок
+        indexes = [
+            models.Index(fields=['agent', '-created_at'], name='rating_agent_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f'Оценка {self.stars} агенту {self.agent_id} по предложению #{self.bid_id}'
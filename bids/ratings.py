@@ -0,0 +1,74 @@
+# bids/ratings.py - оценки агентов после доставки
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from shipments.models import Shipment
+from users import dashboard
+from users.models import UserProfile
+from . import state_machine
+from .models import AgentRating
+
+# Заявка с принятым предложением; оценка завершает ее через state_machine.complete
+RATEABLE_STATUSES = ('in_progress', 'completed')
+
+
+class RatingError(ValueError):
+    pass
+
+
+def _add_to_profile(agent_id, stars, count):
+    # Сумма и число меняются одним UPDATE от значений в строке, без чтения
+    UserProfile.objects.filter(user_id=agent_id).update(
+        rating_sum=F('rating_sum') + stars,
+        total_ratings=F('total_ratings') + count,
+    )
+
+
+def rate(bid, author, stars, comment=''):
+    """Оценить агента по принятому предложению и завершить заявку.
+
+    Завершение заявки, оценка и счетчики профиля агента - одна транзакция.
+    Первым идет условный UPDATE заявки (state_machine.complete), поэтому
+    транзакция сразу берет блокировку на запись; повторная оценка
+    упирается в уникальность bid.
+    """
+    if stars not in dict(AgentRating.STARS_CHOICES):
+        raise RatingError('Оценка - от 1 до 5 звезд.')
+    shipment = bid.shipment
+    if author.id != shipment.owner_id:
+        raise RatingError('Оценить агента может только владелец заявки.')
+    if shipment.accepted_bid_id != bid.id:
+        raise RatingError('Оценить можно только агента принятого предложения.')
+
+    try:
+        with transaction.atomic():
+            # Заявку в работе завершает машина состояний; завершенную
+            # раньше можно оценить, если оценки еще нет
+            if not state_machine.complete(shipment) and not Shipment.objects.filter(
+                pk=shipment.pk, status='completed'
+            ).exists():
+                raise RatingError('Заявка не в работе - оценить агента нельзя.')
+            rating = AgentRating.objects.create(
+                bid=bid, agent_id=bid.carrier_agent_id, author=author, stars=stars, comment=comment
+            )
+            _add_to_profile(bid.carrier_agent_id, stars, 1)
+            dashboard.invalidate(author.id, bid.carrier_agent_id)
+    except IntegrityError:
+        raise RatingError('Агент уже оценен по этой заявке.')
+    return rating
+
+
+def rating_deleted(rating):
+    """Убрать удаленную оценку (например, из админки) из счетчиков агента"""
+    _add_to_profile(rating.agent_id, -rating.stars, -1)
+
+
+def recount(profiles):
+    """Пересчитать сумму и число оценок профилей queryset по таблице оценок одним UPDATE"""
+    ratings = AgentRating.objects.filter(agent=OuterRef('user_id')).values('agent')
+    return profiles.update(
+        rating_sum=Coalesce(Subquery(ratings.annotate(total=Sum('stars')).values('total')), Value(0)),
+        total_ratings=Coalesce(Subquery(ratings.annotate(total=Count('id')).values('total')), Value(0)),
+    )
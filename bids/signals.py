@@ -0,0 +1,30 @@
+# bids/signals.py
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from shipments.models import Shipment
+from users import dashboard
+from .leaderboard import refresh
+from .models import AgentRating, Bid
+from .ratings import rating_deleted
+
+
+@receiver(post_delete, sender=Bid)
+def bid_deleted(sender, instance, **kwargs):
+    """Удаление предложения (например, из админки) - пересчитать сводку заявки"""
+    refresh(Shipment.objects.filter(pk=instance.shipment_id))
+
+
+@receiver(post_save, sender=Bid)
+@receiver(post_delete, sender=Bid)
+def bid_dashboards_changed(sender, instance, raw=False, **kwargs):
+    """Кабинеты агента и владельца заявки устаревают"""
+    if not raw:
+        dashboard.invalidate_bid(instance)
+
+
+@receiver(post_delete, sender=AgentRating)
+def agent_rating_deleted(sender, instance, **kwargs):
+    """Удаленная оценка больше не входит в сумму и число оценок агента"""
+    rating_deleted(instance)
@@ -0,0 +1,132 @@
+# bids/state_machine.py - переходы статусов предложения
+
+from django.db import transaction
+from django.utils import timezone
+
+from shipments.cache import shipments_changed
+from shipments.models import Shipment
+from users import dashboard
+from . import leaderboard
+from .models import Bid
+
+# Действие -> (исходный статус, новый статус)
+TRANSITIONS = {
+    'accept': ('pending', 'accepted'),
+    'reject': ('pending', 'rejected'),
+    'cancel': ('pending', 'cancelled'),
+    'expire': ('pending', 'expired'),
+}
+
+
+def bulk_transition(queryset, action, now=None):
+    """Перевести все предложения queryset в исходном статусе одним UPDATE.
+
+    queryset не должен фильтровать по статусу: по нему же после UPDATE
+    находятся заявки, чьи счетчики нужно пересчитать.
+    Возвращает число измененных строк. Принятие так выполнять нельзя -
+    оно меняет и заявку (см. accept).
+    """
+    if action == 'accept':
+        raise ValueError('Принятие выполняется только через accept()')
+    source, target = TRANSITIONS[action]
+    with transaction.atomic():
+        changed = queryset.filter(status=source).update(status=target, updated_at=now or timezone.now())
+        if changed:
+            leaderboard.refresh(Shipment.objects.filter(pk__in=queryset.values('shipment_id')))
+    return changed
+
+
+def _compare_and_set(bid_id, action, now):
+    """Условный UPDATE ... WHERE status=<исходный>. True - если переход выполнил этот вызов"""
+    source, target = TRANSITIONS[action]
+    return Bid.objects.filter(pk=bid_id, status=source).update(status=target, updated_at=now) == 1
+
+
+def _apply(bid, action, now):
+    # Синхронизировать объект в памяти с тем, что записано в БД
+    bid.status = TRANSITIONS[action][1]
+    bid.updated_at = now
+
+
+def transition(bid, action):
+    """Выполнить переход предложения.
+
+    Проверка статуса и запись - один UPDATE, поэтому из нескольких
+    одновременных переходов одного предложения выигрывает ровно один.
+    Возвращает True, если переход выполнил этот вызов.
+    """
+    if action == 'accept':
+        return accept(bid)
+    now = timezone.now()
+    with transaction.atomic():
+        if not _compare_and_set(bid.pk, action, now):
+            return False
+        leaderboard.bid_left_pending(bid)
+        dashboard.invalidate_bid(bid)
+    _apply(bid, action, now)
+    return True
+
+
+def accept(bid):
+    """Принять предложение: оно - 'accepted', заявка - 'in_progress', остальные - 'rejected'.
+
+    Все шаги - условные UPDATE в одной транзакции. Первым идет запись
+    (а не чтение), поэтому транзакция сразу берет блокировку на запись и
+    конкурирующие принятия, отмены и отклонения выполняются по очереди.
+    Если заявка уже не активна, транзакция откатывается.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        if not _compare_and_set(bid.pk, 'accept', now):
+            return False
+        claimed = Shipment.objects.filter(
+            pk=bid.shipment_id, status='active', accepted_bid__isnull=True
+        ).update(status='in_progress', accepted_bid=bid.pk, updated_at=now)
+        if not claimed:
+            transaction.set_rollback(True)
+            return False
+        Bid.objects.filter(
+            shipment_id=bid.shipment_id, status='pending'
+        ).update(status='rejected', updated_at=now)
+        # Счетчики и лучшая цена; заодно сбрасывает кэши списка заявок,
+        # ведь UPDATE не вызывает post_save
+        leaderboard.refresh(Shipment.objects.filter(pk=bid.shipment_id))
+        # Кабинеты агентов автоматически отклоненных предложений обновятся по TIMEOUT
+        dashboard.invalidate_bid(bid)
+
+    _apply(bid, 'accept', now)
+    if Bid.shipment.is_cached(bid):
+        bid.shipment.status = 'in_progress'
+        bid.shipment.accepted_bid_id = bid.pk
+        bid.shipment.updated_at = now
+    return True
+
+
+def reject(bid):
+    return transition(bid, 'reject')
+
+
+def cancel(bid):
+    return transition(bid, 'cancel')
+
+
+def complete(shipment, now=None):
+    """Завершить заявку после доставки: 'in_progress' -> 'completed'.
+
+    Как и переходы предложений - условный UPDATE: из одновременных
+    завершений выигрывает одно. Возвращает True, если заявку завершил
+    этот вызов.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        completed = Shipment.objects.filter(
+            pk=shipment.pk, status='in_progress', accepted_bid__isnull=False
+        ).update(status='completed', updated_at=now)
+        if not completed:
+            return False
+        dashboard.invalidate(shipment.owner_id)
+        # Статус заявки виден в списке - его версия и кэши устаревают
+        shipments_changed()
+    shipment.status = 'completed'
+    shipment.updated_at = now
+    return True
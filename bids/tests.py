@@ -1,3 +1,647 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import json
+from decimal import Decimal
+import random
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.http import HttpResponse, HttpResponseRedirect
+from django.test import TestCase, TransactionTestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.pagination import paginate_by_cursor
+from core import ratelimit
+from core.idempotency import idempotent
+from core.testing import QueryPlanAssertionsMixin, file_database
+from shipments.locations import invalidate_location_index
+from shipments.models import Shipment
+from shipments.tests import make_shipment
+from shipments.view_counter import discard_views
+from users.models import UserProfile
+from . import importer, lifecycle, ratings, state_machine
+from .models import AgentRating, Bid
+
+
+def make_bid(shipment, agent, **kwargs):
+    data = {
+        'shipment': shipment,
+        'carrier_agent': agent,
+        'price': 900,
+        'departure_date': shipment.departure_date,
+        'arrival_date': shipment.arrival_date,
+    }
+    data.update(kwargs)
+    return Bid.objects.create(**data)
+
+
+class BidQueryPlanTests(QueryPlanAssertionsMixin, TestCase):
+    """Горячие запросы к предложениям не должны деградировать до полного просмотра"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='x')
+        cls.admin = User.objects.create_superuser('admin', password='x')
+        cls.agents = [User.objects.create_user(f'agent{i}', password='x') for i in range(3)]
+        cls.shipment = make_shipment(cls.owner)
+        cls.bids = [make_bid(cls.shipment, agent) for agent in cls.agents]
+
+    def test_shipment_bid_table(self):
+        self.assertCallUsesIndexes(paginate_by_cursor, self.shipment.bids.all(), None, 20)
+
+    def test_active_bid_lookup(self):
+        queryset = Bid.objects.filter(
+            shipment=self.shipment,
+            carrier_agent=self.agents[0],
+            status__in=['pending', 'accepted']
+        )
+        self.assertQuerysetUsesIndex(queryset)
+
+    def test_accept(self):
+        bid = Bid.objects.select_related('shipment').get(pk=self.bids[0].pk)
+        self.assertCallUsesIndexes(state_machine.accept, bid)
+
+    def test_agent_bid_list(self):
+        agent = self.agents[0]
+        self.assertCallUsesIndexes(paginate_by_cursor, Bid.objects.filter(carrier_agent=agent), None, 20)
+        self.assertCallUsesIndexes(
+            paginate_by_cursor, Bid.objects.filter(carrier_agent=agent, status='pending'), None, 20
+        )
+
+    def test_admin_changelist(self):
+        request = RequestFactory().get('/admin/bids/bid/', {'status__exact': 'pending'})
+        request.user = self.admin
+        model_admin = admin.site._registry[Bid]
+        changelist = model_admin.get_changelist_instance(request)
+        self.assertQuerysetUsesIndex(changelist.get_queryset(request)[:model_admin.list_per_page])
+
+
+class StateMachineTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='x')
+        cls.agents = [User.objects.create_user(f'agent{i}', password='x') for i in range(3)]
+
+    def setUp(self):
+        self.shipment = make_shipment(self.owner)
+        self.bids = [make_bid(self.shipment, agent) for agent in self.agents]
+
+    def test_accept_rejects_other_pending_bids(self):
+        state_machine.cancel(self.bids[2])
+        self.assertTrue(state_machine.accept(self.bids[0]))
+
+        statuses = dict(Bid.objects.values_list('id', 'status'))
+        self.assertEqual(
+            [statuses[bid.id] for bid in self.bids], ['accepted', 'rejected', 'cancelled']
+        )
+        self.shipment.refresh_from_db()
+        self.assertEqual(self.shipment.status, 'in_progress')
+        self.assertEqual(self.shipment.accepted_bid_id, self.bids[0].id)
+
+    def test_transition_from_stale_instance_loses(self):
+        stale = Bid.objects.get(pk=self.bids[0].pk)
+        self.assertTrue(state_machine.cancel(self.bids[0]))
+        self.assertFalse(state_machine.accept(stale))
+        self.assertFalse(state_machine.reject(stale))
+        self.assertEqual(Bid.objects.get(pk=stale.pk).status, 'cancelled')
+        self.assertEqual(Shipment.objects.get(pk=self.shipment.pk).status, 'active')
+
+    def test_accept_on_inactive_shipment_rolls_back(self):
+        Shipment.objects.filter(pk=self.shipment.pk).update(status='cancelled')
+        self.assertFalse(state_machine.accept(self.bids[0]))
+        self.assertEqual(Bid.objects.filter(shipment=self.shipment, status='pending').count(), 3)
+
+    def test_transition_without_reads(self):
+        # UPDATE предложения, UPDATE сводки заявки и версии списка, без предварительных SELECT
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertTrue(state_machine.reject(self.bids[1]))
+        statements = [query['sql'].split(' ', 1)[0] for query in ctx.captured_queries]
+        self.assertEqual([sql for sql in statements if sql in ('SELECT', 'UPDATE')], ['UPDATE', 'UPDATE', 'UPDATE'])
+        self.assertEqual(self.bids[1].status, 'rejected')
+
+
+class StateMachineConcurrencyTests(TransactionTestCase):
+    """Переходы из нескольких потоков над файловой БД SQLite.
+
+    По умолчанию - облегченный прогон на временной копии тестовой БД,
+    полный - на файловой тестовой БД (см. DATABASES['TEST']).
+    """
+
+    ROUNDS = 5 if settings.DATABASES['default']['TEST']['NAME'] else 2
+    BIDS = 4
+    THREADS_PER_BID = 3
+
+    @classmethod
+    def setUpClass(cls):
+        cls.enterClassContext(file_database())
+        super().setUpClass()
+
+    def setUp(self):
+        invalidate_location_index()
+        self.addCleanup(invalidate_location_index)
+        self.owner = User.objects.create_user('owner', password='x')
+        self.agents = [User.objects.create_user(f'agent{i}', password='x') for i in range(self.BIDS)]
+
+    def hammer(self, bids):
+        actions = [
+            (bid, random.choice(('accept', 'accept', 'reject', 'cancel')))
+            for bid in bids for _ in range(self.THREADS_PER_BID)
+        ]
+        random.shuffle(actions)
+        barrier = threading.Barrier(len(actions))
+        results = []
+        errors = []
+
+        def run(bid_id, action):
+            try:
+                bid = Bid.objects.get(pk=bid_id)
+                barrier.wait()
+                results.append((bid_id, action, state_machine.transition(bid, action)))
+            except Exception as exc:  # noqa: BLE001 - ошибку проверит основной поток
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(bid.pk, action)) for bid, action in actions]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        return results
+
+    def test_at_most_one_accepted_bid(self):
+        for _ in range(self.ROUNDS):
+            shipment = make_shipment(self.owner)
+            bids = [make_bid(shipment, agent) for agent in self.agents]
+            results = self.hammer(bids)
+
+            final = dict(Bid.objects.filter(shipment=shipment).values_list('id', 'status'))
+            accepted = [bid_id for bid_id, status in final.items() if status == 'accepted']
+            self.assertLessEqual(len(accepted), 1)
+
+            # У каждого предложения не больше одного выигравшего перехода,
+            # и итоговый статус - результат именно этого перехода
+            winners = {}
+            for bid_id, action, won in results:
+                if won:
+                    self.assertNotIn(bid_id, winners)
+                    winners[bid_id] = action
+            for bid_id, action in winners.items():
+                self.assertEqual(final[bid_id], state_machine.TRANSITIONS[action][1])
+
+            shipment.refresh_from_db()
+            if accepted:
+                self.assertEqual(shipment.status, 'in_progress')
+                self.assertEqual(shipment.accepted_bid_id, accepted[0])
+                self.assertNotIn('pending', final.values())
+            else:
+                self.assertEqual(shipment.status, 'active')
+                self.assertIsNone(shipment.accepted_bid_id)
+
+
+class LifecycleSweeperTests(QueryPlanAssertionsMixin, TestCase):
+    today = datetime.date(2026, 2, 1)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='x')
+        cls.agents = [User.objects.create_user(f'agent{i}', password='x') for i in range(2)]
+
+    def setUp(self):
+        past = datetime.date(2026, 1, 10)
+        self.overdue = [make_shipment(self.owner, departure_date=past) for _ in range(5)]
+        self.extended = make_shipment(
+            self.owner, departure_date=past, latest_departure_date=datetime.date(2026, 2, 5)
+        )
+        self.future = make_shipment(self.owner, departure_date=datetime.date(2026, 3, 1))
+        self.overdue_bids = [make_bid(shipment, self.agents[0]) for shipment in self.overdue]
+        # Предложение к живой заявке, но с прошедшей датой отправления
+        self.stale_bid = make_bid(self.future, self.agents[0], departure_date=past)
+        self.live_bids = [
+            make_bid(self.future, self.agents[1], departure_date=datetime.date(2026, 3, 1)),
+            make_bid(self.extended, self.agents[1], departure_date=datetime.date(2026, 2, 3)),
+        ]
+
+    def test_sweep_in_chunks(self):
+        report = lifecycle.sweep(today=self.today, chunk_size=2)
+        self.assertEqual((report.shipments, report.bids), (5, 6))
+        self.assertEqual(report.chunks, 3 + 1)
+
+        statuses = dict(Shipment.objects.values_list('id', 'status'))
+        self.assertEqual({statuses[shipment.id] for shipment in self.overdue}, {'inactive'})
+        self.assertEqual(statuses[self.extended.id], 'active')
+        self.assertEqual(statuses[self.future.id], 'active')
+
+        bids = dict(Bid.objects.values_list('id', 'status'))
+        self.assertEqual({bids[bid.id] for bid in [*self.overdue_bids, self.stale_bid]}, {'expired'})
+        self.assertEqual({bids[bid.id] for bid in self.live_bids}, {'pending'})
+
+        # Повторный проход (или проход другого узла) ничего не меняет
+        report = lifecycle.sweep(today=self.today)
+        self.assertEqual((report.rows, report.chunks), (0, 0))
+
+    def test_chunk_replayed_by_second_node(self):
+        ids = [shipment.id for shipment in self.overdue]
+        now = datetime.datetime(2026, 2, 1, tzinfo=datetime.timezone.utc)
+        self.assertEqual(lifecycle.expire_shipments(ids, self.today, now), (5, 5))
+        self.assertEqual(lifecycle.expire_shipments(ids, self.today, now), (0, 0))
+
+    def test_due_rows_found_by_index(self):
+        self.assertCallUsesIndexes(lifecycle.sweep, today=self.today, chunk_size=2)
+
+    def test_command_reports_throughput(self):
+        out = io.StringIO()
+        call_command('sweep_expired', stdout=out)
+        self.assertIn('строк/с', out.getvalue())
+
+
+@override_settings(CURRENCY_RATES={'USD': Decimal('1'), 'EUR': Decimal('2'), 'RUB': Decimal('0.01')})
+class LeaderboardTests(QueryPlanAssertionsMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='x')
+        cls.agents = [User.objects.create_user(f'agent{i}', password='x') for i in range(3)]
+
+    def setUp(self):
+        self.shipment = make_shipment(self.owner, currency='USD')
+        self.empty = make_shipment(self.owner)
+
+    def stats(self, shipment=None):
+        shipment = Shipment.objects.get(pk=(shipment or self.shipment).pk)
+        return shipment.bid_count, shipment.pending_bid_count, shipment.best_bid_price
+
+    def test_maintained_on_create_and_transitions(self):
+        usd = make_bid(self.shipment, self.agents[0], price=900, currency='USD')
+        eur = make_bid(self.shipment, self.agents[1], price=400, currency='EUR')
+        rub = make_bid(self.shipment, self.agents[2], price=95000, currency='RUB')
+        self.assertEqual(self.stats(), (3, 3, Decimal('800.00')))
+
+        state_machine.cancel(eur)
+        self.assertEqual(self.stats(), (3, 2, Decimal('900.00')))
+
+        state_machine.accept(rub)
+        self.assertEqual(self.stats(), (3, 0, Decimal('950.00')))
+        self.assertEqual(Bid.objects.get(pk=usd.pk).status, 'rejected')
+
+    def test_expiry_and_delete_refresh(self):
+        bids = [make_bid(self.shipment, agent, price=100 * (i + 1)) for i, agent in enumerate(self.agents)]
+        Bid.objects.filter(pk=bids[0].pk).update(departure_date=datetime.date(2026, 1, 1))
+        lifecycle.sweep(today=datetime.date(2026, 1, 5))
+        self.assertEqual(self.stats(), (3, 2, Decimal('200.00')))
+
+        bids[1].delete()
+        self.assertEqual(self.stats(), (2, 1, Decimal('300.00')))
+
+    def test_stale_full_save_keeps_counters(self):
+        stale = Shipment.objects.get(pk=self.shipment.pk)
+        make_bid(self.shipment, self.agents[0], price=500)
+        stale.title = 'Новое название'
+        stale.save()
+        self.assertEqual(self.stats(), (1, 1, Decimal('500.00')))
+        self.assertEqual(Shipment.objects.get(pk=self.shipment.pk).title, 'Новое название')
+
+    def test_reconcile(self):
+        make_bid(self.shipment, self.agents[0], price=500, currency='EUR')
+        Shipment.objects.update(bid_count=7, pending_bid_count=7, best_bid_price=1)
+        call_command('reconcile_bid_stats', batch_size=1, stdout=io.StringIO())
+        self.assertEqual(self.stats(), (1, 1, Decimal('1000.00')))
+        self.assertEqual(self.stats(self.empty), (0, 0, None))
+
+    def test_list_sort_by_best_offer(self):
+        cheap = make_shipment(self.owner)
+        make_bid(cheap, self.agents[0], price=100)
+        make_bid(self.shipment, self.agents[0], price=500)
+
+        url = reverse('shipment_list_api')
+        for sort, expected in (
+            ('best_bid_price', [cheap, self.shipment, self.empty]),
+            ('-best_bid_price', [self.shipment, cheap, self.empty]),
+        ):
+            response = self.client.get(url, {'sort': sort})
+            self.assertEqual([item['id'] for item in response.json()['results']], [s.id for s in expected])
+
+    def test_detail_ranks_bids_in_shipment_currency(self):
+        usd = make_bid(self.shipment, self.agents[0], price=900, currency='USD')
+        eur = make_bid(self.shipment, self.agents[1], price=400, currency='EUR')
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('shipment_detail', args=[self.shipment.id]), {'bids_sort': 'price'})
+        ranked = list(response.context['bid_page'])
+        self.assertEqual([bid.id for bid in ranked], [eur.id, usd.id])
+        self.assertEqual([bid.normalized_price for bid in ranked], [Decimal('800.00'), Decimal('900.00')])
+        # Ожидаемая стоимость 1000 USD: оба предложения дешевле
+        self.assertEqual([bid.price_delta for bid in ranked], [Decimal('-200.00'), Decimal('-100.00')])
+
+    def test_list_sort_by_best_offer_across_currencies(self):
+        # 1000 RUB = 10 USD дешевле 20 USD, хотя число больше
+        rub = make_shipment(self.owner, currency='RUB')
+        make_bid(rub, self.agents[0], price=1000, currency='RUB')
+        make_bid(self.shipment, self.agents[0], price=20)
+
+        response = self.client.get(reverse('shipment_list_api'), {'sort': 'best_bid_price'})
+        self.assertEqual([item['id'] for item in response.json()['results']], [rub.id, self.shipment.id, self.empty.id])
+
+    def test_sort_uses_index(self):
+        for field in ('bid_count', 'pending_bid_count'):
+            queryset = Shipment.objects.filter(status='active').order_by(field, 'id')
+            self.assertQuerysetUsesIndex(queryset[:10])
+
+
+class AgentRatingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='x')
+        cls.agent = User.objects.create_user('agent', password='x')
+        UserProfile.objects.create(user=cls.agent, user_type='agent', company_name='Аэро')
+
+    def setUp(self):
+        self.shipments = [make_shipment(self.owner) for _ in range(2)]
+        self.bids = [make_bid(shipment, self.agent) for shipment in self.shipments]
+        for bid in self.bids:
+            state_machine.accept(bid)
+
+    def profile(self):
+        return UserProfile.objects.get(user=self.agent)
+
+    def test_running_sum_and_count(self):
+        # UPDATE заявки и версии списка, INSERT оценки, UPDATE профиля - без чтения оценок агента
+        with CaptureQueriesContext(connection) as ctx:
+            ratings.rate(self.bids[0], self.owner, 5, 'Быстро')
+        statements = [query['sql'].split(' ', 1)[0] for query in ctx.captured_queries]
+        self.assertEqual([sql for sql in statements if sql in ('SELECT', 'INSERT', 'UPDATE')],
+                         ['UPDATE', 'UPDATE', 'INSERT', 'UPDATE'])
+        ratings.rate(self.bids[1], self.owner, 2)
+        profile = self.profile()
+        self.assertEqual((profile.rating_sum, profile.total_ratings, profile.rating), (7, 2, 3.5))
+        self.assertEqual(Shipment.objects.get(pk=self.shipments[0].pk).status, 'completed')
+
+        # Удаление оценки вычитается, пересчет по таблице дает то же
+        AgentRating.objects.get(bid=self.bids[1]).delete()
+        self.assertEqual((self.profile().rating_sum, self.profile().total_ratings), (5, 1))
+        UserProfile.objects.filter(user=self.agent).update(rating_sum=0, total_ratings=0)
+        call_command('reconcile_agent_ratings', batch_size=1, stdout=io.StringIO())
+        self.assertEqual((self.profile().rating_sum, self.profile().total_ratings), (5, 1))
+
+    def test_rating_rules(self):
+        with self.assertRaises(ratings.RatingError):
+            ratings.rate(self.bids[0], self.agent, 5)
+        with self.assertRaises(ratings.RatingError):
+            ratings.rate(self.bids[0], self.owner, 6)
+        ratings.rate(self.bids[0], self.owner, 4)
+        with self.assertRaises(ratings.RatingError):
+            ratings.rate(Bid.objects.select_related('shipment').get(pk=self.bids[0].pk), self.owner, 1)
+        self.assertEqual(self.profile().total_ratings, 1)
+
+    def test_completion_goes_through_state_machine(self):
+        active = make_shipment(self.owner)
+        self.assertFalse(state_machine.complete(active))
+        self.assertTrue(state_machine.complete(self.shipments[0]))
+        self.assertFalse(state_machine.complete(self.shipments[0]))
+        # Завершенную заявку можно оценить один раз
+        ratings.rate(self.bids[0], self.owner, 5)
+        self.assertEqual(self.profile().total_ratings, 1)
+
+        # Заявку, с которой сняли исполнителя, оценка не завершает
+        Shipment.objects.filter(pk=self.shipments[1].pk).update(status='inactive')
+        with self.assertRaises(ratings.RatingError):
+            ratings.rate(Bid.objects.select_related('shipment').get(pk=self.bids[1].pk), self.owner, 5)
+        self.assertEqual(Shipment.objects.get(pk=self.shipments[1].pk).status, 'inactive')
+
+    def test_stale_profile_save_keeps_ratings(self):
+        stale = self.profile()
+        ratings.rate(self.bids[0], self.owner, 5)
+        stale.company_name = 'Аэро-2'
+        stale.save()
+        profile = self.profile()
+        self.assertEqual((profile.company_name, profile.rating_sum, profile.total_ratings), ('Аэро-2', 5, 1))
+
+    def test_rate_from_shipment_page(self):
+        self.client.force_login(self.owner)
+        url = reverse('shipment_detail', args=[self.shipments[0].id])
+        self.assertContains(self.client.get(url), 'Подтвердить доставку')
+        response = self.client.post(reverse('rate_agent', args=[self.bids[0].id]), {'stars': 4, 'comment': ''})
+        self.assertRedirects(response, url)
+        response = self.client.get(url)
+        self.assertNotContains(response, 'Подтвердить доставку')
+        self.assertContains(response, '★ 4.0')
+
+
+@override_settings(RATE_LIMITS={'bid_create': {'user': {'default': '3/m', 'staff': '100/m'}, 'ip': '50/m'}})
+class BidSubmissionProtectionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='x')
+        cls.agent = User.objects.create_user('agent', password='x')
+        UserProfile.objects.create(user=cls.agent, user_type='agent')
+        cls.shipment = make_shipment(cls.owner)
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        # Переход на страницу заявки учитывает просмотр - он не должен пережить тест
+        self.addCleanup(discard_views)
+        self.client.force_login(self.agent)
+        self.url = reverse('create_bid', args=[self.shipment.id])
+        self.data = {'price': 900, 'currency': 'USD', 'departure_date': '2026-01-10', 'arrival_date': '2026-01-12'}
+
+    def test_retry_with_idempotency_key_is_replayed_without_db(self):
+        first = self.client.post(self.url, {**self.data, 'idempotency_key': 'k1'})
+        self.assertEqual(first.status_code, 302)
+        with self.assertNumQueries(0):
+            retry = self.client.post(self.url, {**self.data, 'idempotency_key': 'k1'})
+        self.assertEqual((retry.status_code, retry['Location']), (302, first['Location']))
+        self.assertEqual(retry['Idempotent-Replay'], 'true')
+        self.assertEqual(Bid.objects.filter(shipment=self.shipment).count(), 1)
+
+        # Тот же ключ в заголовке для интеграций
+        response = self.client.post(self.url, self.data, HTTP_IDEMPOTENCY_KEY='k1')
+        self.assertEqual(response['Idempotent-Replay'], 'true')
+
+    def test_rate_limited_retry_with_same_key_succeeds(self):
+        for number in range(3):
+            self.client.post(self.url, self.data, HTTP_IDEMPOTENCY_KEY=f'fill{number}')
+        Bid.objects.filter(shipment=self.shipment).delete()
+        limited = self.client.post(self.url, self.data, HTTP_IDEMPOTENCY_KEY='k2')
+        self.assertEqual(limited.status_code, 429)
+
+        # Ведро пополнилось - тот же ключ выполняет запрос, а не повторяет 429
+        cache.delete(f'ratelimit:bid_create:user:{self.agent.id}')
+        response = self.client.post(self.url, self.data, HTTP_IDEMPOTENCY_KEY='k2')
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn('Idempotent-Replay', response)
+        self.assertEqual(Bid.objects.filter(shipment=self.shipment).count(), 1)
+
+    def test_anonymous_then_logged_in_with_same_key(self):
+        self.client.logout()
+        response = self.client.post(self.url, self.data, HTTP_IDEMPOTENCY_KEY='k3')
+        self.assertTrue(response['Location'].startswith(settings.LOGIN_URL))
+
+        self.client.force_login(self.agent)
+        response = self.client.post(self.url, self.data, HTTP_IDEMPOTENCY_KEY='k3')
+        self.assertEqual(response['Location'], reverse('shipment_detail', args=[self.shipment.id]))
+        self.assertNotIn('Idempotent-Replay', response)
+        self.assertEqual(Bid.objects.filter(shipment=self.shipment).count(), 1)
+
+    def test_limiter_and_login_responses_are_not_stored(self):
+        responses = iter([
+            HttpResponse(status=429),
+            HttpResponseRedirect(f'{settings.LOGIN_URL}?next=/bids/'),
+            HttpResponse('ok'),
+        ])
+        view = idempotent(lambda request: next(responses))
+        factory = RequestFactory()
+        statuses = []
+        for _ in range(4):
+            request = factory.post('/bids/', HTTP_IDEMPOTENCY_KEY='k4')
+            statuses.append(view(request).status_code)
+        # Четвертый запрос - повтор сохраненного 200, view больше не вызывается
+        self.assertEqual(statuses, [429, 302, 200, 200])
+
+    def test_duplicate_without_key_is_not_a_server_error(self):
+        self.client.post(self.url, self.data)
+        response = self.client.post(self.url, self.data, follow=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'уже есть активное предложение')
+        self.assertEqual(Bid.objects.filter(shipment=self.shipment).count(), 1)
+
+    def test_other_integrity_errors_are_not_reported_as_duplicates(self):
+        with mock.patch.object(Bid, 'save', side_effect=IntegrityError('FOREIGN KEY constraint failed')):
+            with self.assertRaises(IntegrityError):
+                self.client.post(self.url, self.data)
+
+    def test_token_bucket_per_agent(self):
+        statuses = [self.client.post(self.url, self.data).status_code for _ in range(4)]
+        self.assertEqual(statuses, [302, 302, 302, 429])
+        response = self.client.post(self.url, self.data)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+        # Ведро пополняется со временем: через 20 секунд при 3/m - один токен
+        key = f'ratelimit:bid_create:user:{self.agent.id}'
+        tokens, updated = cache.get(key)
+        cache.set(key, (tokens, updated - 20))
+        self.assertEqual(self.client.post(self.url, self.data).status_code, 302)
+
+    def test_tiers(self):
+        self.agent.is_staff = True
+        self.assertEqual(ratelimit.user_tier(self.agent), 'staff')
+        self.assertEqual(ratelimit.user_tier(self.owner), 'default')
+        self.assertEqual(ratelimit.parse_rate('30/m'), (30, 0.5))
+
+
+class BidImportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='x')
+        cls.agent = User.objects.create_user('agent', password='x')
+        UserProfile.objects.create(user=cls.agent, user_type='agent')
+        cls.shipments = [make_shipment(cls.owner, currency='USD') for _ in range(3)]
+        cls.own = make_shipment(cls.agent)
+        cls.closed = make_shipment(cls.owner, status='inactive')
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def row(self, shipment_id, **kwargs):
+        return {'shipment_id': shipment_id, 'price': '900', 'currency': 'USD',
+                'departure_date': '2026-01-10', 'arrival_date': '2026-01-12', 'notes': '', **kwargs}
+
+    def csv_file(self, rows):
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=importer.FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+        uploaded = io.BytesIO(buffer.getvalue().encode())
+        uploaded.name = 'bids.csv'
+        return uploaded
+
+    def test_report_per_row(self):
+        make_bid(self.shipments[1], self.agent)
+        rows = [
+            self.row(self.shipments[0].id),
+            self.row(self.shipments[2].id, departure_date='2026-01-15'),
+            self.row(999999),
+            self.row(self.closed.id),
+            self.row(self.own.id),
+            self.row(self.shipments[1].id),
+            self.row(self.shipments[2].id),
+            self.row(self.shipments[2].id, price='500'),
+            self.row(''),
+        ]
+        report = importer.import_bids(self.agent, importer.iter_rows(self.csv_file(rows)))
+
+        self.assertEqual([result['status'] for result in report],
+                         ['created', 'error', 'error', 'error', 'error', 'error', 'created', 'error', 'error'])
+        errors = [result['errors'] for result in report]
+        self.assertEqual(errors[1], ['Дата отправления не может быть позже даты прибытия.'])
+        self.assertEqual(errors[2], ['Заявка не найдена.'])
+        self.assertEqual(errors[3], ['Нельзя создать предложение для неактивной заявки.'])
+        self.assertEqual(errors[4], ['Нельзя создать предложение к своей собственной заявке.'])
+        self.assertEqual(errors[5], errors[7])
+        self.assertIn('уже есть активное предложение', errors[5][0])
+
+        created = Bid.objects.get(pk=report[0]['bid_id'])
+        self.assertEqual((created.carrier_agent, created.price), (self.agent, Decimal('900')))
+        shipment = Shipment.objects.get(pk=self.shipments[2].pk)
+        self.assertEqual((shipment.bid_count, shipment.best_bid_price), (1, Decimal('900.00')))
+
+    def test_queries_do_not_grow_with_rows(self):
+        shipments = Shipment.objects.bulk_create(
+            Shipment(title=f'Груз {i}', owner=self.owner, status='active', weight=1, length=1, width=1, height=1,
+                     departure_city='Москва', departure_country='Россия', arrival_city='Берлин',
+                     arrival_country='Германия', departure_date=datetime.date(2026, 1, 10),
+                     arrival_date=datetime.date(2026, 1, 12), estimated_price=1000)
+            for i in range(60)
+        )
+        ids = [shipment.id for shipment in Shipment.objects.filter(title__startswith='Груз ').order_by('id')]
+
+        def run(rows):
+            with CaptureQueriesContext(connection) as queries:
+                report = importer.import_bids(self.agent, rows, chunk_size=100)
+            self.assertTrue(all(result['status'] == 'created' for result in report))
+            return len(queries)
+
+        self.assertEqual(run([self.row(i) for i in ids[:10]]), run([self.row(i) for i in ids[10:60]]))
+        self.assertEqual(len(shipments), Bid.objects.filter(carrier_agent=self.agent).count())
+
+    def test_json_lines_and_array(self):
+        lines = '\n'.join(json.dumps(self.row(shipment.id)) for shipment in self.shipments[:2])
+        uploaded = io.BytesIO(lines.encode())
+        uploaded.name = 'bids.jsonl'
+        self.assertEqual(len(list(importer.iter_rows(uploaded))), 2)
+
+        uploaded = io.BytesIO(json.dumps([self.row(self.shipments[0].id)], indent=2).encode())
+        self.assertEqual(list(importer.iter_rows(uploaded, 'json')), [self.row(self.shipments[0].id)])
+
+        with self.assertRaises(importer.BidImportError):
+            list(importer.iter_rows(io.BytesIO(b'{"shipment_id": 1')))
+
+    def test_upload_view(self):
+        url = reverse('bid_import')
+        self.client.force_login(self.agent)
+        uploaded = self.csv_file([self.row(self.shipments[0].id), self.row(999999)])
+        response = self.client.post(url + '?format=json', {'file': uploaded})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['rows'], data['created'], data['errors']), (2, 1, 1))
+        self.assertEqual(data['results'][1]['errors'], ['Заявка не найдена.'])
+
+        response = self.client.post(url, {'file': self.csv_file([self.row(self.shipments[1].id)])})
+        self.assertContains(response, 'Создано предложений: 1 из 1.')
+
+        self.client.force_login(self.owner)
+        self.assertRedirects(self.client.get(url), reverse('bid_list'))
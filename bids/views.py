@@ -1,21 +1,33 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db import IntegrityError, transaction
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 
-from .models import Bid
+from .events import publish_bid_created, publish_status_change
+from .importer import BidImportError, import_bids, iter_rows
+from .ratings import RatingError, rate
+from .models import Bid, has_active_bid
+from . import state_machine
 from shipments.models import Shipment
-from .forms import BidForm
+from .forms import AgentRatingForm, BidForm
+from core.conditional import conditional_page, page_etag
+from core.currency import convert, rates_version
+from core.idempotency import idempotent
+from core.ratelimit import rate_limited
+from core.pagination import paginate
 
 
+@idempotent
+@rate_limited('bid_create')
 @login_required
 def create_bid(request, shipment_id):
     """Создание предложения к заявке"""
     shipment = get_object_or_404(Shipment, id=shipment_id)
 
     # Проверяем, что пользователь - агент перевозчика
-    if not request.user.userprofile.is_carrier_agent:
+    if not request.roles.is_carrier_agent:
         messages.error(request, 'Только агенты перевозчиков могут создавать предложения.')
         return redirect('shipment_detail', shipment_id=shipment_id)
 
@@ -36,18 +48,17 @@ def create_bid(request, shipment_id):
             bid.shipment = shipment
             bid.carrier_agent = request.user
 
-            # Проверяем, нет ли уже активного предложения от этого агента
-            existing_bid = Bid.objects.filter(
-                shipment=shipment,
-                carrier_agent=request.user,
-                status__in=['pending', 'accepted']
-            ).first()
-
-            if existing_bid:
+            # Второе активное предложение агента отсекает уникальное
+            # ограничение unique_active_bid_per_carrier - без отдельного запроса
+            try:
+                with transaction.atomic():
+                    bid.save()
+            except IntegrityError:
+                if not has_active_bid(shipment.id, request.user.id):
+                    raise
                 messages.error(request, 'У вас уже есть активное предложение для этой заявки.')
                 return redirect('shipment_detail', shipment_id=shipment_id)
-
-            bid.save()
+            publish_bid_created(bid)
             messages.success(request, 'Предложение успешно создано!')
             return redirect('shipment_detail', shipment_id=shipment_id)
     else:
@@ -65,6 +76,85 @@ def create_bid(request, shipment_id):
 
 
 @login_required
+def bid_list(request):
+    """Мои предложения (для агента)"""
+    bids = Bid.objects.filter(carrier_agent=request.user).select_related('shipment')
+
+    status_filter = request.GET.get('status')
+    if status_filter:
+        bids = bids.filter(status=status_filter)
+
+    page_obj = paginate(request, bids, per_page=20)
+
+    query_params = request.GET.copy()
+    query_params.pop('cursor', None)
+    query_params.pop('page', None)
+
+    return render(request, 'bids/bid_list.html', {
+        'page_obj': page_obj,
+        'query_string': query_params.urlencode(),
+        'status_filter': status_filter,
+    })
+
+
+@rate_limited('bid_import')
+@login_required
+def bid_import(request):
+    """Массовая загрузка предложений из CSV/JSON-файла"""
+    if not request.roles.is_carrier_agent:
+        messages.error(request, 'Только агенты перевозчиков могут создавать предложения.')
+        return redirect('bid_list')
+
+    wants_json = request.GET.get('format') == 'json' or 'application/json' in request.headers.get('Accept', '')
+    report = None
+    if request.method == 'POST':
+        uploaded = request.FILES.get('file')
+        if uploaded is None:
+            error = 'Выберите файл для загрузки.'
+        else:
+            try:
+                report = import_bids(request.user, iter_rows(uploaded, request.POST.get('file_format') or None))
+                error = None
+            except BidImportError as exc:
+                error = str(exc)
+        if error:
+            if wants_json:
+                return JsonResponse({'error': error}, status=400)
+            messages.error(request, error)
+        else:
+            created = sum(1 for result in report if result['status'] == 'created')
+            summary = {'rows': len(report), 'created': created, 'errors': len(report) - created}
+            if wants_json:
+                return JsonResponse({**summary, 'results': report})
+            messages.success(request, f'Создано предложений: {created} из {len(report)}.')
+
+    return render(request, 'bids/bid_import.html', {
+        'report': report,
+        'failed': [result for result in report if result['status'] == 'error'] if report else [],
+    })
+
+
+def bid_detail_validators(request, bid_id):
+    """Версия страницы предложения: предложение, его заявка и роль зрителя"""
+    row = Bid.objects.filter(id=bid_id).values_list(
+        'updated_at', 'shipment__updated_at', 'carrier_agent_id', 'shipment__owner_id'
+    ).first()
+    if row is None:
+        return None
+    updated_at, shipment_updated_at, agent_id, owner_id = row
+    if request.user.id == owner_id:
+        role = 'owner'
+    elif request.user.id == agent_id:
+        role = 'agent'
+    else:
+        # Чужое предложение - view ответит редиректом
+        return None
+    etag = page_etag(request, updated_at.isoformat(), shipment_updated_at.isoformat(), role, rates_version())
+    return etag, max(updated_at, shipment_updated_at)
+
+
+@login_required
+@conditional_page(bid_detail_validators)
 def bid_detail(request, bid_id):
     """Детальная страница предложения"""
     bid = get_object_or_404(Bid, id=bid_id)
@@ -74,14 +164,21 @@ def bid_detail(request, bid_id):
         messages.error(request, 'У вас нет прав для просмотра этого предложения.')
         return redirect('dashboard')
 
+    shipment = bid.shipment
     return render(request, 'bids/bid_detail.html', {
         'bid': bid,
+        # Цена в валюте заявки - для сравнения с ожидаемой стоимостью
+        'price_in_shipment_currency': (
+            convert(bid.price, bid.currency, shipment.currency) if bid.currency != shipment.currency else None
+        ),
         'can_accept': bid.can_be_accepted() and request.user == bid.shipment.owner,
         'can_reject': bid.can_be_rejected() and request.user == bid.shipment.owner,
         'can_cancel': bid.can_be_cancelled() and request.user == bid.carrier_agent,
     })
 
 
+@idempotent
+@rate_limited('bid_transition')
 @login_required
 @require_POST
 def accept_bid(request, bid_id):
@@ -93,7 +190,8 @@ def accept_bid(request, bid_id):
         messages.error(request, 'Только владелец заявки может принимать предложения.')
         return redirect('dashboard')
 
-    if bid.accept():
+    if state_machine.accept(bid):
+        publish_status_change(bid)
         messages.success(request, 'Предложение принято! Заявка переведена в статус "В работе".')
     else:
         messages.error(request, 'Не удалось принять предложение.')
@@ -101,6 +199,8 @@ def accept_bid(request, bid_id):
     return redirect('shipment_detail', shipment_id=bid.shipment.id)
 
 
+@idempotent
+@rate_limited('bid_transition')
 @login_required
 @require_POST
 def reject_bid(request, bid_id):
@@ -112,7 +212,8 @@ def reject_bid(request, bid_id):
         messages.error(request, 'Только владелец заявки может отклонять предложения.')
         return redirect('dashboard')
 
-    if bid.reject():
+    if state_machine.reject(bid):
+        publish_status_change(bid)
         messages.success(request, 'Предложение отклонено.')
     else:
         messages.error(request, 'Не удалось отклонить предложение.')
@@ -120,6 +221,8 @@ def reject_bid(request, bid_id):
     return redirect('shipment_detail', shipment_id=bid.shipment.id)
 
 
+@idempotent
+@rate_limited('bid_transition')
 @login_required
 @require_POST
 def cancel_bid(request, bid_id):
@@ -131,9 +234,30 @@ def cancel_bid(request, bid_id):
         messages.error(request, 'Только создатель предложения может его отменить.')
         return redirect('dashboard')
 
-    if bid.cancel():
+    if state_machine.cancel(bid):
+        publish_status_change(bid)
         messages.success(request, 'Предложение отменено.')
     else:
         messages.error(request, 'Не удалось отменить предложение.')
 
-    return redirect('shipment_detail', shipment_id=bid.shipment.id)
\ No newline at end of file
+    return redirect('shipment_detail', shipment_id=bid.shipment.id)
+
+
+@idempotent
+@login_required
+@require_POST
+def rate_agent(request, bid_id):
+    """Оценка агента владельцем заявки после доставки"""
+    bid = get_object_or_404(Bid.objects.select_related('shipment'), id=bid_id)
+    form = AgentRatingForm(request.POST)
+    if not form.is_valid():
+        messages.error(request, 'Выберите оценку от 1 до 5 звезд.')
+        return redirect('shipment_detail', shipment_id=bid.shipment_id)
+
+    try:
+        rate(bid, request.user, form.cleaned_data['stars'], form.cleaned_data['comment'])
+    except RatingError as error:
+        messages.error(request, str(error))
+    else:
+        messages.success(request, 'Спасибо за оценку! Заявка завершена.')
+    return redirect('shipment_detail', shipment_id=bid.shipment_id)
@@ -13,4 +13,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from core.asgi import EventStreamDisconnectMiddleware  # noqa: E402
+
+# SSE-потоки заявок (shipments/events.py) закрываются при отключении клиента
+application = EventStreamDisconnectMiddleware(django_application)
+
+# Прогрев кэша списка заявок (включается SHIPMENT_LIST_CACHE['WARM_ON_STARTUP'])
+from shipments.page_cache import warm_on_startup  # noqa: E402
+
+warm_on_startup()
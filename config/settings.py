@@ -24,14 +24,16 @@ INSTALLED_APPS = [
     'core',
     'shipments',
     'bids',
+    'analytics',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.sessions.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'users.roles.RoleMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -49,6 +51,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'users.context_processors.roles',
             ],
         },
     },
@@ -60,9 +63,115 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Конкурентные записи ждут блокировку, а не падают с "database is locked"
+        'OPTIONS': {'timeout': 20},
+        # Тестовая БД - в памяти. Стресс-тест переходов статусов из
+        # нескольких потоков идет на ее временной файловой копии (нужны
+        # настоящие блокировки SQLite); полный прогон - на файловой БД:
+        # TEST_DATABASE_NAME=test_db.sqlite3 python manage.py test bids
+        'TEST': {'NAME': os.environ.get('TEST_DATABASE_NAME')},
     }
 }
 
+# Кэш: фасеты и страницы списка заявок, счетчики поколений.
+# В продакшене с несколькими процессами нужен общий бэкенд (Redis/Memcached).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'aircargo',
+    }
+}
+
+# Кэш страниц списка заявок для анонимов (см. shipments/page_cache.py)
+SHIPMENT_LIST_CACHE = {
+    'TIMEOUT': 60 * 60,
+    'WARM_FILTERS': 10,
+    'WARM_PAGES': 3,
+    'WARM_ON_STARTUP': not DEBUG,
+}
+
+# Буфер счетчика просмотров заявок (см. shipments/view_counter.py)
+VIEW_COUNTER = {
+    'FLUSH_INTERVAL': 30,
+    'FLUSH_THRESHOLD': 500,
+}
+
+# Брокер событий для SSE-потоков заявок (см. core/events.py). Для нескольких
+# воркеров BACKEND должен доставлять события между процессами.
+EVENT_BROKER = {
+    'BACKEND': 'core.events.LocalBackend',
+    'HEARTBEAT': 15,
+}
+
+# Лимиты запросов (см. core/ratelimit.py): 'N/s|m|h' на пользователя по тарифу
+# (staff, тип профиля или default) и на IP-адрес
+RATE_LIMITS = {
+    'bid_create': {
+        'user': {'default': '10/m', 'agent': '20/m', 'staff': '100/m'},
+        'ip': '30/m',
+    },
+    'bid_transition': {
+        'user': {'default': '30/m', 'staff': '300/m'},
+        'ip': '60/m',
+    },
+    'bid_import': {
+        'user': {'default': '5/h', 'staff': '60/h'},
+        'ip': '20/h',
+    },
+}
+
+# Курсы валют к USD по датам (см. core/currency.py)
+FX_RATES_FILE = BASE_DIR / 'data' / 'fx_rates.csv'
+
+# Хранилище отчетов (см. analytics/warehouse.py): отдельный файл SQLite,
+# наполняется командой sync_warehouse
+ANALYTICS_WAREHOUSE = {
+    'PATH': BASE_DIR / 'warehouse.sqlite3',
+    'BATCH_SIZE': 5000,
+}
+
+# Справочник населенных пунктов в памяти процесса (см. shipments/locations.py)
+LOCATION_INDEX = {
+    'REFRESH': 5,
+}
+
+# Рекомендуемая цена заявки (см. shipments/quotes.py); снимок моделей
+# обновляет команда fit_quotes
+QUOTE_ENGINE = {
+    'SNAPSHOT': BASE_DIR / 'quotes.npz',
+    'REFRESH': 300,
+}
+
+# Личный кабинет (см. users/dashboard.py): виджеты кэшируются на пользователя,
+# независимые запросы выполняются в небольшом пуле потоков
+DASHBOARD = {
+    'TIMEOUT': 300,
+    'WORKERS': 3,
+}
+
+# Истечение сроков заявок и предложений (см. bids/lifecycle.py)
+LIFECYCLE_SWEEPER = {
+    'CHUNK_SIZE': 500,
+    'INTERVAL': 60,
+}
+
+# Сессии (см. core/sessions.py): вошедшие - в кэше с копией в БД, анонимы -
+# в подписанной cookie, без записей в django_session. В продакшене с
+# несколькими процессами cached_db нужен общий кэш. Истекшие сессии
+# удаляет команда purge_sessions.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSIONS = {
+    'ANONYMOUS_COOKIES': True,
+    'PURGE_BATCH_SIZE': 1000,
+}
+
+# Пользователь сессии загружается вместе с профилем (см. users/backends.py).
+# ModelBackend - для сессий, созданных до его подключения.
+AUTHENTICATION_BACKENDS = [
+    'users.backends.ProfileBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -14,12 +14,18 @@ urlpatterns = [
     path('accounts/', include('django.contrib.auth.urls')),
     # path('accounts/', include('accounts.urls')),  # Закомментируйте эту строку
 
+    # Регистрация, личный кабинет
+    path('', include('users.urls')),
+
     # Заявки
     path('shipments/', include('shipments.urls')),
 
     # Предложения
     path('bids/', include('bids.urls')),
 
+    # Отчеты по хранилищу аналитики
+    path('analytics/', include('analytics.urls')),
+
     # Dashboard
     # path('dashboard/', include('dashboard.urls')),
 ]
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+# Прогрев кэша списка заявок (включается SHIPMENT_LIST_CACHE['WARM_ON_STARTUP'])
+from shipments.page_cache import warm_on_startup  # noqa: E402
+
+warm_on_startup()
@@ -0,0 +1,58 @@
+# core/asgi.py - ASGI-обертка для долгих потоковых ответов
+
+import asyncio
+
+
+def _is_event_stream(message):
+    for name, value in message.get('headers', ()):
+        if name.lower() == b'content-type':
+            return value.split(b';')[0].strip() == b'text/event-stream'
+    return False
+
+
+class EventStreamDisconnectMiddleware:
+    """Прервать поток Server-Sent Events, когда клиент отключился.
+
+    Django 4.2 не читает http.disconnect во время потокового ответа,
+    поэтому генератор событий отключившегося клиента жил бы вечно,
+    отправляя пульс в закрытое соединение. Для ответов text/event-stream
+    обертка слушает receive() и отменяет обработку запроса - генератор
+    получает CancelledError и снимает подписку.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        watcher = None
+        disconnected = False
+
+        async def watch():
+            nonlocal disconnected
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    disconnected = True
+                    task.cancel()
+                    return
+
+        async def wrapped_send(message):
+            nonlocal watcher
+            if message['type'] == 'http.response.start' and watcher is None and _is_event_stream(message):
+                # Тело запроса к этому моменту прочитано - дальше receive() свободен
+                watcher = asyncio.ensure_future(watch())
+            await send(message)
+
+        task = asyncio.ensure_future(self.app(scope, receive, wrapped_send))
+        try:
+            await task
+        except asyncio.CancelledError:
+            if not disconnected:
+                task.cancel()
+                raise
+        finally:
+            if watcher is not None:
+                watcher.cancel()
@@ -0,0 +1,36 @@
+# core/batches.py - обход больших таблиц пачками по первичному ключу
+
+from django.db import transaction
+
+
+def keyset_batches(queryset, batch_size):
+    """Пачки queryset по возрастанию первичного ключа.
+
+    Следующая пачка выбирается по индексу (pk > последний в предыдущей),
+    а не через OFFSET: каждая стоит одинаково, и строки, вышедшие из
+    выборки после обработки, не сдвигают следующие. Годится и для
+    values_list('id', flat=True) - тогда пачка состоит из id.
+    """
+    last_pk = None
+    while True:
+        rows = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        batch = list(rows.order_by('pk')[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_pk = getattr(batch[-1], 'pk', batch[-1])
+
+
+def run_in_batches(queryset, batch_size, handle, progress=None):
+    """Обработать queryset пачками, каждую - в своей транзакции.
+
+    handle(batch) возвращает число обработанных строк, progress(total)
+    вызывается после каждой пачки. Возвращает общее число.
+    """
+    total = 0
+    for batch in keyset_batches(queryset, batch_size):
+        with transaction.atomic():
+            total += handle(batch)
+        if progress is not None:
+            progress(total)
+    return total
@@ -0,0 +1,76 @@
+# core/conditional.py - условные GET-запросы (ETag / Last-Modified)
+
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def has_pending_messages(request):
+    """Страница с флеш-сообщениями персональна: ее нельзя ни кэшировать,
+    ни отвечать на нее 304 - сообщение так и не будет показано."""
+    if 'messages' in request.COOKIES:
+        return True
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        return bool(request.session.get('_messages'))
+    return False
+
+
+def page_etag(request, *parts):
+    """ETag страницы: версия данных плюс то, кто на нее смотрит.
+
+    В страницу пользователя встроены имя в меню и CSRF-токен форм,
+    поэтому они тоже входят в тег. get_token() заранее создает
+    CSRF-cookie, иначе первая отрисовка формы сменила бы тег.
+    """
+    if request.user.is_authenticated:
+        get_token(request)
+        viewer = (request.user.id, request.META['CSRF_COOKIE'])
+    else:
+        viewer = 'anonymous'
+    raw = '|'.join(str(part) for part in (*parts, viewer))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def conditional_page(validators):
+    """Ответить 304, если страница не изменилась, не выполняя view.
+
+    validators(request, *args, **kwargs) - дешевый запрос, который
+    возвращает (etag, last_modified) или None, если проверку нужно
+    пропустить (например, объекта нет и view ответит 404). В отличие
+    от django.views.decorators.http.condition, оба валидатора
+    вычисляются одним вызовом.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or has_pending_messages(request):
+                return view(request, *args, **kwargs)
+
+            result = validators(request, *args, **kwargs)
+            if result is None:
+                return view(request, *args, **kwargs)
+
+            etag, last_modified = result
+            etag = quote_etag(etag) if etag else None
+            timestamp = int(last_modified.timestamp()) if last_modified else None
+
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = view(request, *args, **kwargs)
+
+            if response.status_code in (200, 304):
+                if timestamp and not response.has_header('Last-Modified'):
+                    response.headers['Last-Modified'] = http_date(timestamp)
+                if etag:
+                    response.headers.setdefault('ETag', etag)
+                # Браузер хранит страницу, но перед показом всегда перепроверяет
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+
+        return wrapper
+
+    return decorator
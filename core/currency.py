@@ -0,0 +1,165 @@
+# core/currency.py - пересчет сумм между валютами
+
+import bisect
+import csv
+import datetime
+import os
+import threading
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, Value, When
+from django.utils import timezone
+
+# Курсы на случай, если файла нет или валюты в нем нет:
+# сколько USD стоит единица валюты
+DEFAULT_RATES = {
+    'USD': Decimal('1'),
+    'EUR': Decimal('1.08'),
+    'RUB': Decimal('0.011'),
+}
+
+CENT = Decimal('0.01')
+RATE_FIELD = DecimalField(max_digits=20, decimal_places=10)
+
+
+class RateTable:
+    """Курсы из CSV-файла (date,currency,usd_rate) с разбивкой по датам.
+
+    Запись действует с указанной даты до следующей записи по той же
+    валюте. Снимок курсов на дату строится один раз и кэшируется.
+    """
+
+    def __init__(self, rows=()):
+        changes = {}
+        for day, currency, rate in rows:
+            changes.setdefault(day, {})[currency] = rate
+        self.dates = sorted(changes)
+        # Накопленные снимки: курсы, действующие с каждой даты изменения
+        self.snapshots = []
+        current = {}
+        for day in self.dates:
+            current = {**current, **changes[day]}
+            self.snapshots.append(current)
+        self._by_date = {}
+
+    @classmethod
+    def from_file(cls, path):
+        rows = []
+        with open(path, newline='', encoding='utf-8') as fh:
+            lines = (line for line in fh if line.strip() and not line.startswith('#'))
+            for row in csv.DictReader(lines):
+                rows.append((
+                    datetime.date.fromisoformat(row['date']),
+                    row['currency'].strip().upper(),
+                    Decimal(row['usd_rate']),
+                ))
+        return cls(rows)
+
+    def on(self, day):
+        """Курсы, действующие на дату day"""
+        rates = self._by_date.get(day)
+        if rates is None:
+            position = bisect.bisect_right(self.dates, day)
+            rates = self.snapshots[position - 1] if position else {}
+            self._by_date[day] = rates
+        return rates
+
+
+_table = None
+_table_mtime = None
+_table_lock = threading.Lock()
+
+
+def get_rate_table():
+    """Таблица курсов из settings.FX_RATES_FILE; перечитывается, если файл изменился"""
+    global _table, _table_mtime
+    path = getattr(settings, 'FX_RATES_FILE', None)
+    try:
+        mtime = os.stat(path).st_mtime if path else None
+    except OSError:
+        mtime = None
+    if _table is None or mtime != _table_mtime:
+        with _table_lock:
+            if _table is None or mtime != _table_mtime:
+                _table = RateTable.from_file(path) if mtime is not None else RateTable()
+                _table_mtime = mtime
+    return _table
+
+
+def invalidate_rates():
+    global _table
+    _table = None
+
+
+def get_rates(day=None):
+    """Курсы к USD на дату (по умолчанию - на сегодня).
+
+    settings.CURRENCY_RATES, если задан, перекрывает файл.
+    """
+    day = day or timezone.localdate()
+    return {**DEFAULT_RATES, **get_rate_table().on(day), **getattr(settings, 'CURRENCY_RATES', {})}
+
+
+def rates_version(day=None):
+    """Строка, меняющаяся вместе с курсами - для ETag страниц с пересчитанными суммами"""
+    return ','.join(f'{code}={rate}' for code, rate in sorted(get_rates(day).items()))
+
+
+def to_usd(amount, currency, day=None):
+    return Decimal(amount) * get_rates(day)[currency]
+
+
+def convert(amount, from_currency, to_currency, day=None):
+    """Сумма в другой валюте, с округлением до копеек"""
+    if from_currency == to_currency:
+        return Decimal(amount)
+    rates = get_rates(day)
+    return (Decimal(amount) * rates[from_currency] / rates[to_currency]).quantize(CENT)
+
+
+def conversion_factors(to_currency, day=None):
+    """Множитель перевода в to_currency для каждой валюты"""
+    rates = get_rates(day)
+    target = rates[to_currency]
+    return {code: rate / target for code, rate in rates.items()}
+
+
+def normalize(items, to_currency, day=None, amount_attr='price', currency_attr='currency',
+              target_attr='normalized_price'):
+    """Пересчитать суммы целого списка объектов в to_currency за один проход.
+
+    Курсы выбираются один раз, дальше на объект - одно умножение.
+    Результат записывается в атрибут target_attr; возвращает список.
+    """
+    factors = conversion_factors(to_currency, day)
+    items = list(items)
+    for item in items:
+        currency = getattr(item, currency_attr)
+        amount = getattr(item, amount_attr)
+        value = amount if currency == to_currency else (amount * factors[currency]).quantize(CENT)
+        setattr(item, target_attr, value)
+    return items
+
+
+def usd_rate_expression(field='currency', day=None):
+    """SQL-выражение: курс к USD для валюты из колонки field"""
+    return Case(
+        *[When(**{field: code}, then=Value(rate)) for code, rate in get_rates(day).items()],
+        output_field=RATE_FIELD,
+    )
+
+
+def normalized_amount(to_currency, amount_field='price', currency_field='currency', day=None):
+    """SQL-выражение для annotate(): сумма из amount_field в валюте to_currency.
+
+    Позволяет сортировать и сравнивать суммы в разных валютах в самом запросе.
+    """
+    factors = conversion_factors(to_currency, day)
+    factor = Case(
+        *[When(**{currency_field: code}, then=Value(value)) for code, value in factors.items()],
+        output_field=RATE_FIELD,
+    )
+    return ExpressionWrapper(
+        F(amount_field) * factor, output_field=DecimalField(max_digits=14, decimal_places=2)
+    )
@@ -0,0 +1,139 @@
+# core/events.py - pub/sub брокер событий для потоков Server-Sent Events
+
+import asyncio
+import itertools
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+DEFAULTS = {
+    # Доставка между процессами: класс с методами publish(channel, event) и start()
+    'BACKEND': 'core.events.LocalBackend',
+    # Очередь подписчика; медленный клиент теряет самые старые события
+    'QUEUE_SIZE': 100,
+    # Комментарий-пульс в простаивающем потоке, секунд
+    'HEARTBEAT': 15,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'EVENT_BROKER', {})}
+
+
+class Subscription:
+    """Очередь событий одного канала для одного клиента.
+
+    Живет в event loop соединения: ожидание - это await, а не поток,
+    поэтому тысячи простаивающих подписок ничего не стоят.
+    """
+
+    def __init__(self, broker, channel, loop, maxsize):
+        self.broker = broker
+        self.channel = channel
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+
+    def put(self, event):
+        # Вызывается в loop подписчика (через call_soon_threadsafe)
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout=None):
+        """Следующее событие или None по таймауту"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    """Подписчики процесса по каналам.
+
+    publish() отдает событие бэкенду; бэкенд доставляет его во все
+    процессы, и каждый вызывает deliver() у своего брокера. Публиковать
+    можно из любого потока, в том числе из синхронных view.
+    """
+
+    def __init__(self, backend_class=None, queue_size=None):
+        config = get_config()
+        self.queue_size = queue_size or config['QUEUE_SIZE']
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        backend_class = backend_class or import_string(config['BACKEND'])
+        self.backend = backend_class(self)
+        self.backend.start()
+
+    def subscribe(self, channel):
+        """Подписаться из корутины: события придут в текущий event loop"""
+        subscription = Subscription(self, channel, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._subscribers.get(channel, ()))
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, channel, kind, data):
+        self.backend.publish(channel, {'kind': kind, 'data': data})
+
+    def deliver(self, channel, event):
+        """Раздать событие подписчикам канала в этом процессе"""
+        event = {**event, 'id': next(self._ids)}
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                # Event loop соединения уже закрыт
+                self.unsubscribe(subscription)
+
+
+class LocalBackend:
+    """Один процесс: событие сразу доставляется своему брокеру.
+
+    Заготовка для разработки и тестов. Для нескольких воркеров нужен
+    бэкенд с тем же интерфейсом поверх общей шины (Redis pub/sub,
+    PostgreSQL LISTEN/NOTIFY): publish() отправляет событие в шину,
+    а start() запускает слушателя, который вызывает broker.deliver().
+    """
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def start(self):
+        pass
+
+    def publish(self, channel, event):
+        self.broker.deliver(channel, event)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = Broker()
+    return _broker
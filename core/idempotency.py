@@ -0,0 +1,142 @@
+# core/idempotency.py - ключи идемпотентности для POST-запросов
+
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.shortcuts import resolve_url
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+FIELD = 'idempotency_key'
+
+DEFAULTS = {
+    # Сколько хранится результат запроса с ключом, секунд
+    'TIMEOUT': 24 * 60 * 60,
+    # Сколько повтор ждет результата запроса, который еще выполняется
+    'WAIT': 5.0,
+}
+
+IN_PROGRESS = 'in-progress'
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'IDEMPOTENCY', {})}
+
+
+def idempotency_key(request):
+    """Ключ из заголовка Idempotency-Key или скрытого поля формы"""
+    return request.META.get(HEADER) or request.POST.get(FIELD) or None
+
+
+def _cache_key(request, key):
+    # Ключ действует в пределах сессии и адреса: тот же ключ на другом
+    # предложении или у другого пользователя - другой запрос. Сессия
+    # берется из cookie, без обращения к БД.
+    session = request.COOKIES.get(settings.SESSION_COOKIE_NAME, '')
+    raw = '|'.join((session, request.path, key))
+    return 'idempotency:' + hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _is_retryable(response):
+    """Ответ, который нельзя закреплять за ключом: запрос не выполнялся.
+
+    5xx, 429 от лимита и редирект на вход - повтор с тем же ключом
+    должен выполнить view заново, когда причина пройдет.
+    """
+    if response.status_code >= 500 or response.status_code == 429:
+        return True
+    if response.status_code in (301, 302, 303, 307, 308):
+        return response.get('Location', '').startswith(resolve_url(settings.LOGIN_URL))
+    return False
+
+
+def _snapshot(response, flashed):
+    entry = {
+        'status': response.status_code,
+        'content': response.content,
+        'content_type': response['Content-Type'],
+        'messages': flashed,
+    }
+    if response.has_header('Location'):
+        entry['location'] = response['Location']
+    return entry
+
+
+def _replay(request, entry):
+    response = HttpResponse(entry['content'], status=entry['status'], content_type=entry['content_type'])
+    if 'location' in entry:
+        response['Location'] = entry['location']
+    # Сообщения исходного ответа, чтобы повтор выглядел так же
+    for level, message, tags in entry['messages']:
+        messages.add_message(request, level, message, extra_tags=tags)
+    response['Idempotent-Replay'] = 'true'
+    return response
+
+
+def _queued_messages(request):
+    storage = getattr(request, '_messages', None)
+    return list(getattr(storage, '_queued_messages', ()))
+
+
+def _wait_for_result(key, wait):
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry != IN_PROGRESS:
+            return entry
+    return IN_PROGRESS
+
+
+def idempotent(view):
+    """Повтор POST с тем же ключом идемпотентности отдает исходный ответ.
+
+    Повтор не выполняет view и не обращается к БД: ответ (статус,
+    редирект, тело и flash-сообщения) берется из кэша. Если исходный
+    запрос еще выполняется, повтор недолго ждет его результата, а затем
+    отвечает 409. Ответы 5xx, 429 и редирект на вход не сохраняются -
+    такой запрос можно повторить. Поэтому декоратор может стоять снаружи
+    rate_limited и login_required: повтор отдается без обращения к БД.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = idempotency_key(request) if request.method == 'POST' else None
+        if key is None:
+            return view(request, *args, **kwargs)
+
+        config = get_config()
+        cache_key = _cache_key(request, key)
+        if not cache.add(cache_key, IN_PROGRESS, timeout=config['TIMEOUT']):
+            entry = cache.get(cache_key)
+            if entry == IN_PROGRESS:
+                entry = _wait_for_result(cache_key, config['WAIT'])
+            if entry == IN_PROGRESS:
+                return HttpResponse('Запрос с этим ключом еще выполняется.', status=409,
+                                    content_type='text/plain; charset=utf-8')
+            if entry is not None:
+                return _replay(request, entry)
+            cache.add(cache_key, IN_PROGRESS, timeout=config['TIMEOUT'])
+
+        before = len(_queued_messages(request))
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            cache.delete(cache_key)
+            raise
+        if _is_retryable(response):
+            cache.delete(cache_key)
+            return response
+        if hasattr(response, 'render') and not response.is_rendered:
+            response.render()
+        flashed = [
+            (message.level, message.message, message.extra_tags)
+            for message in _queued_messages(request)[before:]
+        ]
+        cache.set(cache_key, _snapshot(response, flashed), timeout=config['TIMEOUT'])
+        return response
+
+    return wrapper
@@ -0,0 +1,94 @@
+import time
+from datetime import date
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.sessions import anonymous_engine, session_store
+from shipments.models import Shipment
+
+# Режим: (SESSION_ENGINE, анонимы в подписанной cookie)
+MODES = {
+    'db': ('django.contrib.sessions.backends.db', False),
+    'cached_db': ('django.contrib.sessions.backends.cached_db', False),
+    'signed_cookies': ('django.contrib.sessions.backends.signed_cookies', False),
+    'hybrid': ('django.contrib.sessions.backends.cached_db', True),
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Сравнить скорость списка заявок при разных хранилищах сессий (данные откатываются)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500,
+                            help='Запросов на посетителя в каждом режиме')
+        parser.add_argument('--shipments', type=int, default=200,
+                            help='Сколько заявок создать для списка')
+        parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic(), override_settings(ALLOWED_HOSTS=['testserver']):
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        owner = User.objects.create_user('benchmark-sessions-owner')
+        Shipment.objects.bulk_create(
+            Shipment(
+                title=f'Груз {i}', owner=owner, status='active',
+                weight=100, length=100, width=100, height=100,
+                departure_city='Москва', departure_country='Россия',
+                arrival_city='Берлин', arrival_country='Германия',
+                departure_date=date(2026, 1, 1), arrival_date=date(2026, 1, 5),
+                estimated_price=1000,
+            )
+            for i in range(options['shipments'])
+        )
+        self.stdout.write(f'{"режим":<16}{"посетитель":<12}{"запросов/с":>12}{"django_session на запрос":>28}')
+        for mode in options['modes']:
+            engine, anonymous_cookies = MODES[mode]
+            with override_settings(SESSION_ENGINE=engine, SESSIONS={'ANONYMOUS_COOKIES': anonymous_cookies}):
+                cache.clear()
+                for visitor, client in (('аноним', self.anonymous()), ('вошедший', self.authenticated(owner))):
+                    rate, session_queries = self.measure(client, options['requests'])
+                    self.stdout.write(f'{mode:<16}{visitor:<12}{rate:>12.0f}{session_queries:>28.2f}')
+
+    def anonymous(self):
+        """Аноним с непустой сессией: ее читает каждый запрос списка"""
+        client = Client()
+        session = session_store(anonymous_engine())()
+        session['last_search'] = 'Москва'
+        session.save()
+        client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+        return client
+
+    def authenticated(self, owner):
+        client = Client()
+        client.force_login(owner)
+        return client
+
+    def measure(self, client, requests):
+        url = reverse('shipment_list')
+        client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for _ in range(requests):
+                # Без If-None-Match: каждый раз полный ответ, а не 304
+                response = client.get(url)
+                assert response.status_code == 200, response.status_code
+            elapsed = time.perf_counter() - started
+        session_queries = sum(1 for query in queries if 'django_session' in query['sql'])
+        return requests / elapsed, session_queries / requests
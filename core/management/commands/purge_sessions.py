@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.sessions import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Удалить истекшие сессии из django_session небольшими пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Строк в одной пачке (по умолчанию SESSIONS["PURGE_BATCH_SIZE"])')
+        parser.add_argument('--pause', type=float, default=None,
+                            help='Пауза между пачками, секунд')
+
+    def handle(self, *args, **options):
+        deleted = purge_expired(batch_size=options['batch_size'], pause=options['pause'])
+        self.stdout.write(f'Удалено истекших сессий: {deleted}')
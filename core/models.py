@@ -1,3 +1,20 @@
 from django.db import models
 
-# Create your models here.
+
+class DataVersion(models.Model):
+    """Версия набора данных, общая для всех процессов (см. core/versions.py).
+
+    Процесс, который держит в памяти построенные по БД структуры или
+    отдает ETag по ним, сверяет свою версию с этой строкой одним
+    запросом по первичному ключу.
+    """
+    name = models.CharField('Набор данных', max_length=50, primary_key=True)
+    version = models.PositiveBigIntegerField('Версия', default=0)
+    changed_at = models.DateTimeField('Дата изменения', null=True)
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f'{self.name} v{self.version}'
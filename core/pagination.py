@@ -0,0 +1,124 @@
+# core/pagination.py - курсорная (keyset) пагинация
+
+from django.core import signing
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+CURSOR_SALT = 'core.pagination.cursor'
+
+
+class CursorPage:
+    """Страница курсорной пагинации.
+
+    В отличие от django.core.paginator.Page не знает общего количества
+    объектов и номера страницы - только соседние курсоры.
+    """
+
+    is_cursor_page = True
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def encode_cursor(obj, direction):
+    """Непрозрачный подписанный токен позиции (created_at, id).
+
+    Без метки времени: один и тот же курсор всегда дает один и тот же
+    токен, поэтому ссылки на страницы можно кэшировать.
+    """
+    return signing.Signer(salt=CURSOR_SALT).sign_object(
+        {'c': obj.created_at.isoformat(), 'i': obj.pk, 'd': direction},
+        compress=True,
+    )
+
+
+def decode_cursor(token):
+    """Разобрать токен. Для испорченного токена возвращает None"""
+    if not token:
+        return None
+    try:
+        data = signing.Signer(salt=CURSOR_SALT).unsign_object(token)
+        created_at = parse_datetime(data['c'])
+        pk = int(data['i'])
+        direction = data['d']
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        return None
+    if created_at is None or direction not in ('next', 'prev'):
+        return None
+    return created_at, pk, direction
+
+
+def paginate_by_cursor(queryset, cursor=None, per_page=10):
+    """Страница queryset, упорядоченного по (-created_at, -id).
+
+    Вместо COUNT(*) и OFFSET выбирается per_page + 1 строк после позиции
+    курсора, поэтому стоимость любой страницы одинакова.
+    """
+    position = decode_cursor(cursor)
+
+    if position is None:
+        rows = list(queryset.order_by('-created_at', '-id')[:per_page + 1])
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        has_before = False
+    else:
+        created_at, pk, direction = position
+        if direction == 'next':
+            rows = list(
+                queryset.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+                ).order_by('-created_at', '-id')[:per_page + 1]
+            )
+            has_more = len(rows) > per_page
+            rows = rows[:per_page]
+            has_before = True
+        else:
+            rows = list(
+                queryset.filter(
+                    Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+                ).order_by('created_at', 'id')[:per_page + 1]
+            )
+            if not rows:
+                # Все более новые строки удалены - начинаем с первой страницы
+                return paginate_by_cursor(queryset, None, per_page)
+            has_before = len(rows) > per_page
+            rows = rows[:per_page][::-1]
+            has_more = True
+
+    next_cursor = encode_cursor(rows[-1], 'next') if rows and has_more else None
+    previous_cursor = encode_cursor(rows[0], 'prev') if rows and has_before else None
+    return CursorPage(rows, next_cursor, previous_cursor)
+
+
+def paginate(request, queryset, per_page=10, cursor_param='cursor', page_param='page',
+             force_pages=False):
+    """Выбрать режим пагинации по параметрам запроса.
+
+    ?page=N (или force_pages) - классический Paginator с номерами страниц,
+    удобен для небольших выборок. Иначе - курсорный режим без COUNT(*).
+    """
+    page_number = request.GET.get(page_param)
+    if force_pages or page_number:
+        return Paginator(queryset, per_page).get_page(page_number)
+    return paginate_by_cursor(queryset, request.GET.get(cursor_param), per_page)
@@ -0,0 +1,119 @@
+# core/ratelimit.py - ограничение частоты запросов (token bucket в кэше)
+
+import math
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from users.roles import get_roles
+
+# Лимиты по умолчанию: 'N/период' - ведро на N запросов, которое
+# равномерно пополняется за период (s, m, h).
+# user - по тарифу пользователя (см. user_tier), ip - по адресу клиента.
+DEFAULTS = {
+    'bid_create': {
+        'user': {'default': '10/m', 'staff': '100/m'},
+        'ip': '30/m',
+    },
+    'bid_transition': {
+        'user': {'default': '30/m', 'staff': '300/m'},
+        'ip': '60/m',
+    },
+    # Один запрос загружает тысячи предложений
+    'bid_import': {
+        'user': {'default': '5/h', 'staff': '60/h'},
+        'ip': '20/h',
+    },
+}
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600}
+
+_local_lock = threading.Lock()
+
+
+def get_limits(scope):
+    return {**DEFAULTS.get(scope, {}), **getattr(settings, 'RATE_LIMITS', {}).get(scope, {})}
+
+
+def parse_rate(rate):
+    """'10/m' -> (емкость 10, пополнение 10/60 токена в секунду)"""
+    count, period = rate.split('/')
+    count = int(count)
+    return count, count / PERIODS[period]
+
+
+def user_tier(user):
+    """Тариф пользователя: staff, тип профиля (agent, customer...) или default"""
+    if user.is_staff:
+        return 'staff'
+    return get_roles(user).user_type or 'default'
+
+
+def client_ip(request):
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def take(key, rate):
+    """Взять токен из ведра key. Возвращает (разрешено, через сколько секунд повторить).
+
+    Состояние ведра - (токены, время) в кэше. Чтение и запись не атомарны
+    между процессами: при гонке ведро может пропустить лишний запрос, что
+    для защиты от перегрузки допустимо.
+    """
+    capacity, refill = parse_rate(rate)
+    now = time.time()
+    with _local_lock:
+        tokens, updated = cache.get(key) or (capacity, now)
+        tokens = min(capacity, tokens + (now - updated) * refill)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        # Полное ведро не хранится - запись истекает, когда ведро наполнится
+        cache.set(key, (tokens, now), timeout=math.ceil((capacity - tokens) / refill) + 1)
+    retry_after = 0 if allowed else math.ceil((1 - tokens) / refill)
+    return allowed, retry_after
+
+
+def check_rate(request, scope):
+    """Проверить лимиты scope для запроса. Возвращает None или число секунд до повтора"""
+    limits = get_limits(scope)
+    buckets = []
+    if limits.get('ip'):
+        buckets.append((f'ratelimit:{scope}:ip:{client_ip(request)}', limits['ip']))
+    user_limits = limits.get('user')
+    if user_limits and request.user.is_authenticated:
+        tier = user_tier(request.user)
+        rate = user_limits.get(tier, user_limits.get('default'))
+        if rate:
+            buckets.append((f'ratelimit:{scope}:user:{request.user.id}', rate))
+
+    retry_after = 0
+    for key, rate in buckets:
+        allowed, wait = take(key, rate)
+        if not allowed:
+            retry_after = max(retry_after, wait)
+    return retry_after or None
+
+
+def rate_limited(scope, methods=('POST',)):
+    """Декоратор view: при превышении лимита - 429 с Retry-After"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method in methods:
+                retry_after = check_rate(request, scope)
+                if retry_after is not None:
+                    response = HttpResponse(
+                        'Слишком много запросов. Повторите попытку позже.',
+                        status=429,
+                        content_type='text/plain; charset=utf-8',
+                    )
+                    response['Retry-After'] = str(retry_after)
+                    return response
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
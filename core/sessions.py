@@ -0,0 +1,103 @@
+# core/sessions.py - хранилище сессии по тому, вошел ли посетитель
+
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware as BaseSessionMiddleware
+from django.utils import timezone
+
+SIGNED_COOKIES = 'django.contrib.sessions.backends.signed_cookies'
+
+DEFAULTS = {
+    # Сессии анонимов - в подписанной cookie: их чтение и запись не трогают
+    # django_session и не ждут блокировку записи SQLite. Вошедшие пользователи
+    # остаются в SESSION_ENGINE (cached_db): их сессию можно удалить на сервере.
+    'ANONYMOUS_COOKIES': True,
+    # Удаление истекших сессий: строк в одной транзакции и пауза между ними, секунд
+    'PURGE_BATCH_SIZE': 1000,
+    'PURGE_PAUSE': 0.0,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'SESSIONS', {})}
+
+
+def session_store(engine=None):
+    return import_module(engine or settings.SESSION_ENGINE).SessionStore
+
+
+def anonymous_engine():
+    return SIGNED_COOKIES if get_config()['ANONYMOUS_COOKIES'] else settings.SESSION_ENGINE
+
+
+def engine_for_cookie(value):
+    """Хранилище сессии по значению cookie.
+
+    Подписанная cookie - это данные и подпись через ':', ключ серверной
+    сессии - только [a-z0-9]. Без cookie сессии еще нет, и она создается
+    в хранилище анонимов.
+    """
+    if anonymous_engine() == settings.SESSION_ENGINE:
+        return settings.SESSION_ENGINE
+    if value and ':' not in value:
+        return settings.SESSION_ENGINE
+    return SIGNED_COOKIES
+
+
+class SessionMiddleware(BaseSessionMiddleware):
+    """SessionMiddleware с хранилищем, выбранным по cookie запроса.
+
+    Сессия по-прежнему ленивая: хранилище читается при первом обращении
+    к request.session, а сохраняется и получает cookie, только если в нее
+    что-то записали. Серверная сессия появляется лишь при входе (promote).
+    """
+
+    def process_request(self, request):
+        session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        request.session = session_store(engine_for_cookie(session_key))(session_key)
+
+
+def promote(request):
+    """Перенести данные анонимной сессии в SESSION_ENGINE после входа.
+
+    Вызывается из сигнала user_logged_in: login() к этому моменту уже
+    записал пользователя в сессию, ответ сохранит новое хранилище
+    и заменит cookie его ключом.
+    """
+    session = getattr(request, 'session', None)
+    store = session_store()
+    if session is None or isinstance(session, store):
+        return
+    promoted = store()
+    promoted.update(dict(session.items()))
+    request.session = promoted
+
+
+def purge_expired(batch_size=None, pause=None, now=None):
+    """Удалить истекшие серверные сессии пачками. Возвращает число удаленных.
+
+    В отличие от clearsessions (один DELETE по всей таблице), каждая пачка -
+    короткая транзакция по индексу expire_date, и между пачками другие
+    запросы успевают получить блокировку записи. Записи cached_db в кэше
+    истекают сами.
+    """
+    from django.contrib.sessions.models import Session
+
+    config = get_config()
+    batch_size = batch_size or config['PURGE_BATCH_SIZE']
+    pause = config['PURGE_PAUSE'] if pause is None else pause
+    now = now or timezone.now()
+    total = 0
+    while True:
+        keys = list(
+            Session.objects.filter(expire_date__lt=now)
+            .values_list('session_key', flat=True)[:batch_size]
+        )
+        if not keys:
+            return total
+        Session.objects.filter(session_key__in=keys).delete()
+        total += len(keys)
+        if pause:
+            time.sleep(pause)
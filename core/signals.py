@@ -0,0 +1,11 @@
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+
+from .sessions import promote
+
+
+@receiver(user_logged_in)
+def promote_session(sender, request, user, **kwargs):
+    # Анонимная сессия из cookie переезжает в серверное хранилище
+    if request is not None:
+        promote(request)
@@ -0,0 +1,105 @@
+# core/testing.py - вспомогательные средства для тестов
+
+import os
+import re
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+# "SCAN shipments_shipment" без "USING ... INDEX" - полный просмотр таблицы
+FULL_SCAN_RE = re.compile(r'\bSCAN (?:TABLE )?(\w+)$')
+# Полный обход индекса: допустим только для упорядоченных выборок с LIMIT
+INDEX_SCAN_RE = re.compile(r'\bSCAN (?:TABLE )?(\w+) USING (?:COVERING )?INDEX\b')
+TEMP_SORT_RE = re.compile(r'USE TEMP B-TREE FOR (?:RIGHT PART OF )?ORDER BY')
+
+
+def explain_sql(sql, params=None):
+    """Строки EXPLAIN QUERY PLAN (SQLite) для запроса"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def explain_queryset(queryset):
+    sql, params = queryset.query.sql_with_params()
+    return explain_sql(sql, params)
+
+
+def capture_query_plans(func, *args, **kwargs):
+    """Выполнить func и вернуть [(sql, план)] для всех выполненных SELECT/UPDATE/DELETE"""
+    with CaptureQueriesContext(connection) as ctx:
+        func(*args, **kwargs)
+    plans = []
+    for query in ctx.captured_queries:
+        sql = query['sql']
+        if sql.split(' ', 1)[0].upper() in ('SELECT', 'UPDATE', 'DELETE'):
+            plans.append((sql, explain_sql(sql)))
+    return plans
+
+
+@contextmanager
+def file_database():
+    """Временная файловая копия тестовой БД SQLite в памяти.
+
+    Общая БД в памяти на конкурентную запись отвечает "table is locked",
+    а не ждет блокировку, - тестам с потоками нужен файл. Соединение с БД
+    в памяти откладывается и возвращается на выходе: закрыв его, потеряли
+    бы саму БД. Если тестовая БД уже файловая, ничего не меняется.
+    """
+    if not connection.is_in_memory_db():
+        yield
+        return
+    handle, path = tempfile.mkstemp(suffix='.sqlite3')
+    os.close(handle)
+    connection.ensure_connection()
+    target = sqlite3.connect(path)
+    try:
+        connection.connection.backup(target)
+    finally:
+        target.close()
+
+    # settings_dict - общий словарь настроек: соединения потоков тоже откроют файл
+    memory, connection.connection = connection.connection, None
+    name, connection.settings_dict['NAME'] = connection.settings_dict['NAME'], path
+    try:
+        yield
+    finally:
+        connection.close()
+        connection.settings_dict['NAME'], connection.connection = name, memory
+        os.unlink(path)
+
+
+class QueryPlanAssertionsMixin:
+    """Проверки планов запросов для TestCase"""
+
+    def assertNoFullScan(self, plan, allow_sort=False, allow_index_scan=False, msg=''):
+        for line in plan:
+            self.assertIsNone(
+                FULL_SCAN_RE.search(line),
+                f'Полный просмотр таблицы: {line}\n{msg}'
+            )
+            if not allow_index_scan:
+                self.assertIsNone(
+                    INDEX_SCAN_RE.search(line),
+                    f'Полный обход индекса: {line}\n{msg}'
+                )
+            if not allow_sort:
+                self.assertIsNone(
+                    TEMP_SORT_RE.search(line),
+                    f'Сортировка без индекса: {line}\n{msg}'
+                )
+
+    def assertQuerysetUsesIndex(self, queryset, allow_sort=False, allow_index_scan=False):
+        plan = explain_queryset(queryset)
+        self.assertNoFullScan(plan, allow_sort=allow_sort, allow_index_scan=allow_index_scan,
+                              msg=str(queryset.query))
+
+    def assertCallUsesIndexes(self, func, *args, allow_index_scan=False, **kwargs):
+        plans = capture_query_plans(func, *args, **kwargs)
+        self.assertTrue(plans, 'Не выполнено ни одного запроса')
+        for sql, plan in plans:
+            self.assertNoFullScan(plan, allow_index_scan=allow_index_scan, msg=sql)
+        return plans
@@ -1,3 +1,285 @@
-from django.test import TestCase
+import datetime
+import os
+import tempfile
+from decimal import Decimal
+from types import SimpleNamespace
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.db import connection, transaction
+from django.core import signing
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from shipments.models import Shipment
+from . import currency, sessions, versions
+from .batches import keyset_batches, run_in_batches
+from .hyperloglog import HyperLogLog
+from .pagination import CURSOR_SALT, encode_cursor, paginate_by_cursor
+
+
+class HyperLogLogTests(SimpleTestCase):
+
+    def test_estimate_within_error(self):
+        for count in (0, 1, 50, 5000, 50000):
+            sketch = HyperLogLog()
+            for i in range(count):
+                sketch.add(f'user:{i}')
+                sketch.add(f'user:{i}')
+            self.assertAlmostEqual(len(sketch), count, delta=max(1, count * 0.1))
+
+    def test_merge_is_union(self):
+        left, right = HyperLogLog(), HyperLogLog()
+        for i in range(3000):
+            left.add(i)
+        for i in range(2000, 6000):
+            right.add(i)
+        left.merge(right)
+        self.assertAlmostEqual(len(left), 6000, delta=600)
+
+    def test_serialization(self):
+        sketch = HyperLogLog(precision=8)
+        for i in range(100):
+            sketch.add(i)
+        restored = HyperLogLog.from_bytes(sketch.to_bytes())
+        self.assertEqual(restored.precision, 8)
+        self.assertEqual(len(restored), len(sketch))
+        self.assertEqual(len(HyperLogLog.from_bytes(b'')), 0)
+
+
+class CurrencyTests(SimpleTestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.csv')
+        os.close(handle)
+        self.addCleanup(os.unlink, self.path)
+        self.write(
+            'date,currency,usd_rate\n'
+            '2026-01-01,USD,1\n'
+            '2026-01-01,EUR,2\n'
+            '2026-01-01,RUB,0.01\n'
+            '2026-03-01,EUR,1.5\n'
+        )
+        override = override_settings(FX_RATES_FILE=self.path)
+        override.enable()
+        self.addCleanup(override.disable)
+        currency.invalidate_rates()
+        self.addCleanup(currency.invalidate_rates)
+
+    def write(self, content, mtime=None):
+        with open(self.path, 'w') as fh:
+            fh.write(content)
+        if mtime is not None:
+            os.utime(self.path, (mtime, mtime))
+
+    def test_rates_by_date(self):
+        self.assertEqual(currency.convert(100, 'EUR', 'USD', day=datetime.date(2026, 2, 1)), Decimal('200.00'))
+        self.assertEqual(currency.convert(100, 'EUR', 'USD', day=datetime.date(2026, 3, 1)), Decimal('150.00'))
+        # RUB в марте не менялся - действует январская запись
+        self.assertEqual(currency.convert(1000, 'RUB', 'EUR', day=datetime.date(2026, 3, 5)), Decimal('6.67'))
+        # До первой записи - курсы по умолчанию
+        self.assertEqual(
+            currency.get_rates(datetime.date(2020, 1, 1))['EUR'], currency.DEFAULT_RATES['EUR']
+        )
+
+    def test_file_change_reloads_table(self):
+        day = datetime.date(2026, 4, 1)
+        table = currency.get_rate_table()
+        self.assertIs(currency.get_rate_table(), table)
+        self.write('date,currency,usd_rate\n2026-01-01,EUR,3\n', mtime=os.stat(self.path).st_mtime + 10)
+        self.assertEqual(currency.get_rates(day)['EUR'], Decimal('3'))
+
+    def test_normalize_list(self):
+        bids = [
+            SimpleNamespace(price=Decimal('100'), currency='USD'),
+            SimpleNamespace(price=Decimal('100'), currency='EUR'),
+            SimpleNamespace(price=Decimal('10000'), currency='RUB'),
+        ]
+        currency.normalize(bids, 'EUR', day=datetime.date(2026, 2, 1))
+        self.assertEqual([bid.normalized_price for bid in bids], [Decimal('50.00'), Decimal('100'), Decimal('50.00')])
+
+
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db', SESSIONS={'ANONYMOUS_COOKIES': True})
+class DataVersionTests(TestCase):
+
+    def test_bump(self):
+        self.assertEqual(versions.get('test'), (0, None))
+        versions.bump('test')
+        first = versions.get('test')
+        previous, current = versions.bump('test', read=True)
+        self.assertEqual((previous, current[0]), (first, 2))
+        self.assertEqual(versions.get('test'), current)
+
+    def test_rolled_back_version_differs(self):
+        # Копия, построенная внутри откатившейся транзакции, не должна
+        # совпасть с версией, которую потом зафиксирует другая транзакция
+        try:
+            with transaction.atomic():
+                rolled_back = versions.bump('test', read=True)[1]
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(versions.get('test'), (0, None))
+        versions.bump('test')
+        self.assertEqual(versions.get('test')[0], rolled_back[0])
+        self.assertNotEqual(versions.get('test'), rolled_back)
+
+
+class BatchTests(TestCase):
+
+    def test_keyset_batches(self):
+        users = [User.objects.create_user(f'user{i}') for i in range(5)]
+        ids = [user.id for user in users]
+        self.assertEqual(list(keyset_batches(User.objects.values_list('id', flat=True), 2)),
+                         [ids[:2], ids[2:4], ids[4:]])
+
+        # Обработанные строки выходят из выборки - следующие пачки не сдвигаются
+        def handle(batch):
+            return User.objects.filter(pk__in=[user.pk for user in batch]).update(is_active=False)
+
+        progress = []
+        total = run_in_batches(User.objects.filter(is_active=True), 2, handle, progress.append)
+        self.assertEqual((total, progress), (5, [2, 4, 5]))
+        self.assertFalse(User.objects.filter(is_active=True).exists())
+
+
+class SessionTests(TestCase):
+
+    def anonymous_session(self, **data):
+        session = sessions.session_store(sessions.SIGNED_COOKIES)()
+        session.update(data)
+        session.save()
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+        return session.session_key
+
+    def test_anonymous_session_stays_in_cookie(self):
+        self.anonymous_session(last_search='Москва')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse('shipment_list')).status_code, 200)
+        self.assertFalse([query['sql'] for query in queries if 'django_session' in query['sql']])
+        self.assertFalse(Session.objects.exists())
+
+        # Без данных в сессии cookie не выдается вовсе
+        self.client.cookies.clear()
+        response = self.client.get(reverse('shipment_list'))
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+    def test_login_moves_session_to_server(self):
+        User.objects.create_user('agent', password='Sup3r-secret!')
+        self.anonymous_session(last_search='Москва')
+        response = self.client.post(reverse('login'), {'username': 'agent', 'password': 'Sup3r-secret!'})
+        self.assertEqual(response.status_code, 302)
+
+        session_key = response.cookies[settings.SESSION_COOKIE_NAME].value
+        self.assertNotIn(':', session_key)
+        data = Session.objects.get(session_key=session_key).get_decoded()
+        self.assertEqual(data['last_search'], 'Москва')
+        self.assertIn('_auth_user_id', data)
+        # Повторные запросы читают сессию из кэша
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse('shipment_list')).status_code, 200)
+        self.assertFalse([query['sql'] for query in queries if 'django_session' in query['sql']])
+
+        self.client.post(reverse('logout'))
+        self.assertFalse(Session.objects.exists())
+
+    def test_single_engine_without_anonymous_cookies(self):
+        with self.settings(SESSIONS={'ANONYMOUS_COOKIES': False}):
+            self.assertEqual(sessions.engine_for_cookie(None), settings.SESSION_ENGINE)
+        self.assertEqual(sessions.engine_for_cookie(None), sessions.SIGNED_COOKIES)
+        self.assertEqual(sessions.engine_for_cookie('abc123'), settings.SESSION_ENGINE)
+
+    def test_purge_expired_in_batches(self):
+        now = timezone.now()
+        for i in range(5):
+            Session.objects.create(session_key=f'old{i}', session_data='', expire_date=now - datetime.timedelta(days=1))
+        Session.objects.create(session_key='live', session_data='', expire_date=now + datetime.timedelta(days=1))
+        # Пачки 2 + 2 + 1: по SELECT и DELETE на каждую и пустой SELECT в конце
+        with self.assertNumQueries(7):
+            self.assertEqual(sessions.purge_expired(batch_size=2, now=now), 5)
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['live'])
+
+
+class CursorPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='x')
+        Shipment.objects.bulk_create(
+            Shipment(
+                title=f'Груз {i}', owner=cls.owner, status='active',
+                weight=100, length=100, width=100, height=100,
+                departure_city='Москва', departure_country='Россия',
+                arrival_city='Берлин', arrival_country='Германия',
+                departure_date=datetime.date(2026, 1, 1), arrival_date=datetime.date(2026, 1, 5),
+                estimated_price=1000,
+            )
+            for i in range(25)
+        )
+        # Три группы с одинаковым created_at: порядок внутри группы - по -id
+        start = timezone.now()
+        for i, pk in enumerate(Shipment.objects.order_by('id').values_list('id', flat=True)):
+            Shipment.objects.filter(pk=pk).update(created_at=start + datetime.timedelta(minutes=i // 10))
+        cls.expected = list(Shipment.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def walk(self, per_page):
+        pages = [paginate_by_cursor(Shipment.objects.all(), per_page=per_page)]
+        while pages[-1].has_next():
+            pages.append(paginate_by_cursor(Shipment.objects.all(), pages[-1].next_cursor, per_page))
+        return pages
+
+    def ids(self, page):
+        return [shipment.id for shipment in page]
+
+    def test_next_and_previous_round_trip(self):
+        pages = self.walk(per_page=4)
+        self.assertEqual([pk for page in pages for pk in self.ids(page)], self.expected)
+        self.assertFalse(pages[0].has_previous())
+
+        # Назад от последней страницы - те же страницы в обратном порядке
+        page = pages[-1]
+        for expected in reversed(pages[:-1]):
+            page = paginate_by_cursor(Shipment.objects.all(), page.previous_cursor, 4)
+            self.assertEqual(self.ids(page), self.ids(expected))
+        self.assertFalse(page.has_previous())
+
+    def test_ties_on_created_at_are_stable(self):
+        # Граница страницы внутри группы с одинаковым created_at: ни повторов, ни пропусков
+        for per_page in (3, 7, 10):
+            pages = self.walk(per_page)
+            self.assertEqual([pk for page in pages for pk in self.ids(page)], self.expected, per_page)
+
+    def test_last_page_boundary(self):
+        # 25 заявок по 5: последняя страница полная, и курсора дальше нет
+        pages = self.walk(per_page=5)
+        self.assertEqual([len(page) for page in pages], [5] * 5)
+        self.assertIsNone(pages[-1].next_cursor)
+        self.assertTrue(pages[-1].has_previous())
+
+        # Курсор за последней строкой - пустая страница без ссылки вперед
+        beyond = encode_cursor(Shipment.objects.get(pk=self.expected[-1]), 'next')
+        page = paginate_by_cursor(Shipment.objects.all(), beyond, 5)
+        self.assertEqual((len(page), page.has_next()), (0, False))
+
+    def test_tampered_and_foreign_cursors_give_first_page(self):
+        cursor = paginate_by_cursor(Shipment.objects.all(), per_page=5).next_cursor
+        last = Shipment.objects.get(pk=self.expected[-1])
+        payload = {'c': last.created_at.isoformat(), 'i': last.pk, 'd': 'next'}
+        foreign = (
+            cursor[:-2] + ('A' if cursor[-2] != 'A' else 'B') + cursor[-1],
+            signing.Signer(salt='other.salt').sign_object(payload, compress=True),
+            signing.Signer(key='other-secret', salt=CURSOR_SALT).sign_object(payload, compress=True),
+            signing.Signer(salt=CURSOR_SALT).sign_object({'c': 'вчера', 'i': 'x', 'd': 'next'}),
+            'мусор',
+        )
+        for token in foreign:
+            page = paginate_by_cursor(Shipment.objects.all(), token, 5)
+            self.assertEqual(self.ids(page), self.expected[:5], token)
+
+        self.client.force_login(self.owner)
+        for token in foreign:
+            response = self.client.get(reverse('shipment_list'), {'cursor': token})
+            self.assertEqual(response.status_code, 200)
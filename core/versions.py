@@ -0,0 +1,48 @@
+# core/versions.py - версии наборов данных в БД для проверки из разных процессов
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+# Заявки в списке (ETag списка), справочник городов, сохраненные поиски
+SHIPMENTS = 'shipments'
+LOCATIONS = 'locations'
+SAVED_SEARCHES = 'saved_searches'
+
+
+def bump(name, read=False):
+    """Увеличить версию набора данных.
+
+    Вызывается в транзакции, которая меняет данные: новая версия
+    становится видна другим процессам вместе с изменениями. С read=True
+    возвращает пару (прежняя, новая) - по ней процесс может обновить свою
+    копию данных, не перестраивая ее, если копия построена по прежней.
+    """
+    from .models import DataVersion
+
+    previous = get(name, lock=True) if read else None
+    now = timezone.now()
+    if not DataVersion.objects.filter(name=name).update(version=F('version') + 1, changed_at=now):
+        try:
+            with transaction.atomic():
+                DataVersion.objects.create(name=name, version=1, changed_at=now)
+        except IntegrityError:
+            # Строку успел создать другой процесс
+            DataVersion.objects.filter(name=name).update(version=F('version') + 1, changed_at=now)
+    if read:
+        return previous, get(name)
+
+
+def get(name, lock=False):
+    """(версия, время изменения) набора данных; (0, None), если он еще не менялся.
+
+    Сравнивать копии данных нужно по паре целиком: после отката транзакции
+    номер версии повторится, время изменения - нет.
+    """
+    from .models import DataVersion
+
+    rows = DataVersion.objects.filter(name=name)
+    if lock and connection.in_atomic_block:
+        rows = rows.select_for_update()
+    row = rows.values_list('version', 'changed_at').first()
+    return tuple(row) if row else (0, None)
@@ -1,15 +1,60 @@
 # shipments/admin.py
 
 from django.contrib import admin
-from .models import Shipment
+from .models import Shipment, Location, LocationAlias, SavedSearch, SavedSearchMatch
+
+
+class RangeListFilter(admin.SimpleListFilter):
+    """Фильтр по диапазонам сохраненной числовой колонки"""
+    field_name = None
+    # [(значение параметра, подпись, нижняя граница, верхняя граница)]
+    ranges = []
+
+    def lookups(self, request, model_admin):
+        return [(value, label) for value, label, _, _ in self.ranges]
+
+    def queryset(self, request, queryset):
+        for value, _, lower, upper in self.ranges:
+            if self.value() == value:
+                if lower is not None:
+                    queryset = queryset.filter(**{f'{self.field_name}__gte': lower})
+                if upper is not None:
+                    queryset = queryset.filter(**{f'{self.field_name}__lt': upper})
+                return queryset
+        return queryset
+
+
+class VolumeFilter(RangeListFilter):
+    title = 'Объем'
+    parameter_name = 'volume_range'
+    field_name = 'volume'
+    ranges = [
+        ('lt1', 'до 1 м³', None, 1),
+        ('1-5', '1–5 м³', 1, 5),
+        ('5-20', '5–20 м³', 5, 20),
+        ('gte20', '20 м³ и больше', 20, None),
+    ]
+
+
+class ChargeableWeightFilter(RangeListFilter):
+    title = 'Оплачиваемый вес'
+    parameter_name = 'chargeable_range'
+    field_name = 'chargeable_weight'
+    ranges = [
+        ('lt100', 'до 100 кг', None, 100),
+        ('100-500', '100–500 кг', 100, 500),
+        ('500-2000', '500–2000 кг', 500, 2000),
+        ('gte2000', '2000 кг и больше', 2000, None),
+    ]
 
 
 @admin.register(Shipment)
 class ShipmentAdmin(admin.ModelAdmin):
-    list_display = ('id', 'title', 'get_owner', 'status', 'departure_city', 'arrival_city', 'created_at')
-    list_filter = ('status', 'cargo_type', 'created_at')
+    list_display = ('id', 'title', 'get_owner', 'status', 'departure_city', 'arrival_city',
+                    'volume', 'chargeable_weight', 'created_at')
+    list_filter = ('status', 'cargo_type', VolumeFilter, ChargeableWeightFilter, 'created_at')
     search_fields = ('title', 'description', 'owner__username', 'departure_city', 'arrival_city')
-    readonly_fields = ('created_at', 'updated_at', 'views', 'volume_display')
+    readonly_fields = ('created_at', 'updated_at', 'views', 'unique_viewers', 'volume_display', 'chargeable_weight')
     list_per_page = 20
 
     fieldsets = (
@@ -18,7 +63,8 @@ class ShipmentAdmin(admin.ModelAdmin):
         }),
         ('Детали груза', {
             'fields': (
-            'cargo_type', 'weight', 'length', 'width', 'height', 'volume_display', 'packaging', 'is_hazardous')
+            'cargo_type', 'weight', 'length', 'width', 'height', 'volume_display', 'chargeable_weight',
+            'packaging', 'is_hazardous')
         }),
         ('Маршрут', {
             'fields': ('departure_city', 'departure_country', 'arrival_city', 'arrival_country')
@@ -30,7 +76,7 @@ class ShipmentAdmin(admin.ModelAdmin):
             'fields': ('estimated_price', 'currency', 'payment_method', 'incoterm', 'additional_costs')
         }),
         ('Статистика', {
-            'fields': ('views', 'created_at', 'updated_at'),
+            'fields': ('views', 'unique_viewers', 'created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
@@ -41,11 +87,51 @@ class ShipmentAdmin(admin.ModelAdmin):
     get_owner.short_description = 'Владелец'
     get_owner.admin_order_field = 'owner__username'
 
+    def unique_viewers(self, obj):
+        stats = getattr(obj, 'view_stats', None)
+        return f"≈ {stats.unique_viewers}" if stats else '—'
+
+    unique_viewers.short_description = 'Уникальных зрителей'
+
     def volume_display(self, obj):
+        if obj.volume is None:
+            return '—'
         return f"{obj.volume:.2f} м³"
 
     volume_display.short_description = 'Объем'
 
     def get_queryset(self, request):
         queryset = super().get_queryset(request)
-        return queryset.select_related('owner')
\ No newline at end of file
+        return queryset.select_related('owner')
+
+
+class LocationAliasInline(admin.TabularInline):
+    model = LocationAlias
+    fields = ('name', 'key')
+    readonly_fields = ('key',)
+    extra = 1
+
+
+@admin.register(Location)
+class LocationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'city', 'country', 'city_key', 'country_key')
+    search_fields = ('city', 'country', 'city_key', 'aliases__key')
+    readonly_fields = ('city_key', 'country_key')
+    inlines = [LocationAliasInline]
+
+
+@admin.register(SavedSearch)
+class SavedSearchAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'agent', 'departure_location', 'arrival_location', 'cargo_type', 'is_active')
+    list_filter = ('is_active', 'cargo_type', 'currency')
+    search_fields = ('name', 'agent__username')
+    raw_id_fields = ('agent', 'departure_location', 'arrival_location')
+    list_select_related = ('agent', 'departure_location', 'arrival_location')
+
+
+@admin.register(SavedSearchMatch)
+class SavedSearchMatchAdmin(admin.ModelAdmin):
+    list_display = ('id', 'agent', 'shipment', 'saved_search', 'is_read', 'created_at')
+    list_filter = ('is_read',)
+    raw_id_fields = ('agent', 'shipment', 'saved_search')
+    list_select_related = ('agent', 'shipment', 'saved_search')
@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def create_search_index(sender, using='default', **kwargs):
+    from django.db import connections
+    from .search import ensure_search_index
+
+    ensure_search_index(connections[using])
 
 
 class ShipmentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'shipments'
+
+    def ready(self):
+        import shipments.signals  # noqa: F401
+        post_migrate.connect(create_search_index, sender=self)
@@ -0,0 +1,46 @@
+# shipments/cache.py - поколение данных заявок для инвалидации кэшей
+
+import hashlib
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import urlencode
+
+from core import versions
+
+GENERATION_KEY = 'shipments:generation'
+
+
+def get_generation():
+    """Текущее поколение заявок. Меняется при любой записи в Shipment"""
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, 1, timeout=None)
+        generation = cache.get(GENERATION_KEY, 1)
+    return generation
+
+
+def bump_generation():
+    """Сделать все кэши, построенные на старом поколении, недействительными"""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, 1, timeout=None)
+
+
+def shipments_changed():
+    """Заявки в списке изменились.
+
+    Версия в БД (по ней ETag списка во всех процессах) растет в текущей
+    транзакции, поколение кэшей - после ее фиксации.
+    """
+    versions.bump(versions.SHIPMENTS)
+    transaction.on_commit(bump_generation)
+
+
+def filter_cache_key(prefix, filters, generation=None):
+    """Ключ кэша для набора фильтров, не зависящий от порядка параметров"""
+    if generation is None:
+        generation = get_generation()
+    digest = hashlib.sha1(urlencode(sorted(filters.items())).encode()).hexdigest()
+    return f'{prefix}:{generation}:{digest}'
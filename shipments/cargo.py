@@ -0,0 +1,38 @@
+# shipments/cargo.py - объем и оплачиваемый вес груза
+
+from decimal import Decimal, ROUND_HALF_UP
+
+# Объемный вес в авиаперевозках: см³ / 6000 = кг (стандарт IATA)
+VOLUMETRIC_DIVISOR = Decimal(6000)
+
+VOLUME_PRECISION = Decimal('0.001')
+WEIGHT_PRECISION = Decimal('0.01')
+
+# Наибольший габарит, см. При нем объем (10^6 м³) и объемный вес
+# (~1.7 * 10^8 кг) помещаются в колонки volume и chargeable_weight.
+MAX_DIMENSION_CM = Decimal(10000)
+
+
+def volume_m3(length, width, height):
+    """Объем в м³ по габаритам в сантиметрах"""
+    if not all([length, width, height]):
+        return Decimal(0)
+    volume = Decimal(length) * Decimal(width) * Decimal(height) / 1000000
+    return volume.quantize(VOLUME_PRECISION, rounding=ROUND_HALF_UP)
+
+
+def chargeable_weight(weight, length, width, height):
+    """Оплачиваемый вес: большее из фактического и объемного веса"""
+    volumetric = Decimal(0)
+    if all([length, width, height]):
+        volumetric = Decimal(length) * Decimal(width) * Decimal(height) / VOLUMETRIC_DIVISOR
+    actual = Decimal(weight or 0)
+    return max(actual, volumetric).quantize(WEIGHT_PRECISION, rounding=ROUND_HALF_UP)
+
+
+def cargo_fields(shipment):
+    """Значения сохраненных колонок volume/chargeable_weight (заполняются в Shipment.save)"""
+    return {
+        'volume': volume_m3(shipment.length, shipment.width, shipment.height),
+        'chargeable_weight': chargeable_weight(shipment.weight, shipment.length, shipment.width, shipment.height),
+    }
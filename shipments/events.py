@@ -0,0 +1,64 @@
+# shipments/events.py - поток событий заявки (Server-Sent Events)
+
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import HttpResponseForbidden, StreamingHttpResponse
+
+from core.events import get_broker, get_config
+from .models import Shipment
+
+
+def channel_name(shipment_id):
+    return f'shipment:{shipment_id}'
+
+
+def publish_shipment_event(shipment_id, kind, data):
+    """Опубликовать событие заявки после коммита текущей транзакции"""
+    transaction.on_commit(lambda: get_broker().publish(channel_name(shipment_id), kind, data))
+
+
+def format_event(event):
+    data = json.dumps(event['data'], cls=DjangoJSONEncoder, ensure_ascii=False)
+    return f'id: {event["id"]}\nevent: {event["kind"]}\ndata: {data}\n\n'
+
+
+async def event_stream(channel, heartbeat):
+    # Подписка создается при первом чтении - в event loop, который
+    # обслуживает соединение, и закрывается вместе с ним
+    subscription = get_broker().subscribe(channel)
+    try:
+        # Интервал переподключения для EventSource
+        yield f'retry: {int(heartbeat * 1000)}\n\n'
+        while True:
+            event = await subscription.get(timeout=heartbeat)
+            # Пульс не дает прокси закрыть простаивающее соединение
+            yield ': keepalive\n\n' if event is None else format_event(event)
+    finally:
+        subscription.close()
+
+
+def _viewer_id(request):
+    return request.user.id if request.user.is_authenticated else None
+
+
+async def shipment_events(request, shipment_id):
+    """SSE-поток новых предложений и смен статуса для владельца заявки.
+
+    Асинхронная view: соединение ждет событий в event loop, без потока
+    на клиента.
+    """
+    viewer_id = await sync_to_async(_viewer_id)(request)
+    owner_id = await Shipment.objects.filter(id=shipment_id).values_list('owner_id', flat=True).afirst()
+    if viewer_id is None or owner_id != viewer_id:
+        return HttpResponseForbidden('Поток событий доступен только владельцу заявки.')
+
+    response = StreamingHttpResponse(
+        event_stream(channel_name(shipment_id), get_config()['HEARTBEAT']), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Отключить буферизацию ответа в nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
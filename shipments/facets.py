@@ -0,0 +1,87 @@
+# shipments/facets.py - счетчики фильтров (фасеты) для списка заявок
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from .cache import filter_cache_key
+from .models import Shipment
+
+FACET_FIELDS = ('status', 'cargo_type', 'currency', 'incoterm', 'is_hazardous')
+
+# Поле модели -> GET-параметр shipment_list
+FACET_PARAMS = {
+    'status': 'status',
+    'cargo_type': 'cargo_type',
+    'currency': 'currency',
+    'incoterm': 'incoterm',
+    'is_hazardous': 'hazardous',
+}
+
+FACETS_TIMEOUT = 300
+
+
+def _choices(field_name):
+    return dict(Shipment._meta.get_field(field_name).flatchoices)
+
+
+def compute_facets(queryset):
+    """Посчитать все фасеты одним GROUP BY по отфильтрованному queryset.
+
+    Комбинаций значений немного (статус x тип x валюта x инкотермс x опасный),
+    поэтому одна группировка с суммированием в Python дешевле, чем
+    отдельный COUNT на каждый вариант фильтра.
+    """
+    rows = (
+        queryset.order_by()
+        .values(*FACET_FIELDS)
+        .annotate(count=Count('id'))
+    )
+
+    counts = {field: {} for field in FACET_FIELDS}
+    for row in rows:
+        for field in FACET_FIELDS:
+            value = row[field]
+            counts[field][value] = counts[field].get(value, 0) + row['count']
+
+    facets = {}
+    for field in FACET_FIELDS:
+        if field == 'is_hazardous':
+            labels = {True: 'Да', False: 'Нет'}
+        else:
+            labels = _choices(field)
+        facets[field] = [
+            {'value': value, 'label': labels.get(value, value), 'count': count}
+            for value, count in sorted(counts[field].items(), key=lambda item: -item[1])
+        ]
+    return facets
+
+
+def get_facets(queryset, filters):
+    """Фасеты с кэшированием по нормализованному набору фильтров.
+
+    Ключ включает поколение заявок (shipments.cache), поэтому любое
+    изменение Shipment делает кэш неактуальным.
+    """
+    key = filter_cache_key('shipments:facets', filters)
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(queryset)
+        cache.set(key, facets, FACETS_TIMEOUT)
+    return facets
+
+
+def facet_links(facets, query_params):
+    """Добавить к вариантам фасетов ссылки с сохранением остальных фильтров"""
+    result = {}
+    for field, options in facets.items():
+        param = FACET_PARAMS[field]
+        result[field] = []
+        for option in options:
+            params = query_params.copy()
+            value = option['value']
+            if isinstance(value, bool):
+                value = '1' if value else '0'
+            params[param] = value
+            result[field].append({**option, 'selected': query_params.get(param) == str(value),
+                                  'query': params.urlencode()})
+    return result
@@ -1,7 +1,9 @@
 # shipments/forms.py - исправленная версия
 
 from django import forms
-from .models import Shipment
+from .models import Shipment, SavedSearch
+from .cargo import MAX_DIMENSION_CM
+from .locations import resolve_location
 
 
 class ShipmentForm(forms.ModelForm):
@@ -34,18 +36,21 @@ class ShipmentForm(forms.ModelForm):
                 'class': 'form-control',
                 'step': '0.01',
                 'min': '0',
+                'max': str(MAX_DIMENSION_CM),
                 'placeholder': 'см'
             }),
             'width': forms.NumberInput(attrs={
                 'class': 'form-control',
                 'step': '0.01',
                 'min': '0',
+                'max': str(MAX_DIMENSION_CM),
                 'placeholder': 'см'
             }),
             'height': forms.NumberInput(attrs={
                 'class': 'form-control',
                 'step': '0.01',
                 'min': '0',
+                'max': str(MAX_DIMENSION_CM),
                 'placeholder': 'см'
             }),
             'packaging': forms.Select(attrs={'class': 'form-control'}),
@@ -147,4 +152,60 @@ class ShipmentForm(forms.ModelForm):
                     'Дата отправления не может быть позже даты прибытия.'
                 )
 
-        return cleaned_data
\ No newline at end of file
+        return cleaned_data
+
+
+class SavedSearchForm(forms.ModelForm):
+    """Сохраненный поиск агента. Маршрут вводится текстом и нормализуется
+    через справочник населенных пунктов (shipments/locations.py)."""
+
+    departure_city = forms.CharField(label='Город отправления', required=False, max_length=100)
+    departure_country = forms.CharField(label='Страна отправления', required=False, max_length=100)
+    arrival_city = forms.CharField(label='Город назначения', required=False, max_length=100)
+    arrival_country = forms.CharField(label='Страна назначения', required=False, max_length=100)
+
+    class Meta:
+        model = SavedSearch
+        fields = [
+            'name', 'cargo_type', 'currency',
+            'min_weight', 'max_weight', 'min_volume', 'max_volume',
+            'date_from', 'date_to',
+        ]
+        widgets = {
+            'date_from': forms.DateInput(attrs={'type': 'date'}),
+            'date_to': forms.DateInput(attrs={'type': 'date'}),
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field in self.fields.values():
+            field.widget.attrs.setdefault('class', 'form-control')
+        if self.instance.pk:
+            for prefix in ('departure', 'arrival'):
+                location = getattr(self.instance, f'{prefix}_location')
+                if location is not None:
+                    self.initial[f'{prefix}_city'] = location.city
+                    self.initial[f'{prefix}_country'] = location.country
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for low, high, message in (
+            ('min_weight', 'max_weight', 'Минимальный вес больше максимального.'),
+            ('min_volume', 'max_volume', 'Минимальный объем больше максимального.'),
+            ('date_from', 'date_to', 'Начало периода отправления позже его конца.'),
+        ):
+            if cleaned_data.get(low) is not None and cleaned_data.get(high) is not None:
+                if cleaned_data[low] > cleaned_data[high]:
+                    raise forms.ValidationError(message)
+        return cleaned_data
+
+    def save(self, commit=True):
+        search = super().save(commit=False)
+        for prefix in ('departure', 'arrival'):
+            setattr(search, f'{prefix}_location_id', resolve_location(
+                self.cleaned_data.get(f'{prefix}_city'),
+                self.cleaned_data.get(f'{prefix}_country'),
+            ))
+        if commit:
+            search.save()
+        return search
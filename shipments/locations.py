@@ -0,0 +1,315 @@
+# shipments/locations.py - нормализация городов и автодополнение
+
+import re
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from core import versions
+
+TRANSLIT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e',
+    'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'i', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch',
+    'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'iu', 'я': 'ia',
+}
+
+# Встроенные синонимы городов: транслит/экзоним -> канонический ключ.
+# Синонимы, добавленные в админке (LocationAlias), дополняют этот список.
+CITY_ALIASES = {
+    'moskva': 'moscow',
+    'moskau': 'moscow',
+    'sankt peterburg': 'saint petersburg',
+    'st petersburg': 'saint petersburg',
+    'peterburg': 'saint petersburg',
+    'spb': 'saint petersburg',
+    'ekaterinburg': 'yekaterinburg',
+    'frankfurt na maine': 'frankfurt',
+    'frankfurt am main': 'frankfurt',
+    'pekin': 'beijing',
+    'shankhai': 'shanghai',
+    'gonkong': 'hong kong',
+    'stambul': 'istanbul',
+    'parizh': 'paris',
+    'niu iork': 'new york',
+    'nyu york': 'new york',
+    'tokio': 'tokyo',
+    'vena': 'vienna',
+    'praga': 'prague',
+    'rim': 'rome',
+}
+
+COUNTRY_ALIASES = {
+    'rossiia': 'russia',
+    'rf': 'russia',
+    'russian federation': 'russia',
+    'germaniia': 'germany',
+    'deutschland': 'germany',
+    'kitai': 'china',
+    'ssha': 'usa',
+    'united states': 'usa',
+    'oae': 'uae',
+    'united arab emirates': 'uae',
+    'turtsiia': 'turkey',
+    'turkiye': 'turkey',
+    'velikobritaniia': 'uk',
+    'united kingdom': 'uk',
+    'great britain': 'uk',
+    'frantsiia': 'france',
+    'niderlandy': 'netherlands',
+    'gollandiia': 'netherlands',
+    'iaponiia': 'japan',
+    'italiia': 'italy',
+    'avstriia': 'austria',
+    'chekhiia': 'czech republic',
+    'czechia': 'czech republic',
+}
+
+# Канонический ключ -> встроенные синонимы (для автодополнения "моск" -> Moscow)
+CITY_ALIASES_BY_KEY = {}
+for _alias, _key in CITY_ALIASES.items():
+    CITY_ALIASES_BY_KEY.setdefault(_key, []).append(_alias)
+
+NON_ALNUM_RE = re.compile(r'[^0-9a-z]+')
+
+AUTOCOMPLETE_LIMIT = 10
+
+DEFAULTS = {
+    # Как часто процесс сверяет индекс с версией справочника в БД, секунд
+    'REFRESH': 5,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'LOCATION_INDEX', {})}
+
+
+def normalize_name(text):
+    """Привести название к ключу: регистр, пробелы, ё, транслитерация.
+
+    'Москва', 'москва ' и 'МОСКВА' дают 'moskva', 'Санкт-Петербург' -
+    'sankt peterburg', 'Zürich' - 'zurich'.
+    """
+    text = (text or '').casefold()
+    text = ''.join(TRANSLIT.get(char, char) for char in text)
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return NON_ALNUM_RE.sub(' ', text).strip()
+
+
+def canonical_city_key(city):
+    key = normalize_name(city)
+    return CITY_ALIASES.get(key, key)
+
+
+def canonical_country_key(country):
+    key = normalize_name(country)
+    return COUNTRY_ALIASES.get(key, key)
+
+
+class _TrieNode:
+    __slots__ = ('children', 'top')
+
+    def __init__(self):
+        self.children = {}
+        # [(вес, id)] - лучшие AUTOCOMPLETE_LIMIT результатов для этого префикса
+        self.top = []
+
+
+class LocationIndex:
+    """Справочник населенных пунктов в памяти процесса.
+
+    Содержит точные ключи для нормализации (ключ города + ключ страны)
+    и префиксное дерево для автодополнения. В каждом узле дерева заранее
+    посчитан топ результатов, поэтому запрос - это проход по префиксу.
+    """
+
+    def __init__(self):
+        self.root = _TrieNode()
+        self.labels = {}        # id -> (город, страна)
+        self.weights = {}       # id -> популярность (число заявок)
+        self.exact = {}         # (ключ города, ключ страны) -> id
+        self.by_city = {}       # ключ города -> {id}
+
+    def add(self, location_id, city, country, country_key, keys, weight=0):
+        self.labels[location_id] = (city, country)
+        self.weights[location_id] = max(weight, self.weights.get(location_id, 0))
+        for key in keys:
+            if not key:
+                continue
+            self.exact[(key, country_key)] = location_id
+            self.by_city.setdefault(key, set()).add(location_id)
+
+        prefixes = set(keys) | {normalize_name(city)}
+        for key in keys:
+            prefixes.update(CITY_ALIASES_BY_KEY.get(key, ()))
+        for key in prefixes:
+            if not key:
+                continue
+            # Автодополнение и по началу каждого слова: "peterburg" -> Санкт-Петербург
+            words = key.split(' ')
+            for i in range(len(words)):
+                self._insert(' '.join(words[i:]), location_id)
+
+    def _insert(self, key, location_id):
+        entry = (self.weights[location_id], location_id)
+        node = self.root
+        for char in key:
+            node = node.children.setdefault(char, _TrieNode())
+            top = [item for item in node.top if item[1] != location_id]
+            top.append(entry)
+            top.sort(key=lambda item: (-item[0], item[1]))
+            node.top = top[:AUTOCOMPLETE_LIMIT]
+
+    def lookup(self, city_key, country_key=''):
+        """id населенного пункта по нормализованным ключам или None"""
+        location_id = self.exact.get((city_key, country_key))
+        if location_id is None and not country_key:
+            candidates = self.by_city.get(city_key, ())
+            if len(candidates) == 1:
+                location_id = next(iter(candidates))
+        return location_id
+
+    def city_ids(self, city):
+        """Все населенные пункты с таким названием (в любой стране)"""
+        return set(self.by_city.get(canonical_city_key(city), ()))
+
+    def complete(self, prefix, limit=AUTOCOMPLETE_LIMIT):
+        node = self.root
+        for char in normalize_name(prefix):
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return [
+            {'id': location_id, 'city': self.labels[location_id][0], 'country': self.labels[location_id][1]}
+            for _, location_id in node.top[:limit]
+        ]
+
+
+_index = None
+_index_version = None       # версия справочника в БД, по которой построен индекс
+_checked = 0.0
+_index_lock = threading.Lock()
+
+
+def _build_index():
+    from .models import Location, LocationAlias
+
+    index = LocationIndex()
+    locations = Location.objects.annotate(
+        weight=Count('departing_shipments', distinct=True) + Count('arriving_shipments', distinct=True)
+    ).values_list('id', 'city', 'country', 'city_key', 'country_key', 'weight')
+    aliases = {}
+    for location_id, key in LocationAlias.objects.values_list('location_id', 'key'):
+        aliases.setdefault(location_id, []).append(key)
+    for location_id, city, country, city_key, country_key, weight in locations.iterator():
+        keys = [city_key, *aliases.get(location_id, [])]
+        index.add(location_id, city, country, country_key, keys, weight)
+    return index
+
+
+def get_location_index(check=False):
+    """Индекс справочника процесса.
+
+    Сверяется с версией справочника в БД (core.versions) и перестраивается,
+    если она изменилась - например, синоним добавили в админке другого
+    процесса. Чтение (автодополнение, фильтры, расчет цены) сверяется раз
+    в REFRESH секунд и обходится без запросов; check=True - сверка сейчас,
+    для записи id населенного пункта в заявку.
+    """
+    global _index, _index_version, _checked
+    refresh = 0 if check else get_config()['REFRESH']
+    if _index is not None and time.monotonic() - _checked < refresh:
+        return _index
+    with _index_lock:
+        if _index is None or time.monotonic() - _checked >= refresh:
+            version = versions.get(versions.LOCATIONS)
+            if _index is None or _index_version != version:
+                _index, _index_version = _build_index(), version
+            _checked = time.monotonic()
+        return _index
+
+
+def invalidate_location_index():
+    global _index, _index_version
+    _index, _index_version = None, None
+
+
+def dictionary_changed():
+    """Новая версия справочника в транзакции изменения; индекс этого
+    процесса перестроится сразу, остальных - при ближайшей сверке"""
+    versions.bump(versions.LOCATIONS)
+    invalidate_location_index()
+
+
+def _add(location):
+    _index.add(location.id, location.city, location.country, location.country_key, [location.city_key])
+
+
+def index_location(location):
+    """Новый населенный пункт: новая версия справочника и добавление в индекс после коммита.
+
+    До коммита id может исчезнуть при откате транзакции, и индекс начал бы
+    выдавать несуществующие населенные пункты. Индекс дополняется, только
+    если построен по предыдущей версии, иначе он отстал от чужих изменений
+    и будет перестроен целиком.
+    """
+    previous, version = versions.bump(versions.LOCATIONS, read=True)
+
+    def add():
+        global _index, _index_version
+        with _index_lock:
+            if _index is None:
+                return
+            if _index_version == previous:
+                _add(location)
+                _index_version = version
+            else:
+                _index = None
+
+    transaction.on_commit(add)
+
+
+def resolve_location(city, country='', create=True):
+    """id нормализованного населенного пункта для пары город/страна.
+
+    Сначала ищем в индексе в памяти, при промахе - get_or_create в БД.
+    Перед записью (create=True) индекс сверяется с версией справочника:
+    id пункта, удаленного другим процессом, нарушил бы внешний ключ.
+    """
+    from .models import Location
+
+    city_key = canonical_city_key(city)
+    if not city_key:
+        return None
+    country_key = canonical_country_key(country)
+
+    location_id = get_location_index(check=create).lookup(city_key, country_key)
+    if location_id is not None or not create:
+        return location_id
+
+    location, created = Location.objects.get_or_create(
+        city_key=city_key,
+        country_key=country_key,
+        defaults={'city': city.strip(), 'country': (country or '').strip()},
+    )
+    if not created:
+        # Пункт уже есть в БД, но индекс этого процесса о нем не знает
+        def add():
+            with _index_lock:
+                if _index is not None:
+                    _add(location)
+
+        transaction.on_commit(add)
+    return location.id
+
+
+def autocomplete(prefix, limit=AUTOCOMPLETE_LIMIT):
+    if not normalize_name(prefix):
+        return []
+    return get_location_index().complete(prefix, limit)
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from core.batches import run_in_batches
+from shipments.cache import shipments_changed
+from shipments.cargo import cargo_fields
+from shipments.models import Shipment
+
+
+class Command(BaseCommand):
+    help = 'Заполнить сохраненные объем и оплачиваемый вес у существующих заявок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Количество заявок в одной пачке')
+        parser.add_argument('--all', action='store_true',
+                            help='Пересчитать и уже заполненные заявки')
+
+    def handle(self, *args, **options):
+        shipments = Shipment.objects.only(
+            'id', 'weight', 'length', 'width', 'height', 'volume', 'chargeable_weight',
+        )
+        if not options['all']:
+            shipments = shipments.filter(volume__isnull=True) | shipments.filter(
+                chargeable_weight__isnull=True
+            )
+
+        total = run_in_batches(
+            shipments, options['batch_size'], self.update_batch,
+            progress=lambda total: self.stdout.write(f'Обработано заявок: {total}'),
+        )
+
+        # bulk_update не отправляет сигналы - сбрасываем версию и кэши списка явно
+        shipments_changed()
+        self.stdout.write(self.style.SUCCESS(f'Готово, обработано заявок: {total}'))
+
+    def update_batch(self, batch):
+        for shipment in batch:
+            for field, value in cargo_fields(shipment).items():
+                setattr(shipment, field, value)
+        # bulk_update не вызывает save() и сигналы - updated_at и FTS не трогаем
+        Shipment.objects.bulk_update(batch, ['volume', 'chargeable_weight'])
+        return len(batch)
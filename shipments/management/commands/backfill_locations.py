@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from core.batches import run_in_batches
+from shipments.cache import shipments_changed
+from shipments.locations import resolve_location
+from shipments.models import Shipment
+
+
+class Command(BaseCommand):
+    help = 'Привязать существующие заявки к нормализованному справочнику городов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Количество заявок в одной пачке')
+        parser.add_argument('--all', action='store_true',
+                            help='Пересчитать и уже привязанные заявки')
+
+    def handle(self, *args, **options):
+        shipments = Shipment.objects.only(
+            'id', 'departure_city', 'departure_country', 'arrival_city', 'arrival_country',
+            'departure_location', 'arrival_location',
+        )
+        if not options['all']:
+            shipments = shipments.filter(departure_location__isnull=True) | shipments.filter(
+                arrival_location__isnull=True
+            )
+
+        total = run_in_batches(
+            shipments, options['batch_size'], self.update_batch,
+            progress=lambda total: self.stdout.write(f'Обработано заявок: {total}'),
+        )
+
+        # bulk_update не отправляет сигналы - сбрасываем версию и кэши списка явно
+        shipments_changed()
+        self.stdout.write(self.style.SUCCESS(f'Готово, обработано заявок: {total}'))
+
+    def update_batch(self, batch):
+        for shipment in batch:
+            shipment.departure_location_id = resolve_location(
+                shipment.departure_city, shipment.departure_country
+            )
+            shipment.arrival_location_id = resolve_location(
+                shipment.arrival_city, shipment.arrival_country
+            )
+        # bulk_update не вызывает save() и сигналы - updated_at и FTS не трогаем
+        Shipment.objects.bulk_update(batch, ['departure_location', 'arrival_location'])
+        return len(batch)
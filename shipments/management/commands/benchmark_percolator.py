@@ -0,0 +1,129 @@
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shipments.models import Shipment
+from shipments.percolator import Percolator, SearchSpec
+
+CARGO_TYPES = [value for value, _ in Shipment.CARGO_TYPE_CHOICES]
+CURRENCIES = ['USD', 'EUR', 'RUB']
+
+
+def random_spec(rng, search_id, locations):
+    """Поиск, похожий на реальный: маршрут задан почти всегда, остальное - через раз"""
+    def maybe(probability, value):
+        return value if rng.random() < probability else None
+
+    min_weight = maybe(0.5, Decimal(rng.randrange(0, 5000)))
+    max_weight = maybe(0.5, Decimal(rng.randrange(5000, 20000)))
+    min_volume = maybe(0.3, Decimal(rng.randrange(0, 20)))
+    max_volume = maybe(0.3, Decimal(rng.randrange(20, 100)))
+    date_from = maybe(0.5, date(2026, 1, 1) + timedelta(days=rng.randrange(0, 300)))
+    date_to = maybe(0.5, (date_from or date(2026, 1, 1)) + timedelta(days=rng.randrange(0, 60)))
+    return SearchSpec(
+        id=search_id,
+        agent_id=rng.randrange(1, 5000),
+        departure_location_id=maybe(0.9, rng.randrange(1, locations + 1)),
+        arrival_location_id=maybe(0.7, rng.randrange(1, locations + 1)),
+        cargo_type=maybe(0.4, rng.choice(CARGO_TYPES)),
+        currency=maybe(0.2, rng.choice(CURRENCIES)),
+        min_weight=min_weight, max_weight=max_weight,
+        min_volume=min_volume, max_volume=max_volume,
+        date_from=date_from, date_to=date_to,
+    )
+
+
+def random_shipment(rng, locations):
+    departure_date = date(2026, 1, 1) + timedelta(days=rng.randrange(0, 330))
+    return SimpleNamespace(
+        id=None,
+        owner_id=0,
+        departure_location_id=rng.randrange(1, locations + 1),
+        arrival_location_id=rng.randrange(1, locations + 1),
+        cargo_type=rng.choice(CARGO_TYPES),
+        currency=rng.choice(CURRENCIES),
+        weight=Decimal(rng.randrange(1, 20000)),
+        volume=Decimal(rng.randrange(1, 100)),
+        departure_date=departure_date,
+        latest_departure_date=departure_date + timedelta(days=rng.randrange(0, 14)),
+    )
+
+
+def brute_force_match(specs, shipment):
+    """Эталон: проверка каждого поиска по очереди"""
+    window_end = shipment.latest_departure_date or shipment.departure_date
+    result = set()
+    for spec in specs:
+        if any(
+            getattr(spec, field) is not None and getattr(spec, field) != getattr(shipment, field)
+            for field in ('departure_location_id', 'arrival_location_id', 'cargo_type', 'currency')
+        ):
+            continue
+        if spec.min_weight is not None and shipment.weight < spec.min_weight:
+            continue
+        if spec.max_weight is not None and shipment.weight > spec.max_weight:
+            continue
+        if spec.min_volume is not None and shipment.volume < spec.min_volume:
+            continue
+        if spec.max_volume is not None and shipment.volume > spec.max_volume:
+            continue
+        if spec.date_from is not None and window_end < spec.date_from:
+            continue
+        if spec.date_to is not None and shipment.departure_date > spec.date_to:
+            continue
+        result.add(spec.id)
+    return result
+
+
+class Command(BaseCommand):
+    help = 'Сравнить перколятор сохраненных поисков с полным перебором (данные в памяти, без БД)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--searches', type=int, default=100000,
+                            help='Количество сохраненных поисков')
+        parser.add_argument('--shipments', type=int, default=1000,
+                            help='Количество сопоставляемых заявок')
+        parser.add_argument('--locations', type=int, default=300,
+                            help='Количество различных пунктов маршрута')
+        parser.add_argument('--brute-force', type=int, default=50,
+                            help='Сколько заявок проверить полным перебором для сверки')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        locations = options['locations']
+        specs = [random_spec(rng, i, locations) for i in range(1, options['searches'] + 1)]
+        shipments = [random_shipment(rng, locations) for _ in range(options['shipments'])]
+
+        started = time.perf_counter()
+        percolator = Percolator()
+        percolator.extend(specs)
+        build_time = time.perf_counter() - started
+        self.stdout.write(f'Индекс на {len(percolator)} поисков построен за {build_time:.2f} с')
+
+        started = time.perf_counter()
+        results = [percolator.match(shipment) for shipment in shipments]
+        match_time = time.perf_counter() - started
+        total = sum(len(result) for result in results)
+        self.stdout.write(
+            f'Перколятор: {len(shipments)} заявок, {match_time / len(shipments) * 1000:.3f} мс на заявку, '
+            f'в среднем {total / len(shipments):.1f} совпадений'
+        )
+
+        checked = shipments[:options['brute_force']]
+        if not checked:
+            return
+        started = time.perf_counter()
+        for shipment, result in zip(checked, results):
+            if brute_force_match(specs, shipment) != result:
+                raise CommandError(f'Результат перколятора расходится с перебором для {shipment}')
+        brute_time = time.perf_counter() - started
+        per_shipment = brute_time / len(checked) * 1000
+        self.stdout.write(f'Полный перебор: {per_shipment:.3f} мс на заявку')
+        self.stdout.write(self.style.SUCCESS(
+            f'Результаты совпадают, ускорение x{per_shipment / (match_time / len(shipments) * 1000):.0f}'
+        ))
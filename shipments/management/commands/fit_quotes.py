@@ -0,0 +1,30 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from shipments.quotes import QuoteModel, fit, get_config, update
+
+
+class Command(BaseCommand):
+    help = 'Подогнать модели рекомендуемой цены по принятым предложениям и сохранить снимок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Подогнать заново по всей истории, а не догрузить новое к снимку')
+
+    def handle(self, *args, **options):
+        path = Path(get_config()['SNAPSHOT'])
+        started = time.perf_counter()
+        if options['full'] or not path.exists():
+            model = fit()
+            added = None
+        else:
+            model = QuoteModel.load(path)
+            added = update(model)
+        model.save(path)
+        elapsed = time.perf_counter() - started
+        summary = f'моделей: {len(model)}, {elapsed:.2f} с'
+        if added is not None:
+            summary = f'новых предложений: {added}, {summary}'
+        self.stdout.write(self.style.SUCCESS(f'Снимок {path} сохранен: {summary}'))
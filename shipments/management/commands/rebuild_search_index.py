@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from shipments.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Перестроить полнотекстовый индекс заявок (SQLite FTS5)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Количество заявок в одной пачке')
+
+    def handle(self, *args, **options):
+        total = rebuild_search_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано заявок: {total}'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from shipments.page_cache import warm_page_cache
+
+
+class Command(BaseCommand):
+    help = 'Прогреть кэш страниц списка заявок для популярных фильтров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filters', type=int, default=None,
+                            help='Сколько самых популярных наборов фильтров прогреть')
+        parser.add_argument('--pages', type=int, default=None,
+                            help='Сколько первых страниц каждого набора прогреть')
+
+    def handle(self, *args, **options):
+        warmed = warm_page_cache(filters=options['filters'], pages=options['pages'])
+        self.stdout.write(self.style.SUCCESS(f'Закэшировано страниц: {warmed}'))
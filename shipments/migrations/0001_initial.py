@@ -0,0 +1,57 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:42
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('bids', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Shipment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200, verbose_name='Название заявки')),
+                ('status', models.CharField(choices=[('draft', 'Черновик'), ('active', 'Активна'), ('in_progress', 'В работе'), ('completed', 'Завершена'), ('cancelled', 'Отменена'), ('inactive', 'Неактивна')], default='draft', max_length=20, verbose_name='Статус')),
+                ('description', models.TextField(blank=True, verbose_name='Описание')),
+                ('cargo_type', models.CharField(choices=[('general', 'Генеральный груз'), ('perishable', 'Скоропортящийся груз'), ('dangerous', 'Опасный груз'), ('live_animals', 'Живые животные'), ('valuable', 'Ценный груз'), ('oversized', 'Крупногабаритный груз'), ('refrigerated', 'Рефрижераторный груз')], default='general', max_length=20, verbose_name='Тип груза')),
+                ('weight', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Вес (кг)')),
+                ('length', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Длина (см)')),
+                ('width', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Ширина (см)')),
+                ('height', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Высота (см)')),
+                ('packaging', models.CharField(blank=True, choices=[('pallet', 'Паллет'), ('box', 'Коробка'), ('crate', 'Ящик'), ('bag', 'Мешок'), ('barrel', 'Бочка'), ('container', 'Контейнер'), ('none', 'Без упаковки')], max_length=20, verbose_name='Упаковка')),
+                ('is_hazardous', models.BooleanField(default=False, verbose_name='Опасный груз')),
+                ('departure_city', models.CharField(max_length=100, verbose_name='Город отправления')),
+                ('departure_country', models.CharField(max_length=100, verbose_name='Страна отправления')),
+                ('arrival_city', models.CharField(max_length=100, verbose_name='Город назначения')),
+                ('arrival_country', models.CharField(max_length=100, verbose_name='Страна назначения')),
+                ('departure_date', models.DateField(verbose_name='Желаемая дата отправления')),
+                ('latest_departure_date', models.DateField(blank=True, null=True, verbose_name='Крайняя дата отправления')),
+                ('arrival_date', models.DateField(verbose_name='Желаемая дата прибытия')),
+                ('latest_arrival_date', models.DateField(blank=True, null=True, verbose_name='Крайняя дата прибытия')),
+                ('estimated_price', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Ожидаемая стоимость')),
+                ('currency', models.CharField(choices=[('USD', 'USD'), ('EUR', 'EUR'), ('RUB', 'RUB')], default='USD', max_length=3, verbose_name='Валюта')),
+                ('payment_method', models.CharField(choices=[('bank_transfer', 'Банковский перевод'), ('letter_of_credit', 'Аккредитив'), ('cash', 'Наличные'), ('escrow', 'Эскроу-счет'), ('other', 'Другое')], default='bank_transfer', max_length=20, verbose_name='Метод оплаты')),
+                ('incoterm', models.CharField(choices=[('exw', 'EXW - Франко завод'), ('fca', 'FCA - Франко перевозчик'), ('cpt', 'CPT - Фрахт/перевозка оплачены до'), ('cip', 'CIP - Фрахт/перевозка и страхование оплачены до'), ('dat', 'DAT - Поставка на терминале'), ('dap', 'DAP - Поставка в месте назначения'), ('ddp', 'DDP - Поставка с оплатой пошлины')], default='fca', max_length=10, verbose_name='Инкотермс')),
+                ('additional_costs', models.TextField(blank=True, verbose_name='Дополнительные расходы')),
+                ('views', models.PositiveIntegerField(default=0, verbose_name='Просмотры')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('accepted_bid', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='accepted_for_shipment', to='bids.bid', verbose_name='Принятое предложение')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shipments', to=settings.AUTH_USER_MODEL, verbose_name='Владелец')),
+            ],
+            options={
+                'verbose_name': 'Заявка на перевозку',
+                'verbose_name_plural': 'Заявки на перевозку',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipments', '0002_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city', models.CharField(max_length=100, verbose_name='Город')),
+                ('country', models.CharField(blank=True, max_length=100, verbose_name='Страна')),
+                ('city_key', models.CharField(db_index=True, max_length=100, verbose_name='Ключ города')),
+                ('country_key', models.CharField(blank=True, max_length=100, verbose_name='Ключ страны')),
+            ],
+            options={
+                'verbose_name': 'Населенный пункт',
+                'verbose_name_plural': 'Населенные пункты',
+                'ordering': ['city'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LocationAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Написание')),
+                ('key', models.CharField(db_index=True, max_length=100, verbose_name='Ключ')),
+            ],
+            options={
+                'verbose_name': 'Синоним населенного пункта',
+                'verbose_name_plural': 'Синонимы населенных пунктов',
+            },
+        ),
+        migrations.AddField(
+            model_name='locationalias',
+            name='location',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='shipments.location', verbose_name='Населенный пункт'),
+        ),
+        migrations.AddConstraint(
+            model_name='location',
+            constraint=models.UniqueConstraint(fields=('city_key', 'country_key'), name='unique_location_key'),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='arrival_location',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='arriving_shipments', to='shipments.location', verbose_name='Пункт назначения'),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='departure_location',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='departing_shipments', to='shipments.location', verbose_name='Пункт отправления'),
+        ),
+        migrations.AddConstraint(
+            model_name='locationalias',
+            constraint=models.UniqueConstraint(fields=('location', 'key'), name='unique_location_alias'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['departure_location', 'arrival_location', '-created_at', '-id'], name='shipment_lane_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['arrival_location', '-created_at', '-id'], name='shipment_arrival_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('shipments', '0003_locations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavedSearch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Название')),
+                ('cargo_type', models.CharField(blank=True, choices=[('general', 'Генеральный груз'), ('perishable', 'Скоропортящийся груз'), ('dangerous', 'Опасный груз'), ('live_animals', 'Живые животные'), ('valuable', 'Ценный груз'), ('oversized', 'Крупногабаритный груз'), ('refrigerated', 'Рефрижераторный груз')], max_length=20, verbose_name='Тип груза')),
+                ('currency', models.CharField(blank=True, choices=[('USD', 'USD'), ('EUR', 'EUR'), ('RUB', 'RUB')], max_length=3, verbose_name='Валюта')),
+                ('min_weight', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Вес от (кг)')),
+                ('max_weight', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Вес до (кг)')),
+                ('min_volume', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Объем от (м³)')),
+                ('max_volume', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Объем до (м³)')),
+                ('date_from', models.DateField(blank=True, null=True, verbose_name='Отправление с')),
+                ('date_to', models.DateField(blank=True, null=True, verbose_name='Отправление по')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активен')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('agent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saved_searches', to=settings.AUTH_USER_MODEL, verbose_name='Агент')),
+                ('arrival_location', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shipments.location', verbose_name='Пункт назначения')),
+                ('departure_location', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shipments.location', verbose_name='Пункт отправления')),
+            ],
+            options={
+                'verbose_name': 'Сохраненный поиск',
+                'verbose_name_plural': 'Сохраненные поиски',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SavedSearchMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_read', models.BooleanField(default=False, verbose_name='Просмотрено')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата')),
+                ('agent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_matches', to=settings.AUTH_USER_MODEL, verbose_name='Агент')),
+                ('saved_search', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matches', to='shipments.savedsearch', verbose_name='Сохраненный поиск')),
+                ('shipment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_matches', to='shipments.shipment', verbose_name='Заявка')),
+            ],
+            options={
+                'verbose_name': 'Совпадение сохраненного поиска',
+                'verbose_name_plural': 'Совпадения сохраненных поисков',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['agent', 'is_read', '-created_at', '-id'], name='search_match_inbox_idx'), models.Index(fields=['agent', '-created_at', '-id'], name='search_match_recent_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='savedsearchmatch',
+            constraint=models.UniqueConstraint(fields=('saved_search', 'shipment'), name='unique_saved_search_match'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:57
+
+from django.db import migrations, models
+
+
+def fill_windows(apps, schema_editor):
+    from shipments.windows import window_fields
+
+    Shipment = apps.get_model('shipments', 'Shipment')
+    shipments = Shipment.objects.only(
+        'id', 'departure_date', 'latest_departure_date', 'arrival_date', 'latest_arrival_date'
+    ).order_by('id')
+    batch = []
+    fields = None
+    for shipment in shipments.iterator(chunk_size=1000):
+        values = window_fields(shipment)
+        fields = list(values)
+        for field, value in values.items():
+            setattr(shipment, field, value)
+        batch.append(shipment)
+        if len(batch) >= 1000:
+            Shipment.objects.bulk_update(batch, fields)
+            batch = []
+    if batch:
+        Shipment.objects.bulk_update(batch, fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipments', '0004_saved_searches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shipment',
+            name='arrival_window_days',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Длина окна прибытия (дней)'),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='arrival_window_end',
+            field=models.DateField(editable=False, null=True, verbose_name='Конец окна прибытия'),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='departure_window_days',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Длина окна отправления (дней)'),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='departure_window_end',
+            field=models.DateField(editable=False, null=True, verbose_name='Конец окна отправления'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['departure_date', 'departure_window_end'], name='shipment_departure_window_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['arrival_date', 'arrival_window_end'], name='shipment_arrival_window_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['departure_window_days'], name='shipment_departure_days_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['arrival_window_days'], name='shipment_arrival_days_idx'),
+        ),
+        migrations.RunPython(fill_windows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipments', '0005_date_windows'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shipment',
+            name='chargeable_weight',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=12, null=True, verbose_name='Оплачиваемый вес (кг)'),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='volume',
+            field=models.DecimalField(decimal_places=3, editable=False, max_digits=14, null=True, verbose_name='Объем (м³)'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['volume'], name='shipment_volume_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['chargeable_weight'], name='shipment_chargeable_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['status', 'volume'], name='shipment_status_volume_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['status', 'chargeable_weight'], name='shipment_status_chargeable_idx'),
+        ),
+    ]
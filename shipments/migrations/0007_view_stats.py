@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipments', '0006_cargo_metrics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShipmentViewStats',
+            fields=[
+                ('shipment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='view_stats', serialize=False, to='shipments.shipment', verbose_name='Заявка')),
+                ('sketch', models.BinaryField(default=bytes, verbose_name='Скетч HyperLogLog')),
+                ('unique_viewers', models.PositiveIntegerField(default=0, verbose_name='Уникальных зрителей (оценка)')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Статистика просмотров',
+                'verbose_name_plural': 'Статистика просмотров',
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipments', '0007_view_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['status', 'departure_window_end'], name='shipment_status_deadline_idx'),
+        ),
+    ]
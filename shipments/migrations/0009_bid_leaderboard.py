@@ -0,0 +1,89 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:13
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def fill_bid_stats(apps, schema_editor):
+    from core.currency import to_usd, get_rates, CENT
+
+    Shipment = apps.get_model('shipments', 'Shipment')
+    Bid = apps.get_model('bids', 'Bid')
+    rates = get_rates()
+
+    stats = defaultdict(lambda: {'bid_count': 0, 'pending_bid_count': 0, 'best_usd': None})
+    rows = Bid.objects.values('shipment_id', 'status', 'currency').annotate(
+        total=models.Count('id'), best=models.Min('price')
+    )
+    for row in rows:
+        item = stats[row['shipment_id']]
+        item['bid_count'] += row['total']
+        if row['status'] == 'pending':
+            item['pending_bid_count'] += row['total']
+        if row['status'] in ('pending', 'accepted'):
+            best_usd = to_usd(row['best'], row['currency'])
+            if item['best_usd'] is None or best_usd < item['best_usd']:
+                item['best_usd'] = best_usd
+
+    shipments = list(Shipment.objects.filter(id__in=list(stats)).only('id', 'currency'))
+    for shipment in shipments:
+        item = stats[shipment.id]
+        shipment.bid_count = item['bid_count']
+        shipment.pending_bid_count = item['pending_bid_count']
+        if item['best_usd'] is not None:
+            shipment.best_bid_price = (item['best_usd'] / rates[shipment.currency]).quantize(CENT)
+    Shipment.objects.bulk_update(
+        shipments, ['bid_count', 'pending_bid_count', 'best_bid_price'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipments', '0008_deadline_index'),
+        ('bids', '0004_deadline_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shipment',
+            name='best_bid_price',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=12, null=True, verbose_name='Лучшее предложение (в валюте заявки)'),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='bid_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Предложений'),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='pending_bid_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Ожидающих предложений'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['bid_count'], name='shipment_bid_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['status', 'bid_count'], name='shipment_status_bid_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['pending_bid_count'], name='shipment_pending_bids_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['status', 'pending_bid_count'], name='shipment_status_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['best_bid_price'], name='shipment_best_bid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['status', 'best_bid_price'], name='shipment_status_best_bid_idx'),
+        ),
+        migrations.RunPython(fill_bid_stats, migrations.RunPython.noop),
+    ]
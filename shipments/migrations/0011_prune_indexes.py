@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:55
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipments', '0010_updated_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='shipment',
+            name='shipment_volume_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='shipment',
+            name='shipment_chargeable_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='shipment',
+            name='shipment_bid_count_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='shipment',
+            name='shipment_pending_bids_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='shipment',
+            name='shipment_best_bid_idx',
+        ),
+    ]
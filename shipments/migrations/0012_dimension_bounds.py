@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:14
+
+from decimal import Decimal
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipments', '0011_prune_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='shipment',
+            name='height',
+            field=models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MaxValueValidator(Decimal('10000'))], verbose_name='Высота (см)'),
+        ),
+        migrations.AlterField(
+            model_name='shipment',
+            name='length',
+            field=models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MaxValueValidator(Decimal('10000'))], verbose_name='Длина (см)'),
+        ),
+        migrations.AlterField(
+            model_name='shipment',
+            name='width',
+            field=models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MaxValueValidator(Decimal('10000'))], verbose_name='Ширина (см)'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:28
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipments', '0012_dimension_bounds'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='shipment',
+            name='shipment_status_best_bid_idx',
+        ),
+    ]
@@ -1,8 +1,73 @@
 # shipments/models.py - исправленная версия
 
+from django.core.validators import MaxValueValidator
 from django.db import models
 from django.conf import settings
 
+from .cargo import MAX_DIMENSION_CM
+
+
+class Location(models.Model):
+    """Нормализованный справочник городов (маршрутные точки заявок)"""
+    city = models.CharField('Город', max_length=100)
+    country = models.CharField('Страна', max_length=100, blank=True)
+    # Ключи после нормализации и транслитерации (см. shipments/locations.py)
+    city_key = models.CharField('Ключ города', max_length=100, db_index=True)
+    country_key = models.CharField('Ключ страны', max_length=100, blank=True)
+
+    class Meta:
+        verbose_name = 'Населенный пункт'
+        verbose_name_plural = 'Населенные пункты'
+        ordering = ['city']
+        constraints = [
+            models.UniqueConstraint(fields=['city_key', 'country_key'], name='unique_location_key')
+        ]
+
+    def __str__(self):
+        if self.country:
+            return f'{self.city}, {self.country}'
+        return self.city
+
+    def save(self, *args, **kwargs):
+        from .locations import canonical_city_key, canonical_country_key
+
+        self.city_key = canonical_city_key(self.city)
+        self.country_key = canonical_country_key(self.country)
+        super().save(*args, **kwargs)
+
+
+class LocationAlias(models.Model):
+    """Альтернативное написание города: "Moscow", "Москва", "Moskau"..."""
+    location = models.ForeignKey(
+        Location,
+        on_delete=models.CASCADE,
+        related_name='aliases',
+        verbose_name='Населенный пункт'
+    )
+    name = models.CharField('Написание', max_length=100)
+    key = models.CharField('Ключ', max_length=100, db_index=True)
+
+    class Meta:
+        verbose_name = 'Синоним населенного пункта'
+        verbose_name_plural = 'Синонимы населенных пунктов'
+        constraints = [
+            models.UniqueConstraint(fields=['location', 'key'], name='unique_location_alias')
+        ]
+
+    def __str__(self):
+        return f'{self.name} → {self.location}'
+
+    def save(self, *args, **kwargs):
+        from .locations import canonical_city_key
+
+        self.key = canonical_city_key(self.name)
+        super().save(*args, **kwargs)
+
+
+# Счетчики в строке заявки: просмотры (shipments/view_counter.py) и сводка
+# по предложениям (bids/leaderboard.py). Пишутся только через F() и UPDATE.
+COUNTER_FIELDS = ('views', 'bid_count', 'pending_bid_count', 'best_bid_price')
+
 
 class Shipment(models.Model):
     STATUS_CHOICES = [
@@ -83,17 +148,20 @@ class Shipment(models.Model):
     length = models.DecimalField(
         'Длина (см)',
         max_digits=10,
-        decimal_places=2
+        decimal_places=2,
+        validators=[MaxValueValidator(MAX_DIMENSION_CM)]
     )
     width = models.DecimalField(
         'Ширина (см)',
         max_digits=10,
-        decimal_places=2
+        decimal_places=2,
+        validators=[MaxValueValidator(MAX_DIMENSION_CM)]
     )
     height = models.DecimalField(
         'Высота (см)',
         max_digits=10,
-        decimal_places=2
+        decimal_places=2,
+        validators=[MaxValueValidator(MAX_DIMENSION_CM)]
     )
     packaging = models.CharField(
         'Упаковка',
@@ -102,18 +170,50 @@ class Shipment(models.Model):
         blank=True
     )
     is_hazardous = models.BooleanField('Опасный груз', default=False)
+    # Производные величины, хранятся для фильтров и сортировки в SQL
+    # (shipments/cargo.py), заполняются в save()
+    volume = models.DecimalField('Объем (м³)', max_digits=14, decimal_places=3, null=True, editable=False)
+    chargeable_weight = models.DecimalField(
+        'Оплачиваемый вес (кг)',
+        max_digits=12,
+        decimal_places=2,
+        null=True,
+        editable=False
+    )
 
     # Маршрут
     departure_city = models.CharField('Город отправления', max_length=100)
     departure_country = models.CharField('Страна отправления', max_length=100)
     arrival_city = models.CharField('Город назначения', max_length=100)
     arrival_country = models.CharField('Страна назначения', max_length=100)
+    departure_location = models.ForeignKey(
+        Location,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='departing_shipments',
+        verbose_name='Пункт отправления'
+    )
+    arrival_location = models.ForeignKey(
+        Location,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='arriving_shipments',
+        verbose_name='Пункт назначения'
+    )
 
     # Даты
     departure_date = models.DateField('Желаемая дата отправления')
     latest_departure_date = models.DateField('Крайняя дата отправления', blank=True, null=True)
     arrival_date = models.DateField('Желаемая дата прибытия')
     latest_arrival_date = models.DateField('Крайняя дата прибытия', blank=True, null=True)
+    # Конец окна (крайняя дата или желаемая) и его длина - для фильтра по
+    # пересечению окон (shipments/windows.py), заполняются в save()
+    departure_window_end = models.DateField('Конец окна отправления', null=True, editable=False)
+    departure_window_days = models.PositiveIntegerField('Длина окна отправления (дней)', default=0, editable=False)
+    arrival_window_end = models.DateField('Конец окна прибытия', null=True, editable=False)
+    arrival_window_days = models.PositiveIntegerField('Длина окна прибытия (дней)', default=0, editable=False)
 
     # Финансы
     estimated_price = models.DecimalField(
@@ -143,6 +243,16 @@ class Shipment(models.Model):
 
     # Статистика
     views = models.PositiveIntegerField('Просмотры', default=0)
+    # Сводка по предложениям, поддерживается bids/leaderboard.py
+    bid_count = models.PositiveIntegerField('Предложений', default=0, editable=False)
+    pending_bid_count = models.PositiveIntegerField('Ожидающих предложений', default=0, editable=False)
+    best_bid_price = models.DecimalField(
+        'Лучшее предложение (в валюте заявки)',
+        max_digits=12,
+        decimal_places=2,
+        null=True,
+        editable=False
+    )
     created_at = models.DateTimeField('Дата создания', auto_now_add=True)
     updated_at = models.DateTimeField('Дата обновления', auto_now=True)
 
@@ -160,14 +270,180 @@ class Shipment(models.Model):
         verbose_name = 'Заявка на перевозку'
         verbose_name_plural = 'Заявки на перевозку'
         ordering = ['-created_at']
+        # Индексы подобраны под реальные запросы (см. shipments/tests.py):
+        # shipment_list фильтрует по status/cargo_type и сортирует по -created_at,
+        # анонимы видят только status='active', дашборд и меню - заявки владельца,
+        # фильтр по маршруту - по нормализованным пунктам отправления/назначения.
+        # Для каждого индекса есть тест на план запроса; индекс без такого
+        # теста только замедляет запись.
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='shipment_recent_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='shipment_status_recent_idx'),
+            models.Index(fields=['status', 'cargo_type', '-created_at', '-id'], name='shipment_status_cargo_idx'),
+            models.Index(fields=['cargo_type', '-created_at', '-id'], name='shipment_cargo_recent_idx'),
+            models.Index(fields=['owner', '-created_at', '-id'], name='shipment_owner_recent_idx'),
+            models.Index(fields=['departure_location', 'arrival_location', '-created_at', '-id'],
+                         name='shipment_lane_recent_idx'),
+            models.Index(fields=['arrival_location', '-created_at', '-id'], name='shipment_arrival_recent_idx'),
+            models.Index(fields=['departure_date', 'departure_window_end'], name='shipment_departure_window_idx'),
+            models.Index(fields=['arrival_date', 'arrival_window_end'], name='shipment_arrival_window_idx'),
+            models.Index(fields=['departure_window_days'], name='shipment_departure_days_idx'),
+            models.Index(fields=['arrival_window_days'], name='shipment_arrival_days_idx'),
+            # Сортировки списка (анонимы всегда фильтруют по status='active')
+            models.Index(fields=['status', 'volume'], name='shipment_status_volume_idx'),
+            models.Index(fields=['status', 'chargeable_weight'], name='shipment_status_chargeable_idx'),
+            models.Index(fields=['status', 'bid_count'], name='shipment_status_bid_count_idx'),
+            models.Index(fields=['status', 'pending_bid_count'], name='shipment_status_pending_idx'),
+            # Поиск просроченных активных заявок (bids/lifecycle.py)
+            models.Index(fields=['status', 'departure_window_end'], name='shipment_status_deadline_idx'),
+            # Инкрементальная выгрузка в хранилище отчетов (analytics/etl.py)
+            models.Index(fields=['updated_at', 'id'], name='shipment_updated_idx'),
+        ]
 
     def __str__(self):
         return f'{self.title} (#{self.id})'
 
-    @property
-    def volume(self):
-        """Рассчитать объем груза в м³"""
-        if all([self.length, self.width, self.height]):
-            # Переводим из см³ в м³
-            return (self.length * self.width * self.height) / 1000000
-        return 0
\ No newline at end of file
+    def save(self, *args, **kwargs):
+        """Сохранить заявку с вычисляемыми полями.
+
+        Полное сохранение существующей заявки не пишет счетчики
+        COUNTER_FIELDS: их меняют только атомарные UPDATE, и значения
+        из загруженного раньше экземпляра затерли бы чужие изменения.
+        """
+        from .cargo import cargo_fields
+        from .windows import window_fields
+
+        computed = {**window_fields(self), **cargo_fields(self)}
+        for field, value in computed.items():
+            setattr(self, field, value)
+        if kwargs.get('update_fields') is None and not self._state.adding and not kwargs.get('force_insert'):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in COUNTER_FIELDS and field.attname not in deferred
+            ]
+        elif kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], *computed}
+        super().save(*args, **kwargs)
+
+
+class ShipmentViewStats(models.Model):
+    """Уникальные просмотры заявки: скетч HyperLogLog и его оценка.
+
+    Обновляется пачками из буфера shipments/view_counter.py, а не на
+    каждый просмотр.
+    """
+    shipment = models.OneToOneField(
+        Shipment,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='view_stats',
+        verbose_name='Заявка'
+    )
+    sketch = models.BinaryField('Скетч HyperLogLog', default=bytes)
+    unique_viewers = models.PositiveIntegerField('Уникальных зрителей (оценка)', default=0)
+    updated_at = models.DateTimeField('Дата обновления', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Статистика просмотров'
+        verbose_name_plural = 'Статистика просмотров'
+
+    def __str__(self):
+        return f'{self.shipment_id}: ~{self.unique_viewers}'
+
+
+class SavedSearch(models.Model):
+    """Сохраненный поиск агента: новые подходящие заявки попадают во входящие"""
+    agent = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='saved_searches',
+        verbose_name='Агент'
+    )
+    name = models.CharField('Название', max_length=100)
+
+    # Пустое условие означает "любое значение"
+    departure_location = models.ForeignKey(
+        Location,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Пункт отправления'
+    )
+    arrival_location = models.ForeignKey(
+        Location,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Пункт назначения'
+    )
+    cargo_type = models.CharField(
+        'Тип груза',
+        max_length=20,
+        choices=Shipment.CARGO_TYPE_CHOICES,
+        blank=True
+    )
+    currency = models.CharField(
+        'Валюта',
+        max_length=3,
+        choices=[('USD', 'USD'), ('EUR', 'EUR'), ('RUB', 'RUB')],
+        blank=True
+    )
+    min_weight = models.DecimalField('Вес от (кг)', max_digits=10, decimal_places=2, null=True, blank=True)
+    max_weight = models.DecimalField('Вес до (кг)', max_digits=10, decimal_places=2, null=True, blank=True)
+    min_volume = models.DecimalField('Объем от (м³)', max_digits=10, decimal_places=2, null=True, blank=True)
+    max_volume = models.DecimalField('Объем до (м³)', max_digits=10, decimal_places=2, null=True, blank=True)
+    date_from = models.DateField('Отправление с', null=True, blank=True)
+    date_to = models.DateField('Отправление по', null=True, blank=True)
+
+    is_active = models.BooleanField('Активен', default=True)
+    created_at = models.DateTimeField('Дата создания', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Сохраненный поиск'
+        verbose_name_plural = 'Сохраненные поиски'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f'{self.name} ({self.agent.username})'
+
+
+class SavedSearchMatch(models.Model):
+    """Заявка во входящих агента, подошедшая под его сохраненный поиск"""
+    saved_search = models.ForeignKey(
+        SavedSearch,
+        on_delete=models.CASCADE,
+        related_name='matches',
+        verbose_name='Сохраненный поиск'
+    )
+    agent = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='search_matches',
+        verbose_name='Агент'
+    )
+    shipment = models.ForeignKey(
+        Shipment,
+        on_delete=models.CASCADE,
+        related_name='search_matches',
+        verbose_name='Заявка'
+    )
+    is_read = models.BooleanField('Просмотрено', default=False)
+    created_at = models.DateTimeField('Дата', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Совпадение сохраненного поиска'
+        verbose_name_plural = 'Совпадения сохраненных поисков'
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['saved_search', 'shipment'], name='unique_saved_search_match')
+        ]
+        indexes = [
+            models.Index(fields=['agent', 'is_read', '-created_at', '-id'], name='search_match_inbox_idx'),
+            models.Index(fields=['agent', '-created_at', '-id'], name='search_match_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.shipment} → {self.agent.username}'
@@ -0,0 +1,243 @@
+# shipments/page_cache.py - кэш страниц списка заявок для анонимов
+
+import hashlib
+import inspect
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpRequest, HttpResponse, QueryDict
+from django.urls import reverse
+
+from core.conditional import has_pending_messages
+from .cache import get_generation
+
+DEFAULTS = {
+    # Сколько хранится запись (устаревшие записи отдаются, пока идет пересчет)
+    'TIMEOUT': 60 * 60,
+    # Сколько ждать чужого пересчета при полном промахе, секунд
+    'WAIT': 2.0,
+    # Прогрев: сколько популярных наборов фильтров и страниц в каждом
+    'WARM_FILTERS': 10,
+    'WARM_PAGES': 3,
+    'WARM_ON_STARTUP': False,
+    # Сколько наборов фильтров помнит счетчик популярности процесса
+    'POPULAR_LIMIT': 500,
+}
+
+POPULAR_KEY = 'shipments:page:popular'
+POPULAR_SAVE_EVERY = 100
+
+# Страница набора фильтров - не отдельный набор: в счетчик популярности не входит
+PAGINATION_PARAMS = ('cursor', 'page')
+
+_popular = Counter()
+_popular_lock = threading.Lock()
+_hits_since_save = 0
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'SHIPMENT_LIST_CACHE', {})}
+
+
+def normalize_query(query_dict):
+    """Нормализованная строка запроса: без пустых параметров, по алфавиту"""
+    items = sorted(
+        (key, value)
+        for key, values in query_dict.lists()
+        for value in values
+        if value != ''
+    )
+    normalized = QueryDict(mutable=True)
+    for key, value in items:
+        normalized.appendlist(key, value)
+    return normalized.urlencode()
+
+
+def page_cache_key(query):
+    # Поколение в ключ не входит: запись старого поколения нужна,
+    # чтобы отдавать ее, пока один из запросов пересчитывает страницу.
+    return 'shipments:page:' + hashlib.sha1(query.encode()).hexdigest()
+
+
+def filters_query(query_dict):
+    """Нормализованный набор фильтров без параметров пагинации"""
+    params = query_dict.copy()
+    for param in PAGINATION_PARAMS:
+        params.pop(param, None)
+    return normalize_query(params)
+
+
+def _record_hit(query_dict):
+    global _hits_since_save
+    limit = get_config()['POPULAR_LIMIT']
+    with _popular_lock:
+        _popular[filters_query(query_dict)] += 1
+        # Разовые наборы (обходы роботов) не копятся: при двойном
+        # превышении лимита остаются только самые частые
+        if len(_popular) > 2 * limit:
+            kept = _popular.most_common(limit)
+            _popular.clear()
+            _popular.update(dict(kept))
+        _hits_since_save += 1
+        if _hits_since_save < POPULAR_SAVE_EVERY:
+            return
+        _hits_since_save = 0
+        snapshot = dict(_popular.most_common(50))
+    cache.set(POPULAR_KEY, snapshot, timeout=None)
+
+
+def popular_queries(limit):
+    """Самые частые наборы фильтров (из кэша, чтобы переживать рестарт процесса)"""
+    with _popular_lock:
+        counts = Counter(cache.get(POPULAR_KEY) or {})
+        counts.update(_popular)
+    queries = [query for query, _ in counts.most_common(limit)]
+    if '' not in queries:
+        queries = [''] + queries[:limit - 1]
+    return queries
+
+
+def _cached_response(entry, state):
+    response = HttpResponse(entry['content'], content_type=entry['content_type'])
+    response['X-Cache'] = state
+    return response
+
+
+def _render(view, request, *args, **kwargs):
+    response = view(request, *args, **kwargs)
+    if hasattr(response, 'render') and not response.is_rendered:
+        response.render()
+    return response
+
+
+def _store(key, generation, response, timeout):
+    if response.status_code != 200:
+        return
+    cache.set(key, {
+        'generation': generation,
+        'content': response.content,
+        'content_type': response['Content-Type'],
+    }, timeout)
+
+
+def _wait_for_entry(key, wait):
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def anonymous_page_cache(view):
+    """Кэш страниц для анонимных пользователей со stale-while-revalidate.
+
+    Ключ - нормализованные GET-параметры. Запись помечается поколением
+    заявок (shipments.cache): если поколение устарело, страницу
+    пересчитывает только тот запрос, который взял блокировку, остальные
+    получают устаревшую копию. При полном промахе остальные недолго ждут
+    результата вместо того, чтобы всем сразу идти в БД.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'GET' or request.user.is_authenticated or has_pending_messages(request):
+            return view(request, *args, **kwargs)
+
+        config = get_config()
+        query = normalize_query(request.GET)
+        _record_hit(request.GET)
+
+        key = page_cache_key(query)
+        lock_key = f'{key}:lock'
+        generation = get_generation()
+
+        entry = cache.get(key)
+        if entry is not None and entry['generation'] == generation:
+            return _cached_response(entry, 'HIT')
+
+        if not cache.add(lock_key, 1, timeout=30):
+            # Страницу уже пересчитывает другой запрос
+            if entry is not None:
+                return _cached_response(entry, 'STALE')
+            entry = _wait_for_entry(key, config['WAIT'])
+            if entry is not None:
+                return _cached_response(entry, 'HIT')
+            return view(request, *args, **kwargs)
+
+        try:
+            response = _render(view, request, *args, **kwargs)
+            _store(key, generation, response, config['TIMEOUT'])
+        finally:
+            cache.delete(lock_key)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    return wrapper
+
+
+def _warm_request(path, params):
+    """Минимальный GET-запрос анонима для отрисовки страницы без HTTP"""
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = path
+    request.GET = params.copy()
+    request.META = {'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'QUERY_STRING': params.urlencode()}
+    request.user = AnonymousUser()
+    return request
+
+
+def warm_page_cache(filters=None, pages=None):
+    """Прогреть первые страницы самых популярных наборов фильтров.
+
+    Возвращает число закэшированных страниц.
+    """
+    from .views import shipment_list
+
+    config = get_config()
+    filters = config['WARM_FILTERS'] if filters is None else filters
+    pages = config['WARM_PAGES'] if pages is None else pages
+
+    path = reverse('shipment_list')
+    warmed = 0
+    for query in popular_queries(filters):
+        params = QueryDict(query, mutable=True)
+        params.pop('cursor', None)
+        params.pop('page', None)
+        for _ in range(pages):
+            request = _warm_request(path, params)
+            generation = get_generation()
+            # Исходная view без декораторов кэша и условных запросов
+            response = _render(inspect.unwrap(shipment_list), request)
+            _store(page_cache_key(normalize_query(params)), generation, response, config['TIMEOUT'])
+            warmed += 1
+
+            page_obj = response.context_data['page_obj']
+            if not page_obj.has_next():
+                break
+            if getattr(page_obj, 'is_cursor_page', False):
+                params['cursor'] = page_obj.next_cursor
+            else:
+                params['page'] = page_obj.next_page_number()
+    return warmed
+
+
+def warm_on_startup():
+    """Прогрев в фоновом потоке при старте процесса (SHIPMENT_LIST_CACHE['WARM_ON_STARTUP'])"""
+    if not get_config()['WARM_ON_STARTUP']:
+        return
+
+    def run():
+        from django.db import connection
+
+        try:
+            warm_page_cache()
+        finally:
+            connection.close()
+
+    threading.Thread(target=run, name='shipment-list-warmup', daemon=True).start()
@@ -0,0 +1,285 @@
+# shipments/percolator.py - сопоставление новых заявок с сохраненными поисками агентов
+
+import bisect
+import threading
+from collections import namedtuple
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+
+from core import versions
+
+SearchSpec = namedtuple('SearchSpec', [
+    'id', 'agent_id',
+    'departure_location_id', 'arrival_location_id', 'cargo_type', 'currency',
+    'min_weight', 'max_weight', 'min_volume', 'max_volume',
+    'date_from', 'date_to',
+])
+
+# Дискретные поля: значение None у поиска означает "любое"
+DISCRETE_FIELDS = ('departure_location_id', 'arrival_location_id', 'cargo_type', 'currency')
+
+# Диапазоны: (нижняя граница, верхняя граница, значение заявки)
+RANGE_FIELDS = (
+    ('min_weight', 'max_weight', 'weight'),
+    ('min_volume', 'max_volume', 'volume'),
+)
+
+NEG_INF = Decimal('-Infinity')
+POS_INF = Decimal('Infinity')
+
+
+class _RangeIndex:
+    """Отсортированные нижние и верхние границы диапазонов поисков.
+
+    Поиски, у которых lower <= x, - префикс списка нижних границ,
+    у которых upper >= x - суффикс списка верхних. Оба находятся bisect.
+    """
+
+    def __init__(self):
+        self.lowers = []   # [(граница, id)]
+        self.uppers = []
+
+    def add(self, search_id, lower, upper):
+        bisect.insort(self.lowers, (lower, search_id))
+        bisect.insort(self.uppers, (upper, search_id))
+
+    def extend(self, items):
+        """Массовая загрузка [(id, lower, upper)] - одна сортировка вместо вставок"""
+        for search_id, lower, upper in items:
+            self.lowers.append((lower, search_id))
+            self.uppers.append((upper, search_id))
+        self.lowers.sort()
+        self.uppers.sort()
+
+    def remove(self, search_id, lower, upper):
+        for items, key in ((self.lowers, (lower, search_id)), (self.uppers, (upper, search_id))):
+            position = bisect.bisect_left(items, key)
+            if position < len(items) and items[position] == key:
+                items.pop(position)
+
+    def matching_count(self, low_value, high_value):
+        """Размер меньшей из двух частей, которые придется пересечь"""
+        lower_ok = bisect.bisect_right(self.lowers, (high_value, POS_INF))
+        upper_ok = len(self.uppers) - bisect.bisect_left(self.uppers, (low_value, NEG_INF))
+        return min(lower_ok, upper_ok)
+
+    def matching(self, low_value, high_value):
+        """id поисков с lower <= high_value и upper >= low_value"""
+        lower_ok = self.lowers[:bisect.bisect_right(self.lowers, (high_value, POS_INF))]
+        upper_ok = self.uppers[bisect.bisect_left(self.uppers, (low_value, NEG_INF)):]
+        if len(lower_ok) < len(upper_ok):
+            ids = {search_id for _, search_id in lower_ok}
+            return ids.intersection(search_id for _, search_id in upper_ok)
+        ids = {search_id for _, search_id in upper_ok}
+        return ids.intersection(search_id for _, search_id in lower_ok)
+
+
+class Percolator:
+    """Обратный индекс сохраненных поисков.
+
+    Для каждой заявки кандидаты получаются пересечением списков по
+    дискретным полям (значение заявки + поиски без этого условия),
+    диапазоны веса/объема/дат проверяются по отсортированным границам
+    или напрямую, если кандидатов уже мало. Полный перебор поисков
+    не выполняется.
+    """
+
+    def __init__(self):
+        self.specs = {}
+        self.postings = {field: {} for field in DISCRETE_FIELDS}
+        # Диапазоны веса, объема и окна дат; у поиска - кортеж границ в том же порядке
+        self.ranges = [_RangeIndex() for _ in range(len(RANGE_FIELDS) + 1)]
+        self.bounds = {}
+
+    def __len__(self):
+        return len(self.specs)
+
+    @staticmethod
+    def _bounds(spec):
+        bounds = [(_lower(getattr(spec, lower)), _upper(getattr(spec, upper))) for lower, upper, _ in RANGE_FIELDS]
+        bounds.append((spec.date_from or date.min, spec.date_to or date.max))
+        return tuple(bounds)
+
+    def add(self, spec):
+        if spec.id in self.specs:
+            self.remove(spec.id)
+        self.specs[spec.id] = spec
+        for field in DISCRETE_FIELDS:
+            self.postings[field].setdefault(getattr(spec, field), set()).add(spec.id)
+        self.bounds[spec.id] = bounds = self._bounds(spec)
+        for index, (lower, upper) in zip(self.ranges, bounds):
+            index.add(spec.id, lower, upper)
+
+    def extend(self, specs):
+        """Массовая загрузка при построении индекса"""
+        items = [[] for _ in self.ranges]
+        for spec in specs:
+            if spec.id in self.specs:
+                self.remove(spec.id)
+            self.specs[spec.id] = spec
+            for field in DISCRETE_FIELDS:
+                self.postings[field].setdefault(getattr(spec, field), set()).add(spec.id)
+            self.bounds[spec.id] = bounds = self._bounds(spec)
+            for dimension, (lower, upper) in zip(items, bounds):
+                dimension.append((spec.id, lower, upper))
+        for index, dimension in zip(self.ranges, items):
+            index.extend(dimension)
+
+    def remove(self, search_id):
+        spec = self.specs.pop(search_id, None)
+        if spec is None:
+            return
+        for field in DISCRETE_FIELDS:
+            self.postings[field].get(getattr(spec, field), set()).discard(search_id)
+        for index, (lower, upper) in zip(self.ranges, self.bounds.pop(search_id)):
+            index.remove(search_id, lower, upper)
+
+    def match(self, shipment):
+        """Поиски, которым соответствует заявка (объект с полями Shipment)"""
+        groups = []
+        for field in DISCRETE_FIELDS:
+            postings = self.postings[field]
+            value = getattr(shipment, field)
+            exact = postings.get(value, set()) if value is not None else set()
+            wildcard = postings.get(None, set())
+            groups.append((len(exact) + len(wildcard), exact, wildcard))
+        # Объединяем только самую узкую группу, остальные лишь проверяем
+        # на вхождение: списки "любое значение" бывают очень длинными.
+        groups.sort(key=lambda group: group[0])
+        _, exact, wildcard = groups[0]
+        candidates = exact | wildcard
+        for _, exact, wildcard in groups[1:]:
+            if not candidates:
+                return candidates
+            candidates = {
+                search_id for search_id in candidates
+                if search_id in exact or search_id in wildcard
+            }
+
+        # Значения заявки как отрезки: вес и объем - точки, даты - окно отправления
+        intervals = [(Decimal(getattr(shipment, attribute)),) * 2 for _, _, attribute in RANGE_FIELDS]
+        intervals.append((shipment.departure_date, shipment.latest_departure_date or shipment.departure_date))
+
+        for position, (index, (low, high)) in enumerate(zip(self.ranges, intervals)):
+            if not candidates:
+                break
+            if index.matching_count(low, high) < len(candidates):
+                candidates &= index.matching(low, high)
+            else:
+                # Кандидатов мало - дешевле проверить их границы напрямую
+                bounds = self.bounds
+                candidates = {
+                    search_id for search_id in candidates
+                    if bounds[search_id][position][0] <= high and bounds[search_id][position][1] >= low
+                }
+        return candidates
+
+
+def _lower(value):
+    return NEG_INF if value is None else Decimal(value)
+
+
+def _upper(value):
+    return POS_INF if value is None else Decimal(value)
+
+
+def spec_from_search(search):
+    return SearchSpec(
+        id=search.id,
+        agent_id=search.agent_id,
+        departure_location_id=search.departure_location_id,
+        arrival_location_id=search.arrival_location_id,
+        cargo_type=search.cargo_type or None,
+        currency=search.currency or None,
+        min_weight=search.min_weight,
+        max_weight=search.max_weight,
+        min_volume=search.min_volume,
+        max_volume=search.max_volume,
+        date_from=search.date_from,
+        date_to=search.date_to,
+    )
+
+
+_percolator = None
+_percolator_version = None      # версия поисков в БД, по которой построен индекс
+_percolator_lock = threading.Lock()
+
+
+def get_percolator():
+    """Индекс поисков процесса.
+
+    Перестраивается, если версия сохраненных поисков в БД (core.versions)
+    ушла вперед - например, поиск сохранили в другом процессе. Проверка -
+    один запрос по первичному ключу.
+    """
+    global _percolator, _percolator_version
+    version = versions.get(versions.SAVED_SEARCHES)
+    with _percolator_lock:
+        if _percolator is None or _percolator_version != version:
+            from .models import SavedSearch
+
+            percolator = Percolator()
+            percolator.extend(
+                spec_from_search(search)
+                for search in SavedSearch.objects.filter(is_active=True).iterator(chunk_size=2000)
+            )
+            _percolator, _percolator_version = percolator, version
+        return _percolator
+
+
+def invalidate_percolator():
+    global _percolator, _percolator_version
+    _percolator, _percolator_version = None, None
+
+
+def _patch(versions_pair, change):
+    # Изменение этого процесса применяется к индексу, только если индекс
+    # построен по прежней версии. Иначе он отстал от чужих изменений,
+    # и get_percolator перестроит его целиком.
+    global _percolator_version
+    previous, version = versions_pair
+    with _percolator_lock:
+        if _percolator is not None and _percolator_version == previous:
+            change(_percolator)
+            _percolator_version = version
+
+
+def search_saved(search):
+    """Новая версия поисков в транзакции сохранения, обновление индекса - после коммита"""
+    version = versions.bump(versions.SAVED_SEARCHES, read=True)
+
+    def change(percolator):
+        if search.is_active:
+            percolator.add(spec_from_search(search))
+        else:
+            percolator.remove(search.id)
+
+    transaction.on_commit(lambda: _patch(version, change))
+
+
+def search_deleted(search_id):
+    version = versions.bump(versions.SAVED_SEARCHES, read=True)
+    transaction.on_commit(lambda: _patch(version, lambda percolator: percolator.remove(search_id)))
+
+
+def percolate(shipment):
+    """Разложить заявку по входящим агентов, чьи поиски ей соответствуют.
+
+    Возвращает число новых совпадений.
+    """
+    from .models import SavedSearchMatch
+
+    percolator = get_percolator()
+    with _percolator_lock:
+        search_ids = percolator.match(shipment)
+        specs = [percolator.specs[search_id] for search_id in search_ids]
+
+    matches = [
+        SavedSearchMatch(saved_search_id=spec.id, agent_id=spec.agent_id, shipment_id=shipment.id)
+        for spec in specs
+        if spec.agent_id != shipment.owner_id
+    ]
+    SavedSearchMatch.objects.bulk_create(matches, batch_size=1000, ignore_conflicts=True)
+    return len(matches)
@@ -0,0 +1,282 @@
+# shipments/quotes.py - рекомендуемая цена перевозки по истории принятых предложений
+
+import os
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+
+from core.currency import CENT, conversion_factors, get_rates
+
+DEFAULTS = {
+    # Снимок моделей: несколько КБ вместо повторной подгонки по всей истории
+    'SNAPSHOT': settings.BASE_DIR / 'quotes.npz',
+    # Как часто процесс догружает новые принятые предложения, секунд
+    'REFRESH': 300,
+    # Меньше точек - модель уровня не используется, берется более общая
+    'MIN_SAMPLES': 3,
+}
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+# Ключ модели - (пункт отправления, пункт назначения, тип груза). 0 в пунктах
+# и -1 в типе груза - "любой": от маршрута с типом груза к общей модели.
+ANY_LOCATION = 0
+ANY_CARGO = -1
+BASES = ('lane_cargo', 'lane', 'cargo', 'global')
+
+# Колонки накопленных сумм: по ним МНК-решение пересчитывается без исходных точек
+N, SW, SWW, SP, SWP, SPP = range(6)
+
+FETCH_CHUNK = 2000
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'QUOTE_ENGINE', {})}
+
+
+def _cargo_codes():
+    from .models import Shipment
+
+    return {value: code for code, (value, _) in enumerate(Shipment.CARGO_TYPE_CHOICES)}
+
+
+class Quote:
+    def __init__(self, price_usd, spread_usd, samples, basis):
+        self.price_usd = price_usd
+        self.spread_usd = spread_usd
+        self.samples = samples
+        self.basis = basis
+
+
+class QuoteModel:
+    """Линейные модели "цена = a + b * оплачиваемый вес" по уровням ключей.
+
+    Для каждого ключа хранятся суммы n, Σw, Σw², Σp, Σwp, Σp² - этого
+    достаточно для решения МНК и остаточного разброса, поэтому новые
+    предложения добавляются к суммам без повторной подгонки по всей истории.
+    """
+
+    def __init__(self, keys=None, stats=None, watermark=(EPOCH, 0)):
+        keys = np.zeros((0, 3), dtype=np.int64) if keys is None else keys
+        self.stats = np.zeros((0, 6)) if stats is None else stats
+        self.index = {tuple(key): row for row, key in enumerate(keys.tolist())}
+        self.keys = keys
+        self.watermark = watermark
+        self.mtime = None
+        self._solve()
+
+    def __len__(self):
+        return len(self.index)
+
+    def add(self, departure, arrival, cargo, weights, prices):
+        """Добавить точки (колонки NumPy одной длины) ко всем уровням ключей"""
+        if not len(weights):
+            return
+        any_location = np.full_like(departure, ANY_LOCATION)
+        any_cargo = np.full_like(cargo, ANY_CARGO)
+        keys = np.concatenate([
+            np.column_stack([departure, arrival, cargo]),
+            np.column_stack([departure, arrival, any_cargo]),
+            np.column_stack([any_location, any_location, cargo]),
+            np.column_stack([any_location, any_location, any_cargo]),
+        ])
+        lane_known = (departure != ANY_LOCATION) & (arrival != ANY_LOCATION)
+        # Без нормализованного маршрута точка идет только в модели по типу груза и общую
+        mask = np.concatenate([lane_known, lane_known, np.ones_like(lane_known), np.ones_like(lane_known)])
+        keys = keys[mask]
+        weights = np.tile(weights, 4)[mask]
+        prices = np.tile(prices, 4)[mask]
+
+        unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        sums = np.column_stack([
+            np.bincount(inverse, weights=column, minlength=len(unique))
+            for column in (np.ones_like(weights), weights, weights * weights, prices, weights * prices, prices * prices)
+        ])
+
+        rows = []
+        new_keys = []
+        for key in map(tuple, unique.tolist()):
+            row = self.index.get(key)
+            if row is None:
+                row = self.index[key] = len(self.keys) + len(new_keys)
+                new_keys.append(key)
+            rows.append(row)
+        if new_keys:
+            self.keys = np.concatenate([self.keys, np.array(new_keys, dtype=np.int64)])
+            self.stats = np.concatenate([self.stats, np.zeros((len(new_keys), 6))])
+        self.stats[rows] += sums
+        self._solve()
+
+    def _solve(self):
+        """Решение МНК для всех ключей сразу по накопленным суммам"""
+        n, sw, sww, sp, swp, spp = self.stats.T
+        with np.errstate(divide='ignore', invalid='ignore'):
+            denominator = n * sww - sw * sw
+            # Все точки с одним весом - наклона нет, только цена за кг
+            sloped = denominator > 1e-9 * np.maximum(n * sww, 1)
+            slope = np.where(sloped, (n * swp - sw * sp) / denominator, 0.0)
+            intercept = np.where(sloped, (sp - slope * sw) / n, 0.0)
+            slope = np.where(sloped, slope, sp / sw)
+            residual = spp - 2 * intercept * sp - 2 * slope * swp + intercept ** 2 * n \
+                + 2 * intercept * slope * sw + slope ** 2 * sww
+            spread = np.sqrt(np.maximum(residual, 0) / np.maximum(n - 2, 1))
+        self.intercept = np.nan_to_num(intercept)
+        self.slope = np.nan_to_num(slope)
+        self.spread = np.nan_to_num(spread)
+
+    def predict(self, departure, arrival, cargo, weight, min_samples=None):
+        """Quote для груза или None, если ни на одном уровне не хватает данных"""
+        min_samples = min_samples or get_config()['MIN_SAMPLES']
+        candidates = (
+            (departure, arrival, cargo),
+            (departure, arrival, ANY_CARGO),
+            (ANY_LOCATION, ANY_LOCATION, cargo),
+            (ANY_LOCATION, ANY_LOCATION, ANY_CARGO),
+        )
+        for basis, key in zip(BASES, candidates):
+            row = self.index.get(key)
+            if row is None or self.stats[row, N] < min_samples:
+                continue
+            price = self.intercept[row] + self.slope[row] * weight
+            if price <= 0:
+                continue
+            return Quote(price, self.spread[row], int(self.stats[row, N]), basis)
+        return None
+
+    def save(self, path):
+        updated_at, last_id = self.watermark
+        tmp = f'{path}.tmp.npz'
+        np.savez_compressed(
+            tmp, keys=self.keys, stats=self.stats,
+            watermark=np.array([updated_at.isoformat()]), last_id=np.array([last_id]),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            watermark = (datetime.fromisoformat(str(data['watermark'][0])), int(data['last_id'][0]))
+            return cls(data['keys'], data['stats'], watermark)
+
+
+def accepted_since(watermark, last_id):
+    """Принятые предложения после водяного знака (updated_at, id) - по индексу bid_updated_idx"""
+    from bids.models import Bid
+
+    return (
+        Bid.objects.filter(status='accepted', updated_at__gte=watermark)
+        .exclude(updated_at=watermark, id__lte=last_id)
+        .order_by('updated_at', 'id')
+    )
+
+
+def update(model):
+    """Догрузить в модель принятые предложения после ее водяного знака. Возвращает их число"""
+    cargo_codes = _cargo_codes()
+    rates = {}
+    total = 0
+    while True:
+        rows = list(accepted_since(*model.watermark).values_list(
+            'id', 'updated_at', 'price', 'currency',
+            'shipment__departure_location_id', 'shipment__arrival_location_id',
+            'shipment__cargo_type', 'shipment__chargeable_weight',
+        )[:FETCH_CHUNK])
+        if not rows:
+            return total
+        ids, updated, prices, currencies, departure, arrival, cargo, weights = zip(*rows)
+        # Цены в USD по курсу на день принятия
+        factors = []
+        for moment, currency in zip(updated, currencies):
+            day = moment.date()
+            if day not in rates:
+                rates[day] = get_rates(day)
+            factors.append(float(rates[day][currency]))
+        weights = np.array([float(weight or 0) for weight in weights])
+        usable = weights > 0
+        model.add(
+            np.array([value or ANY_LOCATION for value in departure], dtype=np.int64)[usable],
+            np.array([value or ANY_LOCATION for value in arrival], dtype=np.int64)[usable],
+            np.array([cargo_codes.get(value, ANY_CARGO) for value in cargo], dtype=np.int64)[usable],
+            weights[usable],
+            (np.array([float(price) for price in prices]) * np.array(factors))[usable],
+        )
+        model.watermark = (updated[-1], ids[-1])
+        total += len(rows)
+
+
+def fit():
+    """Подогнать модели заново по всей истории принятых предложений"""
+    model = QuoteModel()
+    update(model)
+    return model
+
+
+_model = None
+_checked = 0.0
+_lock = threading.Lock()
+
+
+def _snapshot_mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def get_model():
+    """Модели в памяти процесса.
+
+    Загружаются из снимка (или подгоняются заново, если его нет), перечитываются
+    при обновлении снимка и раз в REFRESH секунд догружают новые принятые
+    предложения - обычно это один пустой запрос по индексу.
+    """
+    global _model, _checked
+    config = get_config()
+    if _model is not None and time.monotonic() - _checked < config['REFRESH']:
+        return _model
+    with _lock:
+        if _model is None or time.monotonic() - _checked >= config['REFRESH']:
+            mtime = _snapshot_mtime(config['SNAPSHOT'])
+            if _model is None or (mtime is not None and mtime != _model.mtime):
+                model = QuoteModel.load(config['SNAPSHOT']) if mtime is not None else QuoteModel()
+                model.mtime = mtime
+            else:
+                model = _model
+            update(model)
+            _model, _checked = model, time.monotonic()
+    return _model
+
+
+def invalidate_model():
+    global _model
+    _model = None
+
+
+def quote(departure_location_id, arrival_location_id, cargo_type, chargeable_weight, currency='USD'):
+    """Рекомендуемая цена в currency: {'price', 'low', 'high', 'samples', 'basis'} или None"""
+    result = get_model().predict(
+        departure_location_id or ANY_LOCATION,
+        arrival_location_id or ANY_LOCATION,
+        _cargo_codes().get(cargo_type, ANY_CARGO),
+        float(chargeable_weight),
+    )
+    if result is None:
+        return None
+    factor = float(conversion_factors(currency)['USD'])
+
+    def amount(usd):
+        return Decimal(usd * factor).quantize(CENT)
+
+    return {
+        'price': amount(result.price_usd),
+        'low': amount(max(result.price_usd - result.spread_usd, 0)),
+        'high': amount(result.price_usd + result.spread_usd),
+        'currency': currency,
+        'samples': result.samples,
+        'basis': result.basis,
+    }
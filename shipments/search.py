@@ -0,0 +1,132 @@
+# shipments/search.py - полнотекстовый поиск по заявкам (SQLite FTS5)
+
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'shipments_shipment_fts'
+
+# Токены пользовательского запроса: буквы/цифры любого алфавита
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_available(using_connection=None):
+    """Можно ли использовать FTS5 на текущей БД"""
+    conn = using_connection or connection
+    return conn.vendor == 'sqlite'
+
+
+def ensure_search_index(using_connection=None):
+    """Создать теневую FTS5-таблицу, если ее еще нет"""
+    conn = using_connection or connection
+    if not fts_available(conn):
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+            f'title, description, route, '
+            f"tokenize = 'unicode61 remove_diacritics 2')"
+        )
+
+
+def _route_text(shipment):
+    return ' '.join([
+        shipment.departure_city, shipment.departure_country,
+        shipment.arrival_city, shipment.arrival_country,
+    ])
+
+
+def _document(shipment):
+    return (shipment.pk, shipment.title, shipment.description or '', _route_text(shipment))
+
+
+def index_shipment(shipment):
+    """Добавить/обновить заявку в поисковом индексе"""
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [shipment.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description, route) VALUES (%s, %s, %s, %s)',
+            _document(shipment)
+        )
+
+
+def remove_shipment(shipment_id):
+    """Удалить заявку из поискового индекса"""
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [shipment_id])
+
+
+def rebuild_search_index(batch_size=1000):
+    """Полностью перестроить индекс пачками. Возвращает число проиндексированных заявок"""
+    from .models import Shipment
+
+    ensure_search_index()
+    total = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+        last_id = 0
+        while True:
+            batch = list(
+                Shipment.objects.filter(id__gt=last_id).order_by('id').only(
+                    'id', 'title', 'description',
+                    'departure_city', 'departure_country', 'arrival_city', 'arrival_country',
+                )[:batch_size]
+            )
+            if not batch:
+                break
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, description, route) VALUES (%s, %s, %s, %s)',
+                [_document(shipment) for shipment in batch]
+            )
+            total += len(batch)
+            last_id = batch[-1].id
+
+    return total
+
+
+def build_match_query(text):
+    """Превратить пользовательский ввод в безопасное FTS5-выражение.
+
+    Каждый токен экранируется кавычками и ищется по префиксу, токены
+    объединяются через AND: "моск"* "берл"*
+    """
+    tokens = TOKEN_RE.findall(text or '')
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def search_shipments(queryset, text):
+    """Отфильтровать queryset по полнотекстовому запросу и отсортировать по релевантности.
+
+    Результат остается обычным QuerySet, поэтому к нему можно применять
+    любые дополнительные фильтры. На БД без FTS5 используется icontains.
+    """
+    match = build_match_query(text)
+    if not match:
+        return queryset
+
+    if not fts_available():
+        return queryset.filter(
+            Q(title__icontains=text) |
+            Q(description__icontains=text) |
+            Q(departure_city__icontains=text) |
+            Q(arrival_city__icontains=text)
+        )
+
+    # Подходящие заявки - список rowid из FTS-индекса, строки заявок
+    # читаются по первичному ключу. Релевантность - подзапрос к индексу
+    # по MATCH и rowid, он выполняется только для найденных строк.
+    table = queryset.model._meta.db_table
+    matching = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+    rank = RawSQL(
+        f'SELECT bm25({FTS_TABLE}) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+        [match],
+        output_field=FloatField(),
+    )
+    return queryset.filter(id__in=matching).annotate(search_rank=rank).order_by('search_rank', '-created_at')
@@ -0,0 +1,95 @@
+# shipments/signals.py
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete, post_init
+from django.dispatch import receiver
+
+from .models import Shipment, Location, LocationAlias, SavedSearch
+from .search import index_shipment, remove_shipment
+from .cache import bump_generation
+from .locations import resolve_location, index_location, dictionary_changed
+from .percolator import percolate, search_saved, search_deleted
+from core import versions
+from users import dashboard
+
+
+@receiver(pre_save, sender=Shipment)
+def assign_locations(sender, instance, raw=False, **kwargs):
+    """Привязать заявку к нормализованным пунктам маршрута"""
+    if raw:
+        return
+    instance.departure_location_id = resolve_location(instance.departure_city, instance.departure_country)
+    instance.arrival_location_id = resolve_location(instance.arrival_city, instance.arrival_country)
+
+
+@receiver(post_save, sender=Shipment)
+def update_search_index(sender, instance, raw=False, **kwargs):
+    """Поддерживать FTS-индекс в актуальном состоянии"""
+    if raw:
+        return
+    index_shipment(instance)
+
+
+@receiver(post_init, sender=Shipment)
+def remember_status(sender, instance, **kwargs):
+    # Статус на момент загрузки - чтобы заметить переход в 'active'
+    instance._loaded_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=Shipment)
+def match_saved_searches(sender, instance, created, raw=False, **kwargs):
+    """Заявка стала активной - разложить ее по входящим агентов"""
+    if raw:
+        return
+    became_active = instance.status == 'active' and (created or instance._loaded_status != 'active')
+    instance._loaded_status = instance.status
+    if became_active:
+        transaction.on_commit(lambda: percolate(instance))
+
+
+@receiver(post_delete, sender=Shipment)
+def drop_from_search_index(sender, instance, **kwargs):
+    remove_shipment(instance.pk)
+
+
+@receiver(post_save, sender=Shipment)
+@receiver(post_delete, sender=Shipment)
+def shipments_changed(sender, **kwargs):
+    """Новое поколение заявок - кэши фасетов и страниц списка устаревают.
+
+    Версия в БД меняется в той же транзакции, что и заявка: по ней
+    проверяют ETag списка все процессы.
+    """
+    versions.bump(versions.SHIPMENTS)
+    bump_generation()
+
+
+@receiver(post_save, sender=Shipment)
+@receiver(post_delete, sender=Shipment)
+def owner_dashboard_changed(sender, instance, **kwargs):
+    dashboard.invalidate(instance.owner_id)
+
+
+@receiver(post_save, sender=Location)
+def location_saved(sender, instance, created, **kwargs):
+    if created:
+        index_location(instance)
+    else:
+        dictionary_changed()
+
+
+@receiver(post_delete, sender=Location)
+@receiver(post_save, sender=LocationAlias)
+@receiver(post_delete, sender=LocationAlias)
+def location_dictionary_changed(sender, **kwargs):
+    dictionary_changed()
+
+
+@receiver(post_save, sender=SavedSearch)
+def saved_search_saved(sender, instance, **kwargs):
+    search_saved(instance)
+
+
+@receiver(post_delete, sender=SavedSearch)
+def saved_search_deleted(sender, instance, **kwargs):
+    search_deleted(instance.pk)
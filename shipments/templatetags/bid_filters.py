@@ -1,8 +1,16 @@
 from django import template
+from django.db.models import QuerySet
 
 register = template.Library()
 
+
 @register.filter
-def filter_status(queryset, status):
-    """Фильтрует QuerySet по статусу предложения"""
-    return queryset.filter(status=status)
\ No newline at end of file
+def filter_status(bids, status):
+    """Фильтрует предложения по статусу.
+
+    Уже загруженный QuerySet или список фильтруется в памяти, без
+    нового запроса к БД на каждый вызов фильтра.
+    """
+    if isinstance(bids, QuerySet) and bids._result_cache is None:
+        return bids.filter(status=status)
+    return [bid for bid in bids if bid.status == status]
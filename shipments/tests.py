@@ -1,3 +1,1075 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import io
+import shutil
+import tempfile
+import threading
+import random
+from decimal import Decimal
+from unittest import mock
+from pathlib import Path
 
-# Create your tests here.
+import numpy
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection
+from django.http import QueryDict
+from django.test import TestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from bids import state_machine
+from bids.models import Bid
+from core.pagination import paginate_by_cursor
+from core.testing import QueryPlanAssertionsMixin
+from .management.commands.benchmark_percolator import brute_force_match, random_shipment, random_spec
+from .models import Location, LocationAlias, Shipment, ShipmentViewStats, SavedSearch, SavedSearchMatch
+from core import events as event_broker
+from core import versions
+from .events import channel_name
+from .facets import FACET_FIELDS, compute_facets, get_facets
+from .locations import (
+    autocomplete, canonical_city_key, canonical_country_key, invalidate_location_index, normalize_name,
+    resolve_location,
+)
+from .percolator import Percolator, get_percolator, invalidate_percolator
+from . import page_cache, quotes
+from .cache import bump_generation
+from .view_counter import discard_views, flush_views, pending_views, record_view
+from users.models import UserProfile
+from .search import FTS_TABLE, search_shipments
+from .windows import WINDOWS, max_window_days, overlapping
+
+
+def make_shipment(owner, **kwargs):
+    data = {
+        'title': 'Оборудование',
+        'owner': owner,
+        'status': 'active',
+        'weight': 100, 'length': 100, 'width': 100, 'height': 100,
+        'departure_city': 'Москва', 'departure_country': 'Россия',
+        'arrival_city': 'Берлин', 'arrival_country': 'Германия',
+        'departure_date': datetime.date(2026, 1, 10),
+        'arrival_date': datetime.date(2026, 1, 12),
+        'estimated_price': 1000,
+    }
+    data.update(kwargs)
+    return Shipment.objects.create(**data)
+
+
+class ShipmentQueryPlanTests(QueryPlanAssertionsMixin, TestCase):
+    """Горячие запросы к заявкам не должны деградировать до полного просмотра"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='x')
+        cls.admin = User.objects.create_superuser('admin', password='x')
+        for i in range(5):
+            make_shipment(cls.owner, title=f'Груз {i}', cargo_type='general' if i % 2 else 'perishable')
+
+    def test_list_first_page(self):
+        # Без фильтров читается начало индекса по дате, LIMIT обрывает обход
+        self.assertCallUsesIndexes(paginate_by_cursor, Shipment.objects.all(), allow_index_scan=True)
+
+    def test_list_next_page(self):
+        page = paginate_by_cursor(Shipment.objects.all(), per_page=2)
+        self.assertCallUsesIndexes(paginate_by_cursor, Shipment.objects.all(), page.next_cursor, 2)
+
+    def test_list_anonymous_active_only(self):
+        self.assertCallUsesIndexes(paginate_by_cursor, Shipment.objects.filter(status='active'))
+
+    def test_list_status_and_cargo_type(self):
+        queryset = Shipment.objects.filter(status='active', cargo_type='general')
+        self.assertCallUsesIndexes(paginate_by_cursor, queryset)
+
+    def test_list_cargo_type(self):
+        self.assertCallUsesIndexes(paginate_by_cursor, Shipment.objects.filter(cargo_type='general'))
+
+    def test_list_lane(self):
+        shipment = Shipment.objects.first()
+        queryset = Shipment.objects.filter(
+            status='active',
+            departure_location__in=[shipment.departure_location_id],
+            arrival_location__in=[shipment.arrival_location_id],
+        )
+        self.assertQuerysetUsesIndex(queryset.order_by('-created_at', '-id')[:11])
+
+    def test_list_arrival_only(self):
+        shipment = Shipment.objects.first()
+        queryset = Shipment.objects.filter(arrival_location__in=[shipment.arrival_location_id])
+        self.assertQuerysetUsesIndex(queryset.order_by('-created_at', '-id')[:11])
+
+    def test_owner_shipments(self):
+        self.assertQuerysetUsesIndex(self.owner.shipments.order_by('-created_at', '-id')[:5])
+
+    def test_search_uses_fts(self):
+        # Сортировка по релевантности неизбежно требует временного B-дерева
+        queryset = search_shipments(Shipment.objects.filter(status='active'), 'москва')
+        self.assertQuerysetUsesIndex(queryset[:10], allow_sort=True)
+
+    def test_admin_changelist(self):
+        request = RequestFactory().get('/admin/shipments/shipment/', {'status__exact': 'active'})
+        request.user = self.admin
+        model_admin = admin.site._registry[Shipment]
+        changelist = model_admin.get_changelist_instance(request)
+        self.assertQuerysetUsesIndex(changelist.get_queryset(request)[:model_admin.list_per_page])
+
+
+class PercolatorTests(TestCase):
+
+    def setUp(self):
+        # Колбэки on_commit здесь выполняются внутри откатываемой транзакции:
+        # индексы в памяти после теста содержали бы несуществующие id
+        for invalidate in (invalidate_percolator, invalidate_location_index):
+            invalidate()
+            self.addCleanup(invalidate)
+        self.owner = User.objects.create_user('owner', password='x')
+        self.agent = User.objects.create_user('agent', password='x')
+
+    def test_matches_brute_force(self):
+        rng = random.Random(7)
+        specs = [random_spec(rng, i, locations=5) for i in range(1, 3001)]
+        percolator = Percolator()
+        percolator.extend(specs[:1500])
+        for spec in specs[1500:]:
+            percolator.add(spec)
+        for spec in specs[::7]:
+            percolator.remove(spec.id)
+        remaining = [spec for spec in specs if spec.id in percolator.specs]
+
+        for _ in range(200):
+            shipment = random_shipment(rng, locations=5)
+            self.assertEqual(percolator.match(shipment), brute_force_match(remaining, shipment))
+
+    def save_search(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return SavedSearch.objects.create(agent=self.agent, name='Москва - Берлин', **kwargs)
+
+    def create_shipment(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return make_shipment(self.owner, **kwargs)
+
+    def test_new_active_shipment_reaches_inbox(self):
+        lane = make_shipment(self.owner, status='draft')
+        search = self.save_search(
+            departure_location=lane.departure_location,
+            arrival_location=lane.arrival_location,
+            max_weight=500,
+        )
+        matching = self.create_shipment()
+        self.create_shipment(weight=900)
+        self.create_shipment(arrival_city='Париж', arrival_country='Франция')
+
+        self.assertQuerysetEqual(
+            SavedSearchMatch.objects.filter(agent=self.agent).values_list('saved_search', 'shipment'),
+            [(search.id, matching.id)], transform=tuple
+        )
+
+    def test_activation_matches_once(self):
+        self.save_search(cargo_type='general')
+        shipment = self.create_shipment(status='draft')
+        self.assertFalse(SavedSearchMatch.objects.exists())
+
+        shipment = Shipment.objects.get(id=shipment.id)
+        shipment.status = 'active'
+        with self.captureOnCommitCallbacks(execute=True):
+            shipment.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            shipment.save()
+        self.assertEqual(SavedSearchMatch.objects.filter(shipment=shipment).count(), 1)
+
+    def test_own_shipments_and_deleted_searches_skipped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            SavedSearch.objects.create(agent=self.owner, name='Свои')
+        search = self.save_search()
+        with self.captureOnCommitCallbacks(execute=True):
+            search.delete()
+        self.create_shipment()
+        self.assertFalse(SavedSearchMatch.objects.exists())
+
+    def test_index_follows_searches_saved_elsewhere(self):
+        percolator = get_percolator()
+        self.assertIs(get_percolator(), percolator)
+
+        # Поиск сохранил другой процесс: колбэк этого процесса не выполнялся,
+        # индекс узнает об изменении по версии в БД
+        with self.captureOnCommitCallbacks(execute=False):
+            search = SavedSearch.objects.create(agent=self.agent, name='Где угодно')
+        self.assertIn(search.id, get_percolator().specs)
+
+        with self.captureOnCommitCallbacks(execute=False):
+            search.delete()
+        self.assertNotIn(search.id, get_percolator().specs)
+
+        # Свое изменение патчит индекс без перестроения
+        percolator = get_percolator()
+        search = self.save_search()
+        self.assertIs(get_percolator(), percolator)
+        self.assertIn(search.id, percolator.specs)
+
+
+class DateWindowTests(QueryPlanAssertionsMixin, TestCase):
+    """Фильтр по пересечению окон дат против эталонного перебора"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='x')
+        rng = random.Random(3)
+        start = datetime.date(2026, 1, 1)
+        for i in range(120):
+            departure = start + datetime.timedelta(days=rng.randrange(0, 90))
+            arrival = departure + datetime.timedelta(days=rng.randrange(0, 5))
+            make_shipment(
+                cls.owner,
+                title=f'Груз {i}',
+                departure_date=departure,
+                latest_departure_date=rng.choice([None, departure + datetime.timedelta(days=rng.randrange(0, 30))]),
+                arrival_date=arrival,
+                latest_arrival_date=rng.choice([None, arrival + datetime.timedelta(days=rng.randrange(0, 10))]),
+            )
+
+    @staticmethod
+    def brute_force(kind, date_from, date_to):
+        result = set()
+        for shipment in Shipment.objects.all():
+            window_start = getattr(shipment, f'{kind}_date')
+            window_end = getattr(shipment, f'latest_{kind}_date') or window_start
+            if (date_to is None or window_start <= date_to) and (date_from is None or window_end >= date_from):
+                result.add(shipment.id)
+        return result
+
+    def test_matches_brute_force(self):
+        rng = random.Random(11)
+        for _ in range(60):
+            kind = rng.choice(['departure', 'arrival'])
+            date_from = datetime.date(2025, 12, 15) + datetime.timedelta(days=rng.randrange(0, 140))
+            date_to = date_from + datetime.timedelta(days=rng.randrange(0, 20))
+            date_from, date_to = rng.choice([(date_from, date_to), (date_from, None), (None, date_to)])
+            found = set(overlapping(Shipment.objects.all(), kind, date_from, date_to).values_list('id', flat=True))
+            self.assertEqual(found, self.brute_force(kind, date_from, date_to), (kind, date_from, date_to))
+
+    def test_window_follows_edits(self):
+        shipment = Shipment.objects.filter(latest_departure_date__isnull=True).first()
+        probe = shipment.departure_date + datetime.timedelta(days=40)
+        self.assertNotIn(shipment, overlapping(Shipment.objects.all(), 'departure', probe, probe))
+
+        shipment.latest_departure_date = probe
+        shipment.save(update_fields=['latest_departure_date'])
+        self.assertIn(shipment, overlapping(Shipment.objects.all(), 'departure', probe, probe))
+
+    def test_uses_window_index(self):
+        for kind in WINDOWS:
+            queryset = overlapping(
+                Shipment.objects.all(), kind, datetime.date(2026, 2, 1), datetime.date(2026, 2, 5)
+            )
+            self.assertQuerysetUsesIndex(queryset.order_by(f'{kind}_date'))
+            # Длина самого широкого окна - MAX по индексу
+            self.assertCallUsesIndexes(max_window_days, Shipment.objects.all(), kind)
+
+    def test_api(self):
+        response = self.client.get(reverse('shipment_list_api'), {
+            'departure_from': '2026-02-01', 'departure_to': '2026-02-05', 'page': '1',
+        })
+        expected = self.brute_force('departure', datetime.date(2026, 2, 1), datetime.date(2026, 2, 5))
+        ids = {item['id'] for item in response.json()['results']}
+        self.assertLessEqual(ids, expected)
+        self.assertEqual(len(ids), min(len(expected), 20))
+
+
+class CargoMetricsTests(QueryPlanAssertionsMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='x')
+        # 1 м³ и 100 кг: объемный вес 1000000 / 6000 = 166.67 кг больше фактического
+        cls.bulky = make_shipment(cls.owner, title='Легкий объемный', weight=100)
+        cls.heavy = make_shipment(cls.owner, title='Тяжелый', weight=900, length=50, width=50, height=50)
+
+    def test_values_maintained_on_save(self):
+        self.assertEqual(self.bulky.volume, Decimal('1.000'))
+        self.assertEqual(self.bulky.chargeable_weight, Decimal('166.67'))
+        self.assertEqual(self.heavy.volume, Decimal('0.125'))
+        self.assertEqual(self.heavy.chargeable_weight, Decimal('900.00'))
+
+        self.heavy.length = 400
+        self.heavy.save(update_fields=['length'])
+        self.heavy.refresh_from_db()
+        self.assertEqual(self.heavy.volume, Decimal('1.000'))
+
+    def test_backfill(self):
+        Shipment.objects.update(volume=None, chargeable_weight=None)
+        call_command('backfill_cargo_metrics', batch_size=1, stdout=io.StringIO())
+        self.assertEqual(
+            set(Shipment.objects.values_list('volume', 'chargeable_weight')),
+            {(Decimal('1.000'), Decimal('166.67')), (Decimal('0.125'), Decimal('900.00'))}
+        )
+
+    def test_list_range_filter_and_sort(self):
+        url = reverse('shipment_list_api')
+        response = self.client.get(url, {'chargeable_min': '200', 'volume_max': '0.5'})
+        self.assertEqual([item['id'] for item in response.json()['results']], [self.heavy.id])
+
+        response = self.client.get(url, {'sort': '-chargeable_weight'})
+        self.assertEqual([item['id'] for item in response.json()['results']], [self.heavy.id, self.bulky.id])
+
+    def test_largest_dimensions_fit_columns(self):
+        self.client.force_login(self.owner)
+        UserProfile.objects.create(user=self.owner, user_type='customer')
+        data = {
+            'title': 'Габаритный', 'cargo_type': 'general', 'weight': '99999999.99',
+            'length': '10000', 'width': '10000', 'height': '10000',
+            'departure_city': 'Москва', 'departure_country': 'Россия',
+            'arrival_city': 'Берлин', 'arrival_country': 'Германия',
+            'departure_date': '2026-01-10', 'arrival_date': '2026-01-12',
+            'estimated_price': '1000', 'currency': 'USD', 'payment_method': 'bank_transfer', 'incoterm': 'fca',
+        }
+        response = self.client.post(reverse('shipment_create'), data)
+        self.assertEqual(response.status_code, 302)
+        shipment = Shipment.objects.get(title='Габаритный')
+        self.assertEqual(shipment.volume, Decimal('1000000.000'))
+        self.assertEqual(shipment.chargeable_weight, Decimal('166666666.67'))
+
+        # Больше предела - ошибка формы, а не 500 при записи
+        response = self.client.post(reverse('shipment_create'), {**data, 'length': '100000'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('length', response.context['form'].errors)
+
+    def test_sort_uses_index(self):
+        for field in ('volume', 'chargeable_weight'):
+            queryset = Shipment.objects.filter(status='active').order_by(f'-{field}', '-id')
+            self.assertQuerysetUsesIndex(queryset[:10])
+
+
+@override_settings(VIEW_COUNTER={'FLUSH_INTERVAL': 3600, 'FLUSH_THRESHOLD': 10 ** 6})
+class ShipmentDetailQueryTests(TestCase):
+    """Число запросов страницы заявки не зависит от числа предложений"""
+
+    # Сессия, пользователь и его профиль, валидаторы условного GET, заявка,
+    # предложения страницы, счетчики по статусам, два счетчика меню в base.html
+    QUERY_BUDGET = 9
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='x')
+        UserProfile.objects.create(user=cls.owner, user_type='customer', company_name='Грузы')
+        cls.few = make_shipment(cls.owner, title='Мало предложений')
+        cls.many = make_shipment(cls.owner, title='Много предложений')
+        for shipment, count in ((cls.few, 2), (cls.many, 60)):
+            bids = []
+            for i in range(count):
+                agent = User.objects.create_user(f'agent-{shipment.id}-{i}')
+                UserProfile.objects.create(user=agent, user_type='agent', company_name=f'Перевозчик {i}',
+                                           rating_sum=9, total_ratings=2)
+                bids.append(Bid(
+                    shipment=shipment, carrier_agent=agent, price=900 + i,
+                    status=['pending', 'rejected', 'cancelled'][i % 3],
+                    departure_date=shipment.departure_date, arrival_date=shipment.arrival_date,
+                ))
+            Bid.objects.bulk_create(bids)
+
+    def setUp(self):
+        self.client.force_login(self.owner)
+        self.addCleanup(discard_views)
+
+    def count_queries(self, shipment, **params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('shipment_detail', args=[shipment.id]), params)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def test_query_count_does_not_grow_with_bids(self):
+        few, _ = self.count_queries(self.few)
+        many, response = self.count_queries(self.many)
+        self.assertEqual(few, many)
+        self.assertLessEqual(many, self.QUERY_BUDGET)
+        self.assertContains(response, 'Перевозчик 59')
+        # Средняя оценка агента - из профиля, загруженного вместе с предложением
+        self.assertContains(response, '★ 4.5', count=20)
+        self.assertEqual(response.context['bid_stats']['total'], 60)
+        self.assertEqual(response.context['bid_stats']['pending'], 20)
+
+    def test_numbered_pages_within_budget(self):
+        # Paginator добавляет один COUNT
+        queries, _ = self.count_queries(self.many, bids_page=2)
+        self.assertLessEqual(queries, self.QUERY_BUDGET + 1)
+
+
+class ViewCounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='x')
+        cls.viewer = User.objects.create_user('viewer', password='x')
+        cls.first = make_shipment(cls.owner, title='Первая')
+        cls.second = make_shipment(cls.owner, title='Вторая')
+
+    def setUp(self):
+        discard_views()
+        self.addCleanup(discard_views)
+
+    def test_buffered_views_flushed_in_batch(self):
+        updated_at = Shipment.objects.get(id=self.first.id).updated_at
+        for i in range(30):
+            record_view(self.first.id, f'user:{i % 10}')
+        for i in range(5):
+            record_view(self.second.id, 'user:1')
+        self.assertEqual(pending_views(self.first.id), 30)
+        self.assertEqual(Shipment.objects.get(id=self.first.id).views, 0)
+
+        # Savepoint, два UPDATE счетчиков, проверка заявок,
+        # скетчи: создание, чтение, запись
+        with self.assertNumQueries(8):
+            self.assertEqual(flush_views(), 35)
+
+        first = Shipment.objects.select_related('view_stats').get(id=self.first.id)
+        self.assertEqual(first.views, 30)
+        self.assertEqual(first.view_stats.unique_viewers, 10)
+        self.assertEqual(first.updated_at, updated_at)
+        self.assertEqual(ShipmentViewStats.objects.get(shipment=self.second).unique_viewers, 1)
+        self.assertEqual(pending_views(self.first.id), 0)
+
+    def test_sketches_merge_across_flushes(self):
+        for i in range(200):
+            record_view(self.first.id, f'user:{i}')
+        flush_views()
+        for i in range(100, 400):
+            record_view(self.first.id, f'user:{i}')
+        flush_views()
+        stats = ShipmentViewStats.objects.get(shipment=self.first)
+        self.assertAlmostEqual(stats.unique_viewers, 400, delta=400 * 0.1)
+        self.assertEqual(Shipment.objects.get(id=self.first.id).views, 500)
+
+    def test_buffer_bound_to_database(self):
+        record_view(self.first.id, 'user:1')
+        # Соединение переключили на другую БД (конец manage.py test):
+        # просмотры тестовой БД туда не пишутся
+        with mock.patch.dict(connection.settings_dict, NAME='other.sqlite3'):
+            with self.assertNumQueries(0):
+                self.assertEqual(flush_views(), 0)
+            record_view(self.first.id, 'user:1')
+        self.assertEqual(pending_views(self.first.id), 1)
+        self.assertEqual(flush_views(), 0)
+        self.assertEqual(Shipment.objects.get(id=self.first.id).views, 0)
+
+    def test_detail_page_counts_other_users(self):
+        self.client.force_login(self.viewer)
+        self.client.get(reverse('shipment_detail', args=[self.first.id]))
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('shipment_detail', args=[self.first.id]))
+        self.assertEqual(response.context['view_count'], 1)
+        self.assertContains(response, 'Уникальных зрителей')
+
+
+class PageCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='x')
+        for i in range(3):
+            make_shipment(cls.owner, title=f'Груз {i}', cargo_type=['general', 'dangerous', 'general'][i])
+
+    def setUp(self):
+        cache.clear()
+        page_cache._popular.clear()
+        self.addCleanup(cache.clear)
+        self.addCleanup(page_cache._popular.clear)
+        self.url = reverse('shipment_list')
+
+    def get(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        # Версию списка conditional_page читает до кэша - одна строка core_dataversion
+        versions = [query['sql'] for query in queries if 'core_dataversion' in query['sql']]
+        self.assertEqual(len(versions), 1)
+        shipment_queries = [query['sql'] for query in queries if 'shipments_' in query['sql']]
+        return response, shipment_queries
+
+    def test_hit_and_miss(self):
+        response, _ = self.get(cargo_type='general')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        response, queries = self.get(cargo_type='general')
+        self.assertEqual((response['X-Cache'], queries), ('HIT', []))
+        self.assertEqual(self.get(cargo_type='dangerous')[0]['X-Cache'], 'MISS')
+
+    def test_stale_while_one_request_rebuilds(self):
+        first, _ = self.get()
+        bump_generation()
+        # Пересчет уже идет в другом запросе - остальным отдается старая копия без БД
+        lock_key = page_cache.page_cache_key('') + ':lock'
+        self.assertTrue(cache.add(lock_key, 1))
+        for _ in range(2):
+            response, queries = self.get()
+            self.assertEqual((response['X-Cache'], queries), ('STALE', []))
+            self.assertEqual(response.content, first.content)
+
+        cache.delete(lock_key)
+        self.assertEqual(self.get()[0]['X-Cache'], 'MISS')
+        self.assertEqual(self.get()[0]['X-Cache'], 'HIT')
+
+    def test_bypass_for_users_and_post(self):
+        self.get()
+        self.assertNotIn('X-Cache', self.client.post(self.url))
+        self.client.force_login(self.owner)
+        response, queries = self.get()
+        self.assertNotIn('X-Cache', response)
+        self.assertTrue(queries)
+
+    @override_settings(SHIPMENT_LIST_CACHE={'POPULAR_LIMIT': 5})
+    def test_popularity_ignores_pages_and_is_bounded(self):
+        for i in range(50):
+            page_cache._record_hit(QueryDict(f'cargo_type=general&cursor=c{i}'))
+        self.assertEqual(dict(page_cache._popular), {'cargo_type=general': 50})
+
+        for i in range(100):
+            page_cache._record_hit(QueryDict(f'search=robot{i}'))
+        self.assertLessEqual(len(page_cache._popular), 10)
+        self.assertEqual(page_cache.popular_queries(2), ['', 'cargo_type=general'])
+
+    def test_warm(self):
+        page_cache._record_hit(QueryDict('cargo_type=dangerous'))
+        self.assertEqual(page_cache.warm_page_cache(filters=2, pages=2), 2)
+        for params in ({}, {'cargo_type': 'dangerous'}):
+            response, queries = self.get(**params)
+            self.assertEqual((response['X-Cache'], queries), ('HIT', []))
+
+
+class ConditionalGetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='x')
+        cls.agent = User.objects.create_user('agent', password='x')
+        UserProfile.objects.create(user=cls.agent, user_type='agent')
+        cls.shipment = make_shipment(cls.owner)
+
+    def setUp(self):
+        self.addCleanup(discard_views)
+
+    def revalidate(self, url, response, **params):
+        return self.client.get(url, params, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_detail_not_modified_until_bid_arrives(self):
+        self.client.force_login(self.agent)
+        url = reverse('shipment_detail', args=[self.shipment.id])
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('Last-Modified', first)
+
+        again = self.revalidate(url, first)
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['ETag'], first['ETag'])
+
+        bid = Bid.objects.create(
+            shipment=self.shipment, carrier_agent=self.agent, price=900,
+            departure_date=self.shipment.departure_date, arrival_date=self.shipment.arrival_date,
+        )
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+        # Другая роль - другая страница
+        bid_url = reverse('bid_detail', args=[bid.id])
+        agent_page = self.client.get(bid_url)
+        self.assertEqual(self.revalidate(bid_url, agent_page).status_code, 304)
+        self.client.force_login(self.owner)
+        self.assertEqual(self.revalidate(bid_url, agent_page).status_code, 200)
+
+    def test_detail_not_modified_still_counts_view(self):
+        self.client.force_login(self.agent)
+        url = reverse('shipment_detail', args=[self.shipment.id])
+        first = self.client.get(url)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+        self.assertEqual(pending_views(self.shipment.id), 2)
+
+    def test_detail_changes_with_agent_rating(self):
+        Bid.objects.create(
+            shipment=self.shipment, carrier_agent=self.agent, price=900,
+            departure_date=self.shipment.departure_date, arrival_date=self.shipment.arrival_date,
+        )
+        self.client.force_login(self.owner)
+        url = reverse('shipment_detail', args=[self.shipment.id])
+        first = self.client.get(url)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+        # Агента оценили по другой заявке - рейтинг в таблице предложений изменился
+        UserProfile.objects.filter(user=self.agent).update(rating_sum=4, total_ratings=1)
+        self.assertContains(self.revalidate(url, first), '★ 4.0')
+
+    def test_list_not_modified_until_shipments_change(self):
+        url = reverse('shipment_list')
+        first = self.client.get(url)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+        make_shipment(self.owner, title='Новая')
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+    def test_list_version_from_database(self):
+        url = reverse('shipment_list')
+        first = self.client.get(url)
+        # Проверка версии - одна строка по первичному ключу, без обхода заявок
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.revalidate(url, first).status_code, 304)
+        self.assertEqual(len(queries), 1)
+        self.assertIn('core_dataversion', queries[0]['sql'])
+        # Другой процесс со своим локальным кэшем получает ту же версию
+        cache.clear()
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+        # Новое предложение меняет счетчик в карточке заявки
+        Bid.objects.create(
+            shipment=self.shipment, carrier_agent=self.agent, price=900,
+            departure_date=self.shipment.departure_date, arrival_date=self.shipment.arrival_date,
+        )
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+        self.shipment.delete()
+        second = self.client.get(url)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+
+    def test_pending_messages_always_rendered(self):
+        self.client.force_login(self.owner)
+        url = reverse('shipment_detail', args=[self.shipment.id])
+        first = self.client.get(url)
+        self.client.post(reverse('shipment_deactivate', args=[self.shipment.id]))
+        response = self.revalidate(url, first)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'деактивирована')
+
+
+class RecordingBackend(event_broker.LocalBackend):
+    """Локальный бэкенд, который запоминает опубликованные события"""
+
+    def __init__(self, broker):
+        super().__init__(broker)
+        self.published = []
+
+    def publish(self, channel, event):
+        self.published.append((channel, event['kind'], event['data']))
+        super().publish(channel, event)
+
+
+class ShipmentEventsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='x')
+        cls.agent = User.objects.create_user('agent', password='x')
+        UserProfile.objects.create(user=cls.agent, user_type='agent')
+        cls.shipment = make_shipment(cls.owner)
+
+    def setUp(self):
+        self.broker = event_broker.Broker(backend_class=RecordingBackend)
+        previous, event_broker._broker = event_broker._broker, self.broker
+        self.addCleanup(setattr, event_broker, '_broker', previous)
+        self.url = reverse('shipment_events', args=[self.shipment.id])
+        # Вход через сессию в БД - синхронная операция, поэтому здесь, а не в async-тесте
+        self.async_client.force_login(self.owner)
+
+    async def test_stream_pushes_published_events(self):
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        self.assertTrue((await anext(stream)).startswith(b'retry:'))
+        self.assertEqual(self.broker.subscriber_count(channel_name(self.shipment.id)), 1)
+
+        # Публикация из другого потока, как из синхронной view
+        thread = threading.Thread(
+            target=self.broker.publish, args=(channel_name(self.shipment.id), 'bid_status', {'id': 7})
+        )
+        thread.start()
+        thread.join()
+        chunk = await asyncio.wait_for(anext(stream), timeout=5)
+        self.assertIn(b'event: bid_status', chunk)
+        self.assertIn(b'"id": 7', chunk)
+
+    async def test_disconnect_closes_stream(self):
+        from config.asgi import application
+
+        sent = asyncio.Queue()
+        received = asyncio.Queue()
+        await received.put({'type': 'http.request', 'body': b'', 'more_body': False})
+        session = self.async_client.cookies[settings.SESSION_COOKIE_NAME].value
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': 'GET', 'scheme': 'http', 'path': self.url, 'raw_path': self.url.encode(),
+            'query_string': b'', 'root_path': '', 'server': ('localhost', 80), 'client': ('127.0.0.1', 1),
+            'headers': [(b'host', b'testserver'), (b'cookie', f'{settings.SESSION_COOKIE_NAME}={session}'.encode())],
+        }
+        # Как в тестовом клиенте: обработчик не должен закрывать соединение с тестовой БД
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        self.addCleanup(request_started.connect, close_old_connections)
+        self.addCleanup(request_finished.connect, close_old_connections)
+        request = asyncio.ensure_future(application(scope, received.get, sent.put))
+
+        start = await asyncio.wait_for(sent.get(), timeout=5)
+        self.assertEqual(start['status'], 200)
+        self.assertTrue((await asyncio.wait_for(sent.get(), timeout=5))['body'].startswith(b'retry:'))
+        self.assertEqual(self.broker.subscriber_count(), 1)
+
+        await received.put({'type': 'http.disconnect'})
+        await asyncio.wait_for(request, timeout=5)
+        self.assertEqual(self.broker.subscriber_count(), 0)
+
+    def test_only_owner(self):
+        self.client.force_login(self.agent)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_views_publish_after_commit(self):
+        self.client.force_login(self.agent)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('create_bid', args=[self.shipment.id]), {
+                'price': 900, 'currency': 'USD',
+                'departure_date': '2026-01-10', 'arrival_date': '2026-01-12',
+            })
+        bid = Bid.objects.get(shipment=self.shipment)
+
+        self.client.force_login(self.owner)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('accept_bid', args=[bid.id]))
+
+        self.assertEqual(
+            [(kind, data.get('id')) for _, kind, data in self.broker.backend.published],
+            [('bid_created', bid.id), ('bid_status', bid.id), ('shipment_status', None)]
+        )
+
+    def test_idle_subscribers_share_one_loop(self):
+        async def run():
+            subscriptions = [self.broker.subscribe(channel_name(i % 10)) for i in range(5000)]
+            threads_before = threading.active_count()
+            self.broker.publish(channel_name(3), 'bid_created', {})
+            received = await asyncio.gather(*(subscription.get(timeout=5) for subscription in subscriptions[3::10]))
+            self.assertEqual(len(received), 500)
+            self.assertTrue(all(event['kind'] == 'bid_created' for event in received))
+            self.assertEqual(threading.active_count(), threads_before)
+            for subscription in subscriptions:
+                subscription.close()
+
+        asyncio.run(run())
+        self.assertEqual(self.broker.subscriber_count(), 0)
+
+
+@override_settings(CURRENCY_RATES={'USD': Decimal('1'), 'EUR': Decimal('2'), 'RUB': Decimal('0.01')})
+class QuoteEngineTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='x')
+        UserProfile.objects.create(user=cls.owner, user_type='customer')
+        cls.agent = User.objects.create_user('agent', password='x')
+
+    def setUp(self):
+        invalidate_location_index()
+        self.addCleanup(invalidate_location_index)
+        self.addCleanup(quotes.invalidate_model)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.snapshot = Path(directory) / 'quotes.npz'
+        engine = override_settings(QUOTE_ENGINE={'SNAPSHOT': self.snapshot, 'REFRESH': 0, 'MIN_SAMPLES': 3})
+        engine.enable()
+        self.addCleanup(engine.disable)
+
+    def accept(self, weight, price, currency='USD', **kwargs):
+        shipment = make_shipment(self.owner, weight=weight, length=1, width=1, height=1, **kwargs)
+        bid = Bid.objects.create(shipment=shipment, carrier_agent=self.agent, price=price, currency=currency,
+                                 departure_date=shipment.departure_date, arrival_date=shipment.arrival_date)
+        state_machine.accept(bid)
+
+    def test_least_squares_with_fallbacks(self):
+        # Москва - Берлин: 100 + 2 * вес, в EUR по курсу 2
+        for weight in (100, 200, 300, 400):
+            self.accept(weight, 50 + weight, currency='EUR')
+        self.accept(100, 5000, arrival_city='Пекин', arrival_country='Китай', cargo_type='perishable')
+
+        model = quotes.get_model()
+        departure, arrival = Shipment.objects.filter(arrival_city='Берлин').values_list(
+            'departure_location', 'arrival_location').first()
+        general = quotes._cargo_codes()['general']
+        result = model.predict(departure, arrival, general, 250.0)
+        self.assertEqual((result.basis, result.samples), ('lane_cargo', 4))
+        self.assertAlmostEqual(result.price_usd, 600.0)
+        self.assertAlmostEqual(result.spread_usd, 0.0)
+
+        # Неизвестный маршрут - общая модель по типу груза
+        self.assertEqual(model.predict(999, 998, general, 250.0).basis, 'cargo')
+        # Один пример на маршруте Москва - Пекин меньше MIN_SAMPLES - модель по всем перевозкам
+        self.assertEqual(model.predict(departure, 999, quotes._cargo_codes()['perishable'], 100.0).basis, 'global')
+
+    def test_incremental_refresh_and_snapshot(self):
+        for weight in (100, 200, 300):
+            self.accept(weight, 100 + 2 * weight)
+        full = quotes.fit()
+        call_command('fit_quotes', stdout=io.StringIO())
+        self.assertTrue(self.snapshot.exists())
+
+        first = quotes.get_model()
+        self.accept(400, 900)
+        second = quotes.get_model()
+        self.assertEqual(second.stats[second.index[(0, 0, -1)], 0], 4)
+
+        loaded = quotes.QuoteModel.load(self.snapshot)
+        self.assertEqual(loaded.watermark, full.watermark)
+        numpy.testing.assert_allclose(loaded.stats, full.stats)
+        self.assertIs(first, second)
+
+        quotes.update(loaded)
+        numpy.testing.assert_allclose(loaded.stats, quotes.fit().stats)
+
+    def test_quote_endpoint_without_queries(self):
+        for weight in (100, 200, 300):
+            self.accept(weight, 100 + 2 * weight)
+        url = reverse('shipment_quote')
+        params = {
+            'departure_city': 'Москва', 'departure_country': 'Россия',
+            'arrival_city': 'Берлин', 'arrival_country': 'Германия',
+            'cargo_type': 'general', 'weight': '250', 'currency': 'EUR',
+        }
+        self.client.get(url, params)
+        with override_settings(QUOTE_ENGINE={'SNAPSHOT': self.snapshot, 'REFRESH': 300}):
+            quotes.get_model()
+            with self.assertNumQueries(0):
+                response = self.client.get(url, params)
+        data = response.json()
+        self.assertEqual(data['quote']['price'], '300.00')
+        self.assertEqual((data['quote']['currency'], data['quote']['basis']), ('EUR', 'lane_cargo'))
+
+        self.assertEqual(self.client.get(url, {**params, 'weight': 'abc'}).status_code, 400)
+        self.assertIsNone(self.client.get(url, {**params, 'weight': '0'}).json()['quote'])
+
+    def test_form_page_requests_quote(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('shipment_create'))
+        self.assertContains(response, reverse('shipment_quote'))
+        self.assertContains(response, 'id="priceQuote"')
+
+
+class SearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='x')
+        cls.turbine = make_shipment(cls.owner, title='Турбина, турбина и еще турбина', cargo_type='dangerous')
+        cls.mention = make_shipment(
+            cls.owner, title='Запчасти', cargo_type='general',
+            description='Ящики с запчастями для станков, среди них одна турбина и много прочего оборудования',
+        )
+        cls.other = make_shipment(cls.owner, title='Цветы', arrival_city='Zürich', arrival_country='Schweiz')
+
+    def ids(self, text, queryset=None):
+        return list(search_shipments(queryset or Shipment.objects.all(), text).values_list('id', flat=True))
+
+    def fts_rowids(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT rowid FROM {FTS_TABLE} ORDER BY rowid')
+            return [row[0] for row in cursor.fetchall()]
+
+    def test_index_follows_create_update_delete(self):
+        shipment = make_shipment(self.owner, title='Рояль')
+        self.assertEqual(self.ids('рояль'), [shipment.id])
+
+        shipment.title = 'Контрабас'
+        shipment.save()
+        self.assertEqual(self.ids('рояль'), [])
+        self.assertEqual(self.ids('контрабас'), [shipment.id])
+
+        shipment.delete()
+        self.assertEqual(self.ids('контрабас'), [])
+        self.assertNotIn(shipment.id, self.fts_rowids())
+
+    def test_ranked_by_relevance(self):
+        # Префикс, регистр и диакритика не мешают поиску
+        self.assertEqual(self.ids('ТУРБ'), [self.turbine.id, self.mention.id])
+        self.assertEqual(self.ids('zurich'), [self.other.id])
+        # Токены объединяются через AND, спецсимволы FTS5 не ломают запрос
+        self.assertEqual(self.ids('турбина станков'), [self.mention.id])
+        self.assertEqual(self.ids('("турбина*'), [self.turbine.id, self.mention.id])
+        self.assertEqual(self.ids('  '), list(Shipment.objects.values_list('id', flat=True)))
+
+    def test_combined_with_filters(self):
+        self.assertEqual(self.ids('турбина', Shipment.objects.filter(cargo_type='general')), [self.mention.id])
+        response = self.client.get(reverse('shipment_list_api'), {'search': 'турбина', 'cargo_type': 'dangerous'})
+        self.assertEqual([item['id'] for item in response.json()['results']], [self.turbine.id])
+        # Фасеты и страница списка считаются по тем же найденным заявкам
+        response = self.client.get(reverse('shipment_list'), {'search': 'турбина'})
+        self.assertEqual([shipment.id for shipment in response.context['page_obj']], [self.turbine.id, self.mention.id])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        self.assertEqual(self.ids('турбина'), [])
+        out = io.StringIO()
+        call_command('rebuild_search_index', batch_size=2, stdout=out)
+        self.assertIn('Проиндексировано заявок: 3', out.getvalue())
+        self.assertEqual(self.fts_rowids(), sorted([self.turbine.id, self.mention.id, self.other.id]))
+        self.assertEqual(self.ids('турбина'), [self.turbine.id, self.mention.id])
+
+
+class LocationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='x')
+
+    def setUp(self):
+        invalidate_location_index()
+        self.addCleanup(invalidate_location_index)
+
+    def location(self, shipment):
+        return Location.objects.get(pk=shipment.departure_location_id)
+
+    def test_normalize(self):
+        self.assertEqual(normalize_name(' МОСКВА '), 'moskva')
+        self.assertEqual(normalize_name('Санкт-Петербург'), 'sankt peterburg')
+        self.assertEqual(normalize_name('Zürich'), 'zurich')
+        self.assertEqual(normalize_name('Ёлки'), 'elki')
+        self.assertEqual(canonical_city_key('Moskau'), 'moscow')
+        self.assertEqual(canonical_city_key('СПб'), 'saint petersburg')
+        self.assertEqual(canonical_country_key('Российская Федерация'), 'rossiiskaia federatsiia')
+        self.assertEqual(canonical_country_key('РФ'), 'russia')
+        self.assertEqual(canonical_country_key('Deutschland'), 'germany')
+
+    def test_spellings_resolve_to_one_location(self):
+        shipments = [
+            make_shipment(self.owner, departure_city=city, departure_country=country)
+            for city, country in (('Москва', 'Россия'), ('Moscow', 'Russia'), ('moskau', 'РФ'))
+        ]
+        self.assertEqual(len({shipment.departure_location_id for shipment in shipments}), 1)
+        moscow = self.location(shipments[0])
+        self.assertEqual((moscow.city, moscow.city_key, moscow.country_key), ('Москва', 'moscow', 'russia'))
+        # Без страны - по городу, если он такой один (новые пункты попадают
+        # в индекс после коммита, здесь его перестраиваем)
+        invalidate_location_index()
+        self.assertEqual(resolve_location('МОСКВА'), moscow.id)
+        self.assertIsNone(resolve_location('Неизвестный', create=False))
+
+    def test_alias_from_admin(self):
+        moscow = self.location(make_shipment(self.owner))
+        LocationAlias.objects.create(location=moscow, name='Златоглавая')
+        self.assertEqual(resolve_location('златоглавая', 'Россия', create=False), moscow.id)
+        self.assertEqual([item['id'] for item in autocomplete('злато')], [moscow.id])
+
+    def test_index_follows_changes_elsewhere(self):
+        moscow = self.location(make_shipment(self.owner))
+        self.assertEqual(autocomplete('белока'), [])
+
+        # Синоним добавил другой процесс: сигналы этого процесса не срабатывали,
+        # изменилась только версия справочника в БД
+        LocationAlias.objects.bulk_create([LocationAlias(location=moscow, name='Белокаменная', key='belokamennaia')])
+        versions.bump(versions.LOCATIONS)
+        with override_settings(LOCATION_INDEX={'REFRESH': 300}):
+            self.assertEqual(autocomplete('белока'), [])
+        with override_settings(LOCATION_INDEX={'REFRESH': 0}):
+            self.assertEqual([item['id'] for item in autocomplete('белока')], [moscow.id])
+            self.assertEqual(resolve_location('Белокаменная', 'Россия', create=False), moscow.id)
+
+    def test_autocomplete(self):
+        for city, count in (('Берлин', 3), ('Бергамо', 1), ('Берн', 2)):
+            for _ in range(count):
+                make_shipment(self.owner, departure_city=city, departure_country='Германия')
+        make_shipment(self.owner, departure_city='Санкт-Петербург', departure_country='Россия')
+        make_shipment(self.owner, departure_city='Zürich', departure_country='Schweiz')
+        invalidate_location_index()
+
+        # Популярные (больше заявок) - выше; Берлин еще и пункт прибытия всех заявок
+        self.assertEqual([item['city'] for item in autocomplete('бер')], ['Берлин', 'Берн', 'Бергамо'])
+        self.assertEqual([item['city'] for item in autocomplete('БЕР', limit=2)], ['Берлин', 'Берн'])
+        self.assertEqual([item['city'] for item in autocomplete('berl')], ['Берлин'])
+        # Начало любого слова, синонимы и диакритика
+        self.assertEqual([item['city'] for item in autocomplete('петер')], ['Санкт-Петербург'])
+        self.assertEqual([item['city'] for item in autocomplete('spb')], ['Санкт-Петербург'])
+        self.assertEqual([item['city'] for item in autocomplete('zür')], ['Zürich'])
+        self.assertEqual([item['city'] for item in autocomplete('ZUR')], ['Zürich'])
+        self.assertEqual(autocomplete('  '), [])
+        self.assertEqual(autocomplete('бердичев'), [])
+
+        response = self.client.get(reverse('location_autocomplete'), {'q': 'берн'})
+        self.assertEqual([item['city'] for item in response.json()['results']], ['Берн'])
+
+    def test_backfill(self):
+        shipments = [
+            make_shipment(self.owner, departure_city='Москва', arrival_city='Париж', arrival_country='Франция'),
+            make_shipment(self.owner, departure_city='Moscow', departure_country='Russia'),
+        ]
+        expected = {
+            shipment.id: (shipment.departure_location_id, shipment.arrival_location_id) for shipment in shipments
+        }
+        Shipment.objects.update(departure_location=None, arrival_location=None)
+        out = io.StringIO()
+        call_command('backfill_locations', batch_size=1, stdout=out)
+        self.assertIn('обработано заявок: 2', out.getvalue())
+        self.assertEqual(
+            {pk: (departure, arrival) for pk, departure, arrival in
+             Shipment.objects.values_list('id', 'departure_location', 'arrival_location')},
+            expected
+        )
+        self.assertEqual(Location.objects.count(), 3)
+
+
+class FacetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='x')
+        rng = random.Random(5)
+        for i in range(40):
+            make_shipment(
+                cls.owner, title=f'Груз {i}',
+                status=rng.choice(['active', 'active', 'draft', 'completed']),
+                cargo_type=rng.choice(['general', 'dangerous', 'perishable']),
+                currency=rng.choice(['USD', 'EUR', 'RUB']),
+                incoterm=rng.choice(['fca', 'exw', 'dap']),
+                is_hazardous=rng.random() < 0.3,
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def assertFacetsMatch(self, queryset):
+        with self.assertNumQueries(1):
+            facets = compute_facets(queryset)
+        for field in FACET_FIELDS:
+            expected = {
+                value: queryset.filter(**{field: value}).count()
+                for value in queryset.values_list(field, flat=True).distinct()
+            }
+            self.assertEqual({option['value']: option['count'] for option in facets[field]}, expected, field)
+            counts = [option['count'] for option in facets[field]]
+            self.assertEqual(counts, sorted(counts, reverse=True))
+
+    def test_counts_match_filtered_queryset(self):
+        self.assertFacetsMatch(Shipment.objects.all())
+        self.assertFacetsMatch(Shipment.objects.filter(status='active', cargo_type='general'))
+        self.assertFacetsMatch(Shipment.objects.filter(is_hazardous=True))
+        self.assertFacetsMatch(search_shipments(Shipment.objects.all(), 'груз'))
+        self.assertEqual(
+            compute_facets(Shipment.objects.none()), {field: [] for field in FACET_FIELDS}
+        )
+
+    def test_cache_follows_shipment_changes(self):
+        queryset = Shipment.objects.filter(cargo_type='dangerous')
+        filters = {'cargo_type': 'dangerous'}
+        facets = get_facets(queryset, filters)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_facets(queryset, filters), facets)
+
+        total = sum(option['count'] for option in facets['status'])
+        make_shipment(self.owner, cargo_type='dangerous', status='draft')
+        with self.assertNumQueries(1):
+            facets = get_facets(queryset, filters)
+        self.assertEqual(sum(option['count'] for option in facets['status']), total + 1)
+
+        shipment = queryset.first()
+        shipment.is_hazardous = not shipment.is_hazardous
+        shipment.save()
+        self.assertEqual(get_facets(queryset, filters), compute_facets(queryset))
+        shipment.delete()
+        self.assertEqual(sum(option['count'] for option in get_facets(queryset, filters)['status']), total)
+
+    def test_list_sidebar(self):
+        response = self.client.get(reverse('shipment_list'), {'cargo_type': 'general'})
+        queryset = Shipment.objects.filter(status='active', cargo_type='general')
+        cargo = response.context['facets']['cargo_type']
+        self.assertEqual([(option['value'], option['count'], option['selected']) for option in cargo],
+                         [('general', queryset.count(), True)])
+        self.assertIn('cargo_type=general', response.context['facets']['currency'][0]['query'])
@@ -1,10 +1,18 @@
 from django.urls import path
-from . import views
+from . import events, views
 
 urlpatterns = [
     path('', views.shipment_list, name='shipment_list'),
+    path('api/', views.shipment_list_api, name='shipment_list_api'),
     path('create/', views.shipment_create, name='shipment_create'),
+    path('quote/', views.shipment_quote, name='shipment_quote'),
+    path('locations/autocomplete/', views.location_autocomplete, name='location_autocomplete'),
+    path('searches/', views.saved_search_list, name='saved_search_list'),
+    path('searches/<int:search_id>/delete/', views.saved_search_delete, name='saved_search_delete'),
+    path('inbox/', views.search_inbox, name='search_inbox'),
+    path('inbox/read/', views.search_inbox_read, name='search_inbox_read'),
     path('<int:shipment_id>/', views.shipment_detail, name='shipment_detail'),
+    path('<int:shipment_id>/events/', events.shipment_events, name='shipment_events'),
     path('<int:shipment_id>/edit/', views.shipment_edit, name='shipment_edit'),
     path('<int:shipment_id>/delete/', views.shipment_delete, name='shipment_delete'),
     path('<int:shipment_id>/deactivate/', views.shipment_deactivate, name='shipment_deactivate'),
@@ -0,0 +1,171 @@
+# shipments/view_counter.py - буферизованный счетчик просмотров заявок
+
+import atexit
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.hyperloglog import HyperLogLog
+
+DEFAULTS = {
+    # Сбрасывать буфер не реже, чем раз в столько секунд...
+    'FLUSH_INTERVAL': 30,
+    # ...или когда в нем накопилось столько просмотров
+    'FLUSH_THRESHOLD': 500,
+    # Точность скетча уникальных зрителей (2 ** PRECISION байт на заявку)
+    'PRECISION': 10,
+}
+
+_lock = threading.Lock()
+_counts = defaultdict(int)      # id заявки -> просмотры с последнего сброса
+_sketches = {}                  # id заявки -> HyperLogLog зрителей с последнего сброса
+_pending = 0
+_last_flush = time.monotonic()
+# БД, к которой относятся id в буфере (NAME соединения при первом просмотре)
+_database = None
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'VIEW_COUNTER', {})}
+
+
+def viewer_key(request):
+    if request.user.is_authenticated:
+        return f'user:{request.user.id}'
+    return f'ip:{request.META.get("REMOTE_ADDR", "")}'
+
+
+def _database_name():
+    return str(connection.settings_dict['NAME'])
+
+
+def record_view(shipment_id, viewer):
+    """Учесть просмотр в памяти процесса; в БД он попадет при сбросе буфера"""
+    global _counts, _sketches, _pending, _database
+    database = _database_name()
+    with _lock:
+        if _database != database:
+            # Соединение переключили на другую БД (тестовую и обратно):
+            # id заявок из буфера к ней не относятся
+            _counts, _sketches, _pending, _database = defaultdict(int), {}, 0, database
+        _counts[shipment_id] += 1
+        sketch = _sketches.get(shipment_id)
+        if sketch is None:
+            sketch = _sketches[shipment_id] = HyperLogLog(get_config()['PRECISION'])
+        sketch.add(viewer)
+        _pending += 1
+
+
+def flush_due():
+    config = get_config()
+    with _lock:
+        return _pending > 0 and (
+            _pending >= config['FLUSH_THRESHOLD']
+            or time.monotonic() - _last_flush >= config['FLUSH_INTERVAL']
+        )
+
+
+def pending_views(shipment_id):
+    """Просмотры, еще не записанные в БД этим процессом"""
+    with _lock:
+        return _counts.get(shipment_id, 0)
+
+
+def discard_views():
+    """Очистить буфер без записи в БД (тесты: id заявок не переживают откат)"""
+    global _counts, _sketches, _pending
+    with _lock:
+        _counts, _sketches, _pending = defaultdict(int), {}, 0
+
+
+def flush_views():
+    """Записать накопленные просмотры в БД.
+
+    Счетчики увеличиваются UPDATE ... SET views = views + n - одним
+    запросом на каждое различное n, без чтения строк и без save(),
+    поэтому updated_at и кэши списка не меняются. Скетчи сливаются
+    с сохраненными в ShipmentViewStats. Возвращает число записанных
+    просмотров. Просмотры, накопленные для другой БД (например, тестовой,
+    которой уже нет), отбрасываются без обращения к БД.
+    """
+    global _counts, _sketches, _pending, _last_flush
+    with _lock:
+        counts, sketches, flushed = _counts, _sketches, _pending
+        _counts, _sketches, _pending = defaultdict(int), {}, 0
+        _last_flush = time.monotonic()
+        database = _database
+    if not counts or database != _database_name():
+        return 0
+
+    try:
+        _write(counts, sketches)
+    except Exception:
+        # Вернуть просмотры в буфер - запишутся при следующем сбросе
+        with _lock:
+            for shipment_id, count in counts.items():
+                _counts[shipment_id] += count
+            for shipment_id, sketch in sketches.items():
+                if shipment_id in _sketches:
+                    sketch.merge(_sketches[shipment_id])
+                _sketches[shipment_id] = sketch
+            _pending += flushed
+        raise
+    return flushed
+
+
+def _write(counts, sketches):
+    from .models import Shipment, ShipmentViewStats
+
+    by_increment = defaultdict(list)
+    for shipment_id, count in counts.items():
+        by_increment[count].append(shipment_id)
+
+    with transaction.atomic():
+        for increment, shipment_ids in by_increment.items():
+            Shipment.objects.filter(id__in=shipment_ids).update(views=F('views') + increment)
+
+        # Заявки могли удалить, пока просмотры лежали в буфере
+        shipment_ids = list(
+            Shipment.objects.filter(id__in=list(sketches)).order_by().values_list('id', flat=True)
+        )
+        ShipmentViewStats.objects.bulk_create(
+            [ShipmentViewStats(shipment_id=shipment_id) for shipment_id in shipment_ids],
+            ignore_conflicts=True
+        )
+        stats = list(ShipmentViewStats.objects.select_for_update().filter(shipment_id__in=shipment_ids))
+        now = timezone.now()
+        for item in stats:
+            sketch = sketches[item.shipment_id]
+            if item.sketch:
+                sketch.merge(HyperLogLog.from_bytes(item.sketch))
+            item.sketch = sketch.to_bytes()
+            item.unique_viewers = len(sketch)
+            item.updated_at = now
+        ShipmentViewStats.objects.bulk_update(stats, ['sketch', 'unique_viewers', 'updated_at'])
+
+
+def flush_after_request(sender, **kwargs):
+    """Сброс по времени или объему - после ответа, а не во время запроса"""
+    if flush_due():
+        flush_views()
+
+
+request_finished.connect(flush_after_request, dispatch_uid='shipments.view_counter')
+
+
+def _flush_at_exit():
+    # После manage.py test соединение снова смотрит на рабочую БД - буфер
+    # тестовой БД flush_views отбросит, не открывая соединения
+    try:
+        flush_views()
+    except Exception:
+        pass
+
+
+atexit.register(_flush_at_exit)
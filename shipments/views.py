@@ -1,71 +1,369 @@
+from decimal import Decimal
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator
-from django.db.models import Q
+from django.db.models import Count, F, Max, Q, Sum
+from django.http import JsonResponse
+from django.template.response import TemplateResponse
+from django.urls import reverse
 from django.views.decorators.http import require_POST  # Добавьте эту строку
 
-from .models import Shipment
-from .forms import ShipmentForm
-from bids.models import Bid
-from bids.forms import BidForm
-
-
-def shipment_list(request):
-    """Список всех заявок с фильтрацией"""
+from .models import Shipment, ShipmentViewStats, SavedSearch, SavedSearchMatch
+from .forms import ShipmentForm, SavedSearchForm
+from .search import search_shipments, build_match_query
+from .locations import autocomplete, get_location_index, canonical_city_key, resolve_location
+from .cargo import chargeable_weight
+from .quotes import quote
+from .facets import get_facets, facet_links
+from .page_cache import anonymous_page_cache
+from .windows import WINDOWS, overlapping, parse_window
+from .view_counter import record_view, pending_views, viewer_key
+from .events import publish_shipment_event
+from bids.models import AgentRating, Bid
+from bids.forms import AgentRatingForm, BidForm
+from bids.ratings import RATEABLE_STATUSES
+from core import versions
+from core.conditional import conditional_page, page_etag
+from core.currency import normalized_amount, rates_version
+from core.pagination import paginate
+
+
+# Параметр запроса -> условие фильтра по диапазону
+RANGE_FILTERS = {
+    'volume_min': 'volume__gte',
+    'volume_max': 'volume__lte',
+    'chargeable_min': 'chargeable_weight__gte',
+    'chargeable_max': 'chargeable_weight__lte',
+}
+
+SORT_OPTIONS = {
+    'volume': 'Объем ↑',
+    '-volume': 'Объем ↓',
+    'chargeable_weight': 'Оплачиваемый вес ↑',
+    '-chargeable_weight': 'Оплачиваемый вес ↓',
+    'bid_count': 'Меньше всего предложений',
+    '-bid_count': 'Больше всего предложений',
+    'pending_bid_count': 'Меньше всего ожидающих предложений',
+    'best_bid_price': 'Лучшее предложение ↑',
+    '-best_bid_price': 'Лучшее предложение ↓',
+}
+
+# Лучшее предложение хранится в валюте заявки: сравниваем его в USD
+SORT_EXPRESSIONS = {
+    'best_bid_price': lambda: normalized_amount('USD', amount_field='best_bid_price'),
+}
+
+
+def parse_decimal(value):
+    try:
+        value = Decimal(value)
+    except (TypeError, ArithmeticError):
+        return None
+    return value if value.is_finite() else None
+
+
+def filter_shipments(request):
+    """Заявки с фильтрами из GET-параметров - общие для страницы списка и API.
+
+    Возвращает queryset и нормализованный набор примененных фильтров
+    (ключ для кэшей фасетов).
+    """
     shipments = Shipment.objects.all().order_by('-created_at')
+    filters = {}
 
     # Фильтрация по статусу
     status_filter = request.GET.get('status')
     if status_filter:
         shipments = shipments.filter(status=status_filter)
+        filters['status'] = status_filter
 
     # Фильтрация по типу груза
     cargo_type = request.GET.get('cargo_type')
     if cargo_type:
         shipments = shipments.filter(cargo_type=cargo_type)
-
-    # Поиск
+        filters['cargo_type'] = cargo_type
+
+    # Валюта, инкотермс, опасный груз
+    currency = request.GET.get('currency')
+    if currency:
+        shipments = shipments.filter(currency=currency)
+        filters['currency'] = currency
+
+    incoterm = request.GET.get('incoterm')
+    if incoterm:
+        shipments = shipments.filter(incoterm=incoterm)
+        filters['incoterm'] = incoterm
+
+    hazardous = request.GET.get('hazardous')
+    if hazardous in ('0', '1'):
+        shipments = shipments.filter(is_hazardous=hazardous == '1')
+        filters['hazardous'] = hazardous
+
+    # Фильтр по маршруту через нормализованный справочник городов
+    departure = request.GET.get('departure')
+    if departure:
+        shipments = shipments.filter(departure_location__in=get_location_index().city_ids(departure))
+        filters['departure'] = canonical_city_key(departure)
+
+    arrival = request.GET.get('arrival')
+    if arrival:
+        shipments = shipments.filter(arrival_location__in=get_location_index().city_ids(arrival))
+        filters['arrival'] = canonical_city_key(arrival)
+
+    # Окна дат: заявки, чье окно отправления/прибытия пересекается с указанным
+    for kind in WINDOWS:
+        date_from, date_to = parse_window(request.GET, kind)
+        if date_from or date_to:
+            shipments = overlapping(shipments, kind, date_from, date_to)
+            filters[f'{kind}_window'] = f'{date_from or ""}:{date_to or ""}'
+
+    # Диапазоны по сохраненным объему и оплачиваемому весу
+    for param, field in RANGE_FILTERS.items():
+        value = parse_decimal(request.GET.get(param))
+        if value is not None:
+            shipments = shipments.filter(**{field: value})
+            filters[param] = str(value)
+
+    # Полнотекстовый поиск (результаты сортируются по релевантности)
     search_query = request.GET.get('search')
     if search_query:
-        shipments = shipments.filter(
-            Q(title__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(departure_city__icontains=search_query) |
-            Q(arrival_city__icontains=search_query)
-        )
+        shipments = search_shipments(shipments, search_query)
+        filters['search'] = build_match_query(search_query)
+
+    # Явная сортировка заменяет сортировку по дате и по релевантности.
+    # Заявки без значения (например, без предложений) - в конце.
+    sort = request.GET.get('sort')
+    if sort in SORT_OPTIONS:
+        name = sort.lstrip('-')
+        field = SORT_EXPRESSIONS[name]() if name in SORT_EXPRESSIONS else F(name)
+        if sort.startswith('-'):
+            shipments = shipments.order_by(field.desc(nulls_last=True), '-id')
+        else:
+            shipments = shipments.order_by(field.asc(nulls_last=True), 'id')
 
     # Показывать только активные заявки для неавторизованных пользователей
     if not request.user.is_authenticated:
         shipments = shipments.filter(status='active')
+        filters['anonymous'] = '1'
+
+    return shipments, filters
+
+
+def uses_page_numbers(request):
+    return bool(request.GET.get('search')) or request.GET.get('sort') in SORT_OPTIONS
+
+
+def shipment_list_validators(request):
+    """Версия списка - строка версии заявок в БД, один запрос по первичному ключу.
+
+    Поколение из кэша для этого не годится: с локальным кэшем у каждого
+    процесса оно свое. Версию увеличивают сохранение и удаление заявок
+    и сводка по предложениям (shipments.cache.shipments_changed).
+    """
+    version, changed_at = versions.get(versions.SHIPMENTS)
+    return page_etag(request, 'shipment_list', version, rates_version()), changed_at
+
+
+@conditional_page(shipment_list_validators)
+@anonymous_page_cache
+def shipment_list(request):
+    """Список всех заявок с фильтрацией"""
+    shipments, filters = filter_shipments(request)
 
-    # Пагинация
-    paginator = Paginator(shipments, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Счетчики для боковой панели фильтров - один GROUP BY, с кэшем
+    facets = get_facets(shipments, filters)
 
-    return render(request, 'shipments/shipment_list.html', {
+    # Пагинация: курсорная по умолчанию, ?page=N - по номерам страниц.
+    # Результаты поиска и явная сортировка упорядочены не по дате,
+    # поэтому для них курсор по (created_at, id) не подходит.
+    search_query = request.GET.get('search')
+    page_obj = paginate(request, shipments, per_page=10, force_pages=uses_page_numbers(request))
+
+    # Параметры фильтров для ссылок пагинации
+    query_params = request.GET.copy()
+    query_params.pop('cursor', None)
+    query_params.pop('page', None)
+
+    # TemplateResponse: контекст нужен прогреву кэша (shipments.page_cache)
+    return TemplateResponse(request, 'shipments/shipment_list.html', {
         'page_obj': page_obj,
-        'status_filter': status_filter,
-        'cargo_type': cargo_type,
+        'query_string': query_params.urlencode(),
+        'facets': facet_links(facets, query_params),
+        'status_filter': request.GET.get('status'),
+        'cargo_type': request.GET.get('cargo_type'),
+        'currency': request.GET.get('currency'),
+        'incoterm': request.GET.get('incoterm'),
+        'hazardous': request.GET.get('hazardous'),
         'search_query': search_query,
+        'departure': request.GET.get('departure'),
+        'arrival': request.GET.get('arrival'),
+        'departure_from': request.GET.get('departure_from'),
+        'departure_to': request.GET.get('departure_to'),
+        'arrival_from': request.GET.get('arrival_from'),
+        'arrival_to': request.GET.get('arrival_to'),
+        'volume_min': request.GET.get('volume_min'),
+        'volume_max': request.GET.get('volume_max'),
+        'chargeable_min': request.GET.get('chargeable_min'),
+        'chargeable_max': request.GET.get('chargeable_max'),
+        'sort': request.GET.get('sort'),
+        'sort_options': SORT_OPTIONS.items(),
     })
 
 
+def shipment_list_api(request):
+    """JSON-версия списка заявок с теми же фильтрами: ?departure_from=...&cursor=..."""
+    shipments, _ = filter_shipments(request)
+    page_obj = paginate(request, shipments, per_page=20, force_pages=uses_page_numbers(request))
+
+    data = {
+        'results': [
+            {
+                'id': shipment.id,
+                'title': shipment.title,
+                'status': shipment.status,
+                'cargo_type': shipment.cargo_type,
+                'weight': str(shipment.weight),
+                'volume': str(shipment.volume),
+                'chargeable_weight': str(shipment.chargeable_weight),
+                'departure_city': shipment.departure_city,
+                'arrival_city': shipment.arrival_city,
+                'departure_window': [shipment.departure_date, shipment.departure_window_end],
+                'arrival_window': [shipment.arrival_date, shipment.arrival_window_end],
+                'estimated_price': str(shipment.estimated_price),
+                'currency': shipment.currency,
+                'bid_count': shipment.bid_count,
+                'pending_bid_count': shipment.pending_bid_count,
+                'best_bid_price': None if shipment.best_bid_price is None else str(shipment.best_bid_price),
+                'url': reverse('shipment_detail', args=[shipment.id]),
+            }
+            for shipment in page_obj
+        ],
+    }
+    if getattr(page_obj, 'is_cursor_page', False):
+        data['next_cursor'] = page_obj.next_cursor
+        data['previous_cursor'] = page_obj.previous_cursor
+    else:
+        data['page'] = page_obj.number
+        data['num_pages'] = page_obj.paginator.num_pages
+    return JsonResponse(data, json_dumps_params={'ensure_ascii': False})
+
+
+def location_autocomplete(request):
+    """JSON-автодополнение городов: ?q=мос"""
+    return JsonResponse(
+        {'results': autocomplete(request.GET.get('q', ''))},
+        json_dumps_params={'ensure_ascii': False}
+    )
+
+
+def shipment_quote(request):
+    """JSON: рекомендуемая цена по маршруту, типу груза и габаритам.
+
+    Считается по моделям в памяти процесса - без запросов к БД.
+    ?departure_city=&departure_country=&arrival_city=&arrival_country=
+    &cargo_type=&weight=&length=&width=&height=&currency=
+    """
+    params = request.GET
+    try:
+        dimensions = [Decimal(params.get(field) or 0) for field in ('weight', 'length', 'width', 'height')]
+    except ArithmeticError:
+        return JsonResponse({'error': 'Некорректные вес или габариты.'}, status=400)
+    if any(not value.is_finite() or value < 0 for value in dimensions):
+        return JsonResponse({'error': 'Некорректные вес или габариты.'}, status=400)
+    weight = chargeable_weight(*dimensions)
+    currency = params.get('currency') or 'USD'
+    if currency not in dict(Shipment._meta.get_field('currency').choices):
+        return JsonResponse({'error': 'Неизвестная валюта.'}, status=400)
+    if not weight:
+        return JsonResponse({'quote': None, 'chargeable_weight': weight})
+
+    result = quote(
+        resolve_location(params.get('departure_city', ''), params.get('departure_country', ''), create=False),
+        resolve_location(params.get('arrival_city', ''), params.get('arrival_country', ''), create=False),
+        params.get('cargo_type'),
+        weight,
+        currency,
+    )
+    return JsonResponse({'quote': result, 'chargeable_weight': weight}, json_dumps_params={'ensure_ascii': False})
+
+
+def count_view(request, shipment_id, owner_id):
+    """Учесть просмотр заявки не владельцем, один раз за запрос.
+
+    Вызывается из валидаторов условного GET (ответ 304 - тоже просмотр)
+    и из самой view, если валидаторы не выполнялись.
+    """
+    if request.user.id == owner_id or getattr(request, '_shipment_view_counted', False):
+        return
+    # Просмотр копится в буфере процесса и пишется в БД пачкой
+    record_view(shipment_id, viewer_key(request))
+    request._shipment_view_counted = True
+
+
+def shipment_detail_validators(request, shipment_id):
+    """Версия страницы заявки одним запросом: заявка, ее предложения, роль зрителя"""
+    row = Shipment.objects.filter(id=shipment_id).annotate(
+        last_bid_at=Max('bids__updated_at'),
+        bid_total=Count('bids'),
+        # Рейтинги агентов в таблице предложений меняются оценками по другим заявкам
+        agent_rating_sum=Sum('bids__carrier_agent__profile__rating_sum'),
+        agent_ratings=Sum('bids__carrier_agent__profile__total_ratings'),
+    ).values_list(
+        'updated_at', 'last_bid_at', 'bid_total', 'agent_rating_sum', 'agent_ratings', 'owner_id', 'views'
+    ).first()
+    if row is None:
+        return None
+    updated_at, last_bid_at, bid_total, agent_rating_sum, agent_ratings, owner_id, views = row
+    count_view(request, shipment_id, owner_id)
+
+    # Цены предложений показываются и в валюте заявки - версия курсов тоже входит в тег
+    parts = [
+        updated_at.isoformat(), last_bid_at and last_bid_at.isoformat(), bid_total,
+        agent_rating_sum, agent_ratings, rates_version(),
+    ]
+    if request.user.id == owner_id:
+        # Владелец видит счетчик просмотров, который меняется без updated_at
+        parts += ['owner', views + pending_views(shipment_id)]
+    last_modified = max(filter(None, (updated_at, last_bid_at)))
+    return page_etag(request, *parts), last_modified
+
+
 @login_required
+@conditional_page(shipment_detail_validators)
 def shipment_detail(request, shipment_id):
-    """Детальная страница заявки с предложениями"""
-    shipment = get_object_or_404(Shipment, id=shipment_id)
-
-    # Получаем все предложения для этой заявки
-    bids = shipment.bids.all()
+    """Детальная страница заявки с предложениями.
+
+    Число запросов не зависит от числа предложений: владелец и агенты
+    с профилями (и их оценками) загружаются JOIN-ом, счетчики по
+    статусам - одним условным агрегатом.
+    """
+    shipment = get_object_or_404(
+        Shipment.objects.select_related('owner__profile', 'view_stats', 'accepted_bid__rating'), id=shipment_id
+    )
+    is_owner = request.user.id == shipment.owner_id
+    count_view(request, shipment.id, shipment.owner_id)
+
+    # Предложения текущей страницы вместе с агентами и их профилями.
+    # Цена в валюте заявки считается в том же запросе - по ней сравнение
+    # с ожидаемой стоимостью и сортировка ?bids_sort=price.
+    normalized_price = normalized_amount(shipment.currency)
+    bids = shipment.bids.select_related('carrier_agent__profile').annotate(
+        normalized_price=normalized_price,
+        price_delta=normalized_price - shipment.estimated_price,
+    )
+    sort_by_price = request.GET.get('bids_sort') == 'price'
+    if sort_by_price:
+        bids = bids.order_by('normalized_price', 'id')
+    bid_page = paginate(request, bids, per_page=20, cursor_param='bids_cursor', page_param='bids_page',
+                        force_pages=sort_by_price)
+    bid_stats = bid_status_counts(shipment)
 
     # Проверяем, может ли текущий пользователь создать предложение
     can_create_bid = (
-            request.user.is_authenticated and
-            request.user.userprofile.is_carrier_agent and
+            request.roles.is_carrier_agent and
             shipment.status == 'active' and
-            shipment.owner != request.user and
+            shipment.owner_id != request.user.id and
             not Bid.objects.filter(
                 shipment=shipment,
                 carrier_agent=request.user,
@@ -83,21 +381,54 @@ def shipment_detail(request, shipment_id):
             'arrival_date': shipment.arrival_date,
         })
 
+    # Оценка исполнителя после доставки: принятое предложение и его
+    # оценка загружены вместе с заявкой
+    agent_rating = None
+    rating_form = None
+    if is_owner and shipment.accepted_bid_id and shipment.status in RATEABLE_STATUSES:
+        try:
+            agent_rating = shipment.accepted_bid.rating
+        except AgentRating.DoesNotExist:
+            rating_form = AgentRatingForm()
+
+    try:
+        unique_viewers = shipment.view_stats.unique_viewers
+    except ShipmentViewStats.DoesNotExist:
+        unique_viewers = 0
+
     context = {
         'shipment': shipment,
-        'bids': bids,
+        'bid_page': bid_page,
+        'bid_stats': bid_stats,
+        'bids_query_string': 'bids_sort=price' if sort_by_price else '',
+        'sort_by_price': sort_by_price,
         'can_create_bid': can_create_bid,
         'bid_form': bid_form,
-        'is_owner': request.user == shipment.owner,
+        'is_owner': is_owner,
+        'view_count': shipment.views + pending_views(shipment.id),
+        'unique_viewers': unique_viewers,
+        'agent_rating': agent_rating,
+        'rating_form': rating_form,
     }
 
     return render(request, 'shipments/shipment_detail.html', context)
 
 
+def bid_status_counts(shipment):
+    """Количество предложений всего и по статусам - один запрос"""
+    return shipment.bids.aggregate(
+        total=Count('id'),
+        **{
+            status: Count('id', filter=Q(status=status))
+            for status, _ in Bid.BID_STATUS_CHOICES
+        }
+    )
+
+
 @login_required
 def shipment_create(request):
     """Создание новой заявки"""
-    if not request.user.userprofile.is_cargo_owner:
+    if not request.roles.is_cargo_owner:
         messages.error(request, 'Только грузовладельцы могут создавать заявки.')
         return redirect('dashboard')
 
@@ -192,6 +523,73 @@ def shipment_deactivate(request, shipment_id):
 
     shipment.status = 'inactive'
     shipment.save()
+    publish_shipment_event(shipment.id, 'shipment_status', {'status': shipment.status})
 
     messages.success(request, 'Заявка успешно деактивирована. Новые предложения не будут приниматься.')
-    return redirect('shipment_detail', shipment_id=shipment_id)
\ No newline at end of file
+    return redirect('shipment_detail', shipment_id=shipment_id)
+
+
+@login_required
+def saved_search_list(request):
+    """Сохраненные поиски агента и форма нового поиска"""
+    if request.method == 'POST':
+        form = SavedSearchForm(request.POST)
+        if form.is_valid():
+            search = form.save(commit=False)
+            search.agent = request.user
+            search.save()
+            messages.success(request, 'Поиск сохранен. Новые подходящие заявки появятся во входящих.')
+            return redirect('saved_search_list')
+    else:
+        form = SavedSearchForm()
+
+    searches = request.user.saved_searches.select_related('departure_location', 'arrival_location')
+    return render(request, 'shipments/saved_search_list.html', {
+        'form': form,
+        'searches': searches,
+    })
+
+
+@login_required
+@require_POST
+def saved_search_delete(request, search_id):
+    search = get_object_or_404(SavedSearch, id=search_id, agent=request.user)
+    search.delete()
+    messages.success(request, 'Сохраненный поиск удален.')
+    return redirect('saved_search_list')
+
+
+@login_required
+def search_inbox(request):
+    """Входящие: новые заявки, подошедшие под сохраненные поиски агента"""
+    matches = SavedSearchMatch.objects.filter(agent=request.user).select_related(
+        'shipment', 'saved_search'
+    )
+    unread = request.GET.get('unread') == '1'
+    if unread:
+        matches = matches.filter(is_read=False)
+
+    page_obj = paginate(request, matches, per_page=20)
+
+    query_params = request.GET.copy()
+    query_params.pop('cursor', None)
+    query_params.pop('page', None)
+
+    return render(request, 'shipments/search_inbox.html', {
+        'page_obj': page_obj,
+        'query_string': query_params.urlencode(),
+        'unread': unread,
+        'unread_count': SavedSearchMatch.objects.filter(agent=request.user, is_read=False).count(),
+    })
+
+
+@login_required
+@require_POST
+def search_inbox_read(request):
+    """Отметить входящие прочитанными (все или одно совпадение)"""
+    matches = SavedSearchMatch.objects.filter(agent=request.user, is_read=False)
+    match_id = request.POST.get('match_id')
+    if match_id and match_id.isdigit():
+        matches = matches.filter(id=match_id)
+    matches.update(is_read=True)
+    return redirect('search_inbox')
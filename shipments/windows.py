@@ -0,0 +1,62 @@
+# shipments/windows.py - фильтр по пересечению окон дат отправления/прибытия
+
+import datetime
+
+from django.db.models import Max
+from django.utils.dateparse import parse_date
+
+# Окно: (начало, сохраненный конец, сохраненная длина в днях)
+WINDOWS = {
+    'departure': ('departure_date', 'departure_window_end', 'departure_window_days'),
+    'arrival': ('arrival_date', 'arrival_window_end', 'arrival_window_days'),
+}
+
+
+def window_fields(shipment):
+    """Значения сохраненных колонок окон для заявки (заполняются в Shipment.save)"""
+    values = {}
+    for kind, (start, end, days) in WINDOWS.items():
+        window_start = getattr(shipment, start)
+        latest = getattr(shipment, f'latest_{start}')
+        window_end = max(latest, window_start) if latest and window_start else window_start
+        values[end] = window_end
+        values[days] = (window_end - window_start).days if window_start else 0
+    return values
+
+
+def max_window_days(queryset, kind):
+    """Длина самого широкого окна - MAX по индексу, без просмотра таблицы"""
+    _, _, days = WINDOWS[kind]
+    return queryset.model.objects.aggregate(longest=Max(days))['longest'] or 0
+
+
+def overlapping(queryset, kind, date_from=None, date_to=None):
+    """Заявки, окно которых пересекается с [date_from, date_to].
+
+    Пересечение - это start <= date_to и end >= date_from: условие
+    на две разные колонки, и индекс помогает только по одной из них.
+    Поэтому начало окна дополнительно ограничивается снизу:
+    start >= date_from - L, где L - длина самого широкого окна.
+    Получается диапазон по индексу (start, end), а условие по end
+    проверяется в том же индексе.
+    """
+    start, end, _ = WINDOWS[kind]
+    conditions = {}
+    if date_to is not None:
+        conditions[f'{start}__lte'] = date_to
+    if date_from is not None:
+        conditions[f'{end}__gte'] = date_from
+        longest = max_window_days(queryset, kind)
+        conditions[f'{start}__gte'] = date_from - datetime.timedelta(days=longest)
+    return queryset.filter(**conditions)
+
+
+def parse_window(params, kind):
+    """Границы окна из GET-параметров ?departure_from=...&departure_to=..."""
+    bounds = []
+    for suffix in ('from', 'to'):
+        try:
+            bounds.append(parse_date(params.get(f'{kind}_{suffix}') or ''))
+        except ValueError:
+            bounds.append(None)
+    return tuple(bounds)
@@ -6,4 +6,4 @@ class UsersConfig(AppConfig):
     name = 'users'
 
     def ready(self):
-        import users.signals  # если будут сигналы
\ No newline at end of file
+        import users.signals  # noqa: F401
\ No newline at end of file
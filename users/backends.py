@@ -0,0 +1,16 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+UserModel = get_user_model()
+
+
+class ProfileBackend(ModelBackend):
+    """Пользователь сессии вместе с профилем - одним запросом с JOIN.
+
+    AuthenticationMiddleware загружает пользователя через get_user бэкенда,
+    поэтому роли (users/roles.py) потом не стоят ни одного запроса.
+    """
+
+    def get_user(self, user_id):
+        user = UserModel._default_manager.select_related('profile').filter(pk=user_id).first()
+        return user if user is not None and self.user_can_authenticate(user) else None
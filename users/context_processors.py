@@ -0,0 +1,10 @@
+from .roles import ANONYMOUS, get_roles
+
+
+def roles(request):
+    """{{ roles.is_carrier_agent }} и т.п. в шаблонах"""
+    roles = getattr(request, 'roles', None)
+    if roles is None:
+        user = getattr(request, 'user', None)
+        roles = get_roles(user) if user is not None else ANONYMOUS
+    return {'roles': roles}
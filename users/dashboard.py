@@ -0,0 +1,186 @@
+# users/dashboard.py - виджеты личного кабинета
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count, Q, Sum
+
+DEFAULTS = {
+    # Сколько хранится собранный кабинет, секунд. Записи самого пользователя
+    # сбрасывают его сразу; чужие (отклонение при принятии другого
+    # предложения, истечение сроков) видны не позже чем через TIMEOUT.
+    'TIMEOUT': 300,
+    # Потоки для независимых запросов виджетов; 0 - выполнять по очереди
+    'WORKERS': 3,
+}
+
+RECENT = 5
+
+# Решенные предложения для доли выигранных: отмененные агентом не считаются
+DECIDED_STATUSES = ('accepted', 'rejected', 'expired')
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'DASHBOARD', {})}
+
+
+def cache_key(user_id):
+    return f'dashboard:{user_id}'
+
+
+def owner_shipments(user_id):
+    """Заявки владельца по статусам и ожидающие ответа предложения - одна строка агрегатов"""
+    from shipments.models import Shipment
+
+    return Shipment.objects.filter(owner_id=user_id).aggregate(
+        total=Count('id'),
+        open=Count('id', filter=Q(status='active')),
+        in_progress=Count('id', filter=Q(status='in_progress')),
+        completed=Count('id', filter=Q(status='completed')),
+        draft=Count('id', filter=Q(status='draft')),
+        # Счетчик ведется в строке заявки (bids/leaderboard.py)
+        pending_bids=Sum('pending_bid_count', filter=Q(status='active'), default=0),
+    )
+
+
+def owner_spend(user_id):
+    """Стоимость принятых предложений по валютам: заявки владельца по индексу и JOIN по accepted_bid"""
+    from shipments.models import Shipment
+
+    rows = (
+        Shipment.objects.filter(owner_id=user_id, accepted_bid__isnull=False)
+        .values('accepted_bid__currency')
+        .annotate(total=Sum('accepted_bid__price'), count=Count('id'))
+        .order_by('accepted_bid__currency')
+    )
+    return [
+        {'currency': row['accepted_bid__currency'], 'total': row['total'], 'count': row['count']}
+        for row in rows
+    ]
+
+
+def agent_bids(user_id):
+    """Предложения агента по валютам с условными счетчиками статусов - один GROUP BY"""
+    from bids.models import Bid
+
+    rows = list(
+        Bid.objects.filter(carrier_agent_id=user_id).values('currency').annotate(
+            total=Count('id'),
+            pending=Count('id', filter=Q(status='pending')),
+            accepted=Count('id', filter=Q(status='accepted')),
+            decided=Count('id', filter=Q(status__in=DECIDED_STATUSES)),
+            earned=Sum('price', filter=Q(status='accepted')),
+        ).order_by('currency')
+    )
+    summary = {
+        field: sum(row[field] for row in rows)
+        for field in ('total', 'pending', 'accepted', 'decided')
+    }
+    summary['win_rate'] = round(100 * summary['accepted'] / summary['decided']) if summary['decided'] else None
+    summary['earnings'] = [
+        {'currency': row['currency'], 'total': row['earned'], 'count': row['accepted']}
+        for row in rows if row['accepted']
+    ]
+    return summary
+
+
+def available_shipments(user_id):
+    from shipments.models import Shipment
+
+    return Shipment.objects.filter(status='active').exclude(owner_id=user_id).count()
+
+
+def recent_shipments(user_id):
+    from shipments.models import Shipment
+
+    return list(Shipment.objects.filter(owner_id=user_id).order_by('-created_at', '-id')[:RECENT])
+
+
+def recent_bids(user_id):
+    from bids.models import Bid
+
+    return list(
+        Bid.objects.filter(carrier_agent_id=user_id).select_related('shipment')
+        .order_by('-created_at', '-id')[:RECENT]
+    )
+
+
+WIDGETS = {
+    'customer': {
+        'shipments': owner_shipments,
+        'spend': owner_spend,
+        'recent_shipments': recent_shipments,
+    },
+    'agent': {
+        'bids': agent_bids,
+        'available_shipments': available_shipments,
+        'recent_bids': recent_bids,
+    },
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(workers):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dashboard')
+    return _executor
+
+
+def _run_widget(widget, user_id):
+    # У потока пула свое соединение с БД - закрываем его, как после запроса
+    try:
+        return widget(user_id)
+    finally:
+        close_old_connections()
+
+
+def compute(user_id, user_type):
+    """Собрать виджеты роли. Независимые запросы идут параллельно в пуле потоков.
+
+    Внутри транзакции (ATOMIC_REQUESTS, тесты) запросы выполняются
+    по очереди в текущем соединении: у потоков пула свои соединения,
+    и незафиксированных данных транзакции они бы не увидели.
+    """
+    widgets = WIDGETS.get(user_type, {})
+    workers = get_config()['WORKERS']
+    if len(widgets) < 2 or not workers or connection.in_atomic_block:
+        return {name: widget(user_id) for name, widget in widgets.items()}
+    executor = _get_executor(workers)
+    futures = {name: executor.submit(_run_widget, widget, user_id) for name, widget in widgets.items()}
+    return {name: future.result() for name, future in futures.items()}
+
+
+def get_dashboard(user, user_type):
+    """Виджеты кабинета из кэша пользователя или собранные заново"""
+    key = cache_key(user.id)
+    data = cache.get(key)
+    if data is None or data.get('user_type') != user_type:
+        data = {'user_type': user_type, **compute(user.id, user_type)}
+        cache.set(key, data, get_config()['TIMEOUT'])
+    return data
+
+
+def invalidate(*user_ids):
+    """Сбросить кабинеты пользователей после фиксации транзакции с их записями"""
+    keys = [cache_key(user_id) for user_id in set(user_ids) if user_id]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_bid(bid):
+    """Кабинеты агента предложения и владельца заявки"""
+    from bids.models import Bid
+    from shipments.models import Shipment
+
+    if Bid.shipment.is_cached(bid):
+        owner_id = bid.shipment.owner_id
+    else:
+        owner_id = Shipment.objects.filter(pk=bid.shipment_id).values_list('owner_id', flat=True).first()
+    invalidate(bid.carrier_agent_id, owner_id)
@@ -1,6 +1,10 @@
 from django.db import models
 from django.contrib.auth.models import User
 
+# Счетчики оценок агента: меняются только атомарными UPDATE (bids/ratings.py)
+COUNTER_FIELDS = ('rating_sum', 'total_ratings')
+
+
 # ВРЕМЕННАЯ УПРОЩЕННАЯ МОДЕЛЬ ДЛЯ ЗАПУСКА
 class UserProfile(models.Model):
     USER_TYPE_CHOICES = (
@@ -12,6 +16,36 @@ class UserProfile(models.Model):
     user_type = models.CharField(max_length=20, choices=USER_TYPE_CHOICES, default='customer')
     company_name = models.CharField(max_length=255, blank=True)
     phone = models.CharField(max_length=20, blank=True)
+    # Оценки агента: сумма звезд и их число меняются вместе с каждой новой
+    # оценкой (bids/ratings.py), средняя считается по ним без AVG()
+    rating_sum = models.PositiveIntegerField('Сумма оценок', default=0)
+    total_ratings = models.PositiveIntegerField('Количество оценок', default=0)
 
     def __str__(self):
         return f"{self.company_name} ({self.user.email})"
+
+    def save(self, *args, **kwargs):
+        # Полное сохранение загруженного раньше профиля (форма, админка) не
+        # должно затирать оценки, добавленные после его чтения
+        if kwargs.get('update_fields') is None and not self._state.adding and not kwargs.get('force_insert'):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in COUNTER_FIELDS and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def rating(self):
+        """Средняя оценка с одним знаком после запятой или None, если оценок нет"""
+        if not self.total_ratings:
+            return None
+        return round(self.rating_sum / self.total_ratings, 1)
+
+    @property
+    def is_cargo_owner(self):
+        return self.user_type == 'customer'
+
+    @property
+    def is_carrier_agent(self):
+        return self.user_type == 'agent'
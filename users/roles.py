@@ -0,0 +1,55 @@
+# users/roles.py - роли пользователя на время запроса
+
+from django.utils.functional import SimpleLazyObject
+
+from .models import UserProfile
+
+
+class Roles:
+    """Флаги ролей, вычисленные один раз из профиля пользователя"""
+
+    __slots__ = ('has_profile', 'user_type', 'user_type_display', 'company_name', 'phone',
+                 'is_cargo_owner', 'is_carrier_agent', 'is_developer')
+
+    def __init__(self, profile=None):
+        self.has_profile = profile is not None
+        self.user_type = profile.user_type if profile else None
+        self.user_type_display = profile.get_user_type_display() if profile else ''
+        self.company_name = profile.company_name if profile else ''
+        self.phone = profile.phone if profile else ''
+        self.is_cargo_owner = bool(profile and profile.is_cargo_owner)
+        self.is_carrier_agent = bool(profile and profile.is_carrier_agent)
+        self.is_developer = self.user_type == 'developer'
+
+
+ANONYMOUS = Roles()
+
+
+def get_roles(user):
+    """Роли пользователя; кэшируются на объекте user до сохранения профиля"""
+    if not user.is_authenticated:
+        return ANONYMOUS
+    roles = user.__dict__.get('_roles')
+    if roles is None:
+        # После ProfileBackend профиль уже загружен вместе с пользователем
+        try:
+            profile = user.profile
+        except UserProfile.DoesNotExist:
+            profile = None
+        roles = user.__dict__['_roles'] = Roles(profile)
+    return roles
+
+
+def invalidate_roles(user):
+    user.__dict__.pop('_roles', None)
+
+
+class RoleMiddleware:
+    """request.roles - роли текущего пользователя, вычисляются при первом обращении"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.roles = SimpleLazyObject(lambda: get_roles(request.user))
+        return self.get_response(request)
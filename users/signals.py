@@ -0,0 +1,13 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import UserProfile
+from .roles import invalidate_roles
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def profile_changed(sender, instance, **kwargs):
+    # Пользователь профиля - обычно тот же объект, что request.user
+    user = instance._state.fields_cache.get('user')
+    if user is not None:
+        invalidate_roles(user)
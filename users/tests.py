@@ -1,3 +1,158 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from bids import state_machine
+from bids.tests import make_bid
+from shipments.locations import invalidate_location_index
+from shipments.tests import make_shipment
+from . import dashboard
+from .models import UserProfile
+from .roles import ANONYMOUS, get_roles
+
+
+class RoleTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agent = User.objects.create_user('agent', password='x')
+        UserProfile.objects.create(user=cls.agent, user_type='agent', company_name='Аэро')
+        cls.plain = User.objects.create_user('plain', password='x')
+
+    def test_user_and_profile_in_one_query(self):
+        self.client.force_login(self.agent)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('bid_list'))
+        self.assertContains(response, 'Агент перевозчика')
+        user_queries = [query['sql'] for query in queries if 'FROM "auth_user"' in query['sql']]
+        self.assertEqual(len(user_queries), 1)
+        self.assertIn('"users_userprofile"', user_queries[0])
+        self.assertFalse([query for query in queries if query['sql'].startswith('SELECT "users_userprofile"')])
+
+    def test_flags_cached_until_profile_saved(self):
+        user = User.objects.select_related('profile').get(pk=self.agent.pk)
+        with self.assertNumQueries(0):
+            roles = get_roles(user)
+            self.assertTrue(roles.is_carrier_agent)
+            self.assertIs(get_roles(user), roles)
+        user.profile.user_type = 'customer'
+        user.profile.save()
+        self.assertTrue(get_roles(user).is_cargo_owner)
+
+        plain = User.objects.select_related('profile').get(pk=self.plain.pk)
+        with self.assertNumQueries(0):
+            self.assertFalse(get_roles(plain).has_profile)
+        request = RequestFactory().get('/')
+        request.user = type('Anonymous', (), {'is_authenticated': False})()
+        self.assertIs(get_roles(request.user), ANONYMOUS)
+
+    def test_registration_creates_profile(self):
+        response = self.client.post(reverse('register'), {
+            'email': 'owner@example.com', 'company_name': 'Груз', 'user_type': 'customer', 'phone': '',
+            'password1': 'Sup3r-secret!', 'password2': 'Sup3r-secret!',
+        })
+        self.assertRedirects(response, reverse('shipment_list'))
+        profile = UserProfile.objects.get(user__email='owner@example.com')
+        self.assertEqual((profile.user_type, profile.company_name), ('customer', 'Груз'))
+
+
+def widget_queries(queries):
+    # Счетчики меню в base.html - не виджеты кабинета
+    return [
+        query['sql'] for query in queries
+        if ('shipments_' in query['sql'] or 'bids_' in query['sql']) and 'COUNT(*)' not in query['sql']
+    ]
+
+
+class DashboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='x')
+        UserProfile.objects.create(user=cls.owner, user_type='customer', company_name='Грузы')
+        cls.agents = [User.objects.create_user(f'agent{i}', password='x') for i in range(2)]
+        for agent in cls.agents:
+            UserProfile.objects.create(user=agent, user_type='agent', company_name=agent.username)
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.shipments = [make_shipment(self.owner, title=f'Груз {i}') for i in range(3)]
+        self.bids = [
+            make_bid(self.shipments[0], self.agents[0], price=100, currency='EUR'),
+            make_bid(self.shipments[0], self.agents[1], price=200),
+            make_bid(self.shipments[1], self.agents[0], price=300),
+            make_bid(self.shipments[2], self.agents[0], price=400),
+        ]
+        state_machine.accept(self.bids[0])
+        state_machine.accept(self.bids[2])
+
+    def get(self, user):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return response.context['dashboard'], widget_queries(queries)
+
+    def test_owner_widgets_then_cache(self):
+        data, queries = self.get(self.owner)
+        self.assertEqual(len(queries), 3)
+        shipments = data['shipments']
+        self.assertEqual((shipments['open'], shipments['in_progress'], shipments['pending_bids']), (1, 2, 1))
+        self.assertEqual([(row['currency'], row['total'], row['count']) for row in data['spend']],
+                         [('EUR', 100, 1), ('USD', 300, 1)])
+
+        _, queries = self.get(self.owner)
+        self.assertEqual(queries, [])
+
+    def test_agent_win_rate_by_currency(self):
+        data, _ = self.get(self.agents[0])
+        bids = data['bids']
+        self.assertEqual((bids['total'], bids['pending'], bids['accepted'], bids['win_rate']), (3, 1, 2, 100))
+        self.assertEqual([(row['currency'], row['total']) for row in bids['earnings']], [('EUR', 100), ('USD', 300)])
+        self.assertEqual(self.get(self.agents[1])[0]['bids']['win_rate'], 0)
+        self.assertEqual(self.get(self.agents[0])[1], [])
+
+    def test_writes_invalidate_both_parties(self):
+        for user in (self.owner, *self.agents):
+            self.get(user)
+        # Кэш сбрасывается после фиксации транзакции записи
+        with self.captureOnCommitCallbacks(execute=True):
+            state_machine.reject(self.bids[3])
+        self.assertEqual(self.get(self.owner)[0]['shipments']['pending_bids'], 0)
+        self.assertEqual(self.get(self.agents[0])[0]['bids']['pending'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_shipment(self.owner)
+        self.assertEqual(self.get(self.owner)[0]['shipments']['open'], 2)
+        # Чужой кабинет при этом остается в кэше
+        self.assertEqual(self.get(self.agents[1])[1], [])
+
+
+@override_settings(DASHBOARD={'WORKERS': 2})
+class DashboardPoolTests(TransactionTestCase):
+    """Виджеты в потоках пула - вне транзакции, каждый в своем соединении"""
+
+    def setUp(self):
+        invalidate_location_index()
+        self.addCleanup(invalidate_location_index)
+        self.owner = User.objects.create_user('owner', password='x')
+        self.agent = User.objects.create_user('agent', password='x')
+        shipment = make_shipment(self.owner)
+        state_machine.accept(make_bid(shipment, self.agent, price=500))
+
+    def test_pool_matches_sequential(self):
+        for user, user_type in ((self.owner, 'customer'), (self.agent, 'agent')):
+            pooled = dashboard.compute(user.id, user_type)
+            with override_settings(DASHBOARD={'WORKERS': 0}):
+                sequential = dashboard.compute(user.id, user_type)
+            self.assertEqual(pooled.keys(), sequential.keys())
+            for name in pooled:
+                if name.startswith('recent_'):
+                    self.assertEqual([item.pk for item in pooled[name]], [item.pk for item in sequential[name]])
+                else:
+                    self.assertEqual(pooled[name], sequential[name])
+        self.assertEqual(dashboard.compute(self.agent.id, 'agent')['bids']['win_rate'], 100)
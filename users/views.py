@@ -4,6 +4,10 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth import get_user_model
 
+from .models import UserProfile
+from .dashboard import get_dashboard
+from .roles import get_roles
+
 User = get_user_model()
 
 # Временно создадим формы здесь, чтобы избежать циклического импорта
@@ -89,18 +93,26 @@ def register_view(request):
         form = UserRegistrationForm(request.POST)
         if form.is_valid():
             user = form.save()
-            login(request, user)
+            # Тип пользователя, компания и телефон хранятся в профиле
+            UserProfile.objects.create(
+                user=user,
+                user_type=form.cleaned_data['user_type'],
+                company_name=form.cleaned_data['company_name'],
+                phone=form.cleaned_data['phone'],
+            )
+            login(request, user, backend='users.backends.ProfileBackend')
+            roles = get_roles(user)
 
-            user_type_display = dict(USER_TYPE_CHOICES_TEMP).get(user.user_type, user.user_type)
+            user_type_display = dict(USER_TYPE_CHOICES_TEMP).get(roles.user_type, roles.user_type)
             messages.success(
                 request,
-                f'🎉 Добро пожаловать, {user.company_name}! '
+                f'🎉 Добро пожаловать, {roles.company_name}! '
                 f'Ваш аккаунт ({user_type_display}) успешно создан.'
             )
 
-            if user.user_type == 'customer':
+            if roles.user_type == 'customer':
                 return redirect('shipment_list')
-            elif user.user_type == 'agent':
+            elif roles.user_type == 'agent':
                 return redirect('shipment_list')
             else:
                 return redirect('home')
@@ -118,20 +130,21 @@ def login_view(request):
         if form.is_valid():
             user = form.get_user()
             login(request, user)
+            roles = get_roles(user)
 
-            user_type_display = dict(USER_TYPE_CHOICES_TEMP).get(user.user_type, user.user_type)
+            user_type_display = dict(USER_TYPE_CHOICES_TEMP).get(roles.user_type, roles.user_type)
             messages.success(
                 request,
-                f'👋 Добро пожаловать обратно, {user.company_name}! '
+                f'👋 Добро пожаловать обратно, {roles.company_name}! '
                 f'({user_type_display})'
             )
 
             next_url = request.GET.get('next', '')
             if next_url:
                 return redirect(next_url)
-            elif user.user_type == 'customer':
+            elif roles.user_type == 'customer':
                 return redirect('shipment_list')
-            elif user.user_type == 'agent':
+            elif roles.user_type == 'agent':
                 return redirect('shipment_list')
             else:
                 return redirect('home')
@@ -145,7 +158,7 @@ def login_view(request):
 
 def logout_view(request):
     if request.user.is_authenticated:
-        messages.info(request, f'👋 До свидания, {request.user.company_name}! Вы вышли из системы.')
+        messages.info(request, f'👋 До свидания, {request.roles.company_name}! Вы вышли из системы.')
     logout(request)
     return redirect('home')
 
@@ -157,18 +170,8 @@ def profile_view(request):
 
 @login_required
 def dashboard_view(request):
-    user = request.user
-    context = {'user': user}
-
-    # Разные данные для разных типов пользователей
-    if user.user_type == 'customer':
-        from shipments.models import Shipment
-        user_shipments = Shipment.objects.filter(customer=user).order_by('-created_at')[:5]
-        context['shipments'] = user_shipments
-
-    elif user.user_type == 'agent':
-        from bids.models import Bid
-        user_bids = Bid.objects.filter(agent=user).order_by('-created_at')[:5]
-        context['bids'] = user_bids
-
-    return render(request, 'users/dashboard.html', context)
\ No newline at end of file
+    """Личный кабинет: виджеты роли из кэша пользователя (см. users/dashboard.py)"""
+    return render(request, 'users/dashboard.html', {
+        'user': request.user,
+        'dashboard': get_dashboard(request.user, request.roles.user_type),
+    })
\ No newline at end of file